@@ -68,6 +68,9 @@ DMOJ_PROBLEM_MIN_USER_POINTS_VOTE = 1  # when voting on problem, minimum point v
 DMOJ_PROBLEM_MAX_USER_POINTS_VOTE = 50  # when voting on problem, maximum point value user can select
 DMOJ_PROBLEM_HOT_PROBLEM_COUNT = 7
 
+# Number of pandoc processes run concurrently when importing statements from Polygon
+POLYGON_IMPORT_WORKERS = 4
+
 DMOJ_PROBLEM_STATEMENT_DISALLOWED_CHARACTERS = {'“', '”', '‘', '’', '−', 'ﬀ', 'ﬁ', 'ﬂ', 'ﬃ', 'ﬄ'}
 DMOJ_RATING_COLORS = True
 DMOJ_EMAIL_THROTTLING = (10, 60)
@@ -88,6 +91,13 @@ DMOJ_USER_DATA_DOWNLOAD = False
 DMOJ_USER_DATA_CACHE = ''
 DMOJ_USER_DATA_DOWNLOAD_RATELIMIT = datetime.timedelta(days=1)
 
+# Profile last access times are buffered and written in bulk every interval (in seconds); 0 writes on every request.
+# The buffer is flushed by a background thread, so uWSGI should run with enable-threads; without it, requests flush
+# the buffer themselves once it is two intervals overdue.
+DMOJ_USER_ACCESS_FLUSH_INTERVAL = 10
+# Accesses within this many seconds of the last recorded one from the same IP are not recorded again
+DMOJ_USER_ACCESS_GRANULARITY = 60
+
 DMOJ_COMMENT_VOTE_HIDE_THRESHOLD = -5
 DMOJ_COMMENT_REPLY_TIMEFRAME = datetime.timedelta(days=365)
 
@@ -134,6 +144,9 @@ DMOJ_ENABLE_SOCIAL = True
 
 MARKDOWN_STYLES = {}
 MARKDOWN_DEFAULT_STYLE = {}
+# Cache alias to store rendered markdown in, or None to render on every use
+MARKDOWN_CACHE = None
+MARKDOWN_CACHE_TTL = 86400
 
 MATHOID_URL = False
 MATHOID_GZIP = False
@@ -284,6 +297,7 @@ INSTALLED_APPS += (
 )
 
 MIDDLEWARE = (
+    'judge.middleware.APIInstrumentationMiddleware',
     'judge.middleware.ShortCircuitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -539,6 +553,20 @@ EVENT_DAEMON_GET = 'ws://localhost:9996/'
 EVENT_DAEMON_POLL = '/channels/'
 EVENT_DAEMON_KEY = None
 EVENT_DAEMON_AMQP_EXCHANGE = 'dmoj-events'
+# Events are posted from a background thread in batches of at most this many
+EVENT_DAEMON_BATCH_SIZE = 100
+# Events beyond this many waiting to be posted are dropped
+EVENT_DAEMON_QUEUE_SIZE = 10000
+# Whether posting an event waits for the daemon to acknowledge it; otherwise posting is fire-and-forget
+EVENT_DAEMON_POST_WAIT = False
+# Address the site itself subscribes to events at, for the API's event streams; defaults to EVENT_DAEMON_GET
+EVENT_DAEMON_SUBSCRIBE = None
+# Event streams are closed after this many seconds, and clients reconnect with the last event they received.
+# Every open stream occupies a worker for this long, so serve /api/esep/contest/<key>/events from a separate
+# pool of asynchronous workers (e.g. uWSGI with gevent) rather than the site's synchronous ones.
+EVENT_STREAM_DURATION = 30
+# Seconds between keepalive comments on idle event streams
+EVENT_STREAM_KEEPALIVE = 15
 EVENT_DAEMON_SUBMISSION_KEY = '6Sdmkx^%pk@GsifDfXcwX*Y7LRF%RGT8vmFpSxFBT$fwS7trc8raWfN#CSfQuKApx&$B#Gh2L7p%W!Ww'
 
 # Internationalization
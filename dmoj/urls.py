@@ -305,6 +305,8 @@ urlpatterns = [
         path('contest/<str:contest_key>/curators', api.api_esep.APIContestCurators.as_view()),
         path('contest/<str:contest_key>/schedule', api.api_esep.APIContestSchedule.as_view()),
         path('contest/<str:contest_key>/submissions', api.api_esep.APIContestSubmissions.as_view()),
+        path('contest/<str:contest_key>/batch', api.api_esep.APIContestBatch.as_view()),
+        path('contest/<str:contest_key>/events', api.api_esep.APIContestEvents.as_view()),
         path('user/<str:username>/curated_contests', api.api_esep.APICuratedContests.as_view()),
         path('tickets/<int:ticket_id>', api.api_esep.APITicketDetail.as_view()),
         path('tickets/<int:ticket_id>/messages', api.api_esep.APITicketMessages.as_view()),
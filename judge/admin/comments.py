@@ -6,6 +6,7 @@ from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _, ngettext
 from reversion.admin import VersionAdmin
 
+from judge.caching import invalidate_comment_trees, invalidate_recent_comments
 from judge.models import Comment
 from judge.widgets import AdminHeavySelect2Widget, AdminMartorWidget
 
@@ -39,14 +40,20 @@ class CommentAdmin(VersionAdmin):
 
     @admin.display(description=_('Hide comments'))
     def hide_comment(self, request, queryset):
+        pages = set(queryset.values_list('page', flat=True))
         count = queryset.update(hidden=True)
+        invalidate_comment_trees(pages)
+        invalidate_recent_comments()
         self.message_user(request, ngettext('%d comment successfully hidden.',
                                             '%d comments successfully hidden.',
                                             count) % count)
 
     @admin.display(description=_('Unhide comments'))
     def unhide_comment(self, request, queryset):
+        pages = set(queryset.values_list('page', flat=True))
         count = queryset.update(hidden=False)
+        invalidate_comment_trees(pages)
+        invalidate_recent_comments()
         self.message_user(request, ngettext('%d comment successfully unhidden.',
                                             '%d comments successfully unhidden.',
                                             count) % count)
@@ -64,3 +71,5 @@ class CommentAdmin(VersionAdmin):
         super().save_model(request, obj, form, change)
         if obj.hidden:
             obj.get_descendants().update(hidden=obj.hidden)
+            invalidate_comment_trees([obj.page])
+            invalidate_recent_comments()
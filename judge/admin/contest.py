@@ -14,8 +14,10 @@ from django.utils.translation import gettext_lazy as _, ngettext
 from django.views.decorators.http import require_POST
 from reversion.admin import VersionAdmin
 
-from judge.models import Class, Contest, ContestProblem, ContestSubmission, Profile, Rating, Submission
+from judge.caching import invalidate_rating_rank_index, invalidate_user_references
+from judge.models import Class, Comment, Contest, ContestProblem, ContestSubmission, Profile, Rating, Submission
 from judge.ratings import rate_contest
+from judge.utils.lookups import contest_lookup, profile_lookup
 from judge.utils.views import NoBatchDeleteMixin
 from judge.widgets import AdminAceWidget, AdminHeavySelect2MultipleWidget, AdminHeavySelect2Widget, \
     AdminMartorWidget, AdminSelect2MultipleWidget, AdminSelect2Widget
@@ -227,7 +229,11 @@ class ContestAdmin(NoBatchDeleteMixin, SortableAdminBase, VersionAdmin):
     def make_visible(self, request, queryset):
         if not request.user.has_perm('judge.change_contest_visibility'):
             queryset = queryset.filter(Q(is_private=True) | Q(is_organization_private=True))
+        contests = list(queryset.values_list('id', 'key'))
+        keys = [key for _, key in contests]
         count = queryset.update(is_visible=True)
+        contest_lookup.invalidate([id for id, _ in contests])
+        Comment.update_page_public(['c:%s' % key for key in keys])
         self.message_user(request, ngettext('%d contest successfully marked as visible.',
                                             '%d contests successfully marked as visible.',
                                             count) % count)
@@ -236,7 +242,11 @@ class ContestAdmin(NoBatchDeleteMixin, SortableAdminBase, VersionAdmin):
     def make_hidden(self, request, queryset):
         if not request.user.has_perm('judge.change_contest_visibility'):
             queryset = queryset.filter(Q(is_private=True) | Q(is_organization_private=True))
+        contests = list(queryset.values_list('id', 'key'))
+        keys = [key for _, key in contests]
         count = queryset.update(is_visible=False)
+        contest_lookup.invalidate([id for id, _ in contests])
+        Comment.update_page_public(['c:%s' % key for key in keys])
         self.message_user(request, ngettext('%d contest successfully marked as hidden.',
                                             '%d contests successfully marked as hidden.',
                                             count) % count)
@@ -294,7 +304,11 @@ class ContestAdmin(NoBatchDeleteMixin, SortableAdminBase, VersionAdmin):
         with transaction.atomic():
             with connection.cursor() as cursor:
                 cursor.execute('TRUNCATE TABLE `%s`' % Rating._meta.db_table)
+            unrated_profiles = list(Profile.objects.filter(rating__isnull=False).values_list('id', 'user__username'))
             Profile.objects.update(rating=None)
+            transaction.on_commit(lambda: invalidate_user_references([username for _, username in unrated_profiles]))
+            transaction.on_commit(lambda: profile_lookup.invalidate([id for id, _ in unrated_profiles]))
+            transaction.on_commit(invalidate_rating_rank_index)
             for contest in Contest.objects.filter(is_rated=True, end_time__lte=timezone.now()).order_by('end_time'):
                 rate_contest(contest)
         return HttpResponseRedirect(reverse('admin:judge_contest_changelist'))
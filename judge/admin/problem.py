@@ -11,8 +11,9 @@ from django.utils.html import format_html
 from django.utils.translation import gettext, gettext_lazy as _, ngettext
 from reversion.admin import VersionAdmin
 
-from judge.models import LanguageLimit, Problem, ProblemClarification, ProblemPointsVote, ProblemTranslation, Profile, \
-    Solution
+from judge.models import Comment, LanguageLimit, Problem, ProblemClarification, ProblemPointsVote, \
+    ProblemTranslation, Profile, Solution
+from judge.utils.lookups import problem_lookup
 from judge.utils.views import NoBatchDeleteMixin
 from judge.widgets import AdminHeavySelect2MultipleWidget, AdminMartorWidget, AdminSelect2MultipleWidget, \
     AdminSelect2Widget, CheckboxSelectMultipleWithSelectAll
@@ -217,9 +218,13 @@ class ProblemAdmin(NoBatchDeleteMixin, VersionAdmin):
     def make_public(self, request, queryset):
         if not request.user.has_perm('judge.change_public_visibility'):
             queryset = queryset.filter(is_organization_private=True)
+        problems = list(queryset.values_list('id', 'code'))
+        codes = [code for _, code in problems]
         count = queryset.update(is_public=True)
+        problem_lookup.invalidate([id for id, _ in problems])
         for problem_id in queryset.values_list('id', flat=True):
             self._rescore(request, problem_id)
+        Comment.update_page_public(['p:%s' % code for code in codes] + ['s:%s' % code for code in codes])
         self.message_user(request, ngettext('%d problem successfully marked as public.',
                                             '%d problems successfully marked as public.',
                                             count) % count)
@@ -228,9 +233,13 @@ class ProblemAdmin(NoBatchDeleteMixin, VersionAdmin):
     def make_private(self, request, queryset):
         if not request.user.has_perm('judge.change_public_visibility'):
             queryset = queryset.filter(is_organization_private=True)
+        problems = list(queryset.values_list('id', 'code'))
+        codes = [code for _, code in problems]
         count = queryset.update(is_public=False)
+        problem_lookup.invalidate([id for id, _ in problems])
         for problem_id in queryset.values_list('id', flat=True):
             self._rescore(request, problem_id)
+        Comment.update_page_public(['p:%s' % code for code in codes] + ['s:%s' % code for code in codes])
         self.message_user(request, ngettext('%d problem successfully marked as private.',
                                             '%d problems successfully marked as private.',
                                             count) % count)
@@ -3,7 +3,6 @@ from operator import itemgetter
 
 from django.conf import settings
 from django.contrib import admin, messages
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.db.models import Q
 from django.http import HttpResponseRedirect
@@ -15,8 +14,10 @@ from django.utils.translation import gettext, gettext_lazy as _, ngettext, pgett
 from django.views.decorators.http import require_POST
 from reversion.admin import VersionAdmin
 
-from judge.models import ContestParticipation, ContestProblem, ContestSubmission, Profile, Submission, \
+from judge.models import ContestParticipation, ContestProblem, ContestSubmission, Submission, SubmissionResultCount, \
     SubmissionSource, SubmissionTestCase
+from judge.tasks import rejudge_submission_ids, rescore_submissions
+from judge.utils.celery import redirect_to_task_status
 from judge.utils.raw_sql import use_straight_join
 from judge.widgets import AdminAceWidget
 
@@ -161,6 +162,16 @@ class SubmissionAdmin(VersionAdmin):
     def lookup_allowed(self, key, value):
         return super(SubmissionAdmin, self).lookup_allowed(key, value) or key in ('problem__code',)
 
+    def save_model(self, request, obj, form, change):
+        if change and ('result' in form.changed_data or 'language' in form.changed_data):
+            old = Submission.objects.values_list('problem_id', 'language_id', 'user_id', 'result').get(id=obj.id)
+            super().save_model(request, obj, form, change)
+            SubmissionResultCount.add(Submission(problem_id=old[0], language_id=old[1], user_id=old[2],
+                                                 result=old[3]), -1)
+            SubmissionResultCount.add(obj)
+        else:
+            super().save_model(request, obj, form, change)
+
     @admin.display(description=_('Rejudge the selected submissions'))
     def judge(self, request, queryset):
         if not request.user.has_perm('judge.rejudge_submission') or not request.user.has_perm('judge.edit_own_problem'):
@@ -176,12 +187,12 @@ class SubmissionAdmin(VersionAdmin):
         if not request.user.has_perm('judge.edit_all_problem'):
             id = request.profile.id
             queryset = queryset.filter(Q(problem__authors__id=id) | Q(problem__curators__id=id))
-        judged = len(queryset)
-        for model in queryset:
-            model.judge(rejudge=True, batch_rejudge=True, rejudge_user=request.user)
-        self.message_user(request, ngettext('%d submission was successfully scheduled for rejudging.',
-                                            '%d submissions were successfully scheduled for rejudging.',
-                                            judged) % judged)
+        ids = list(queryset.values_list('id', flat=True))
+        status = rejudge_submission_ids.delay(ids, user_id=request.user.id)
+        return redirect_to_task_status(
+            status, message=ngettext('Rejudging %d submission...', 'Rejudging %d submissions...', len(ids)) % len(ids),
+            redirect=reverse('admin:judge_submission_changelist'),
+        )
 
     @admin.display(description=_('Rescore the selected submissions'))
     def recalculate_score(self, request, queryset):
@@ -189,28 +200,11 @@ class SubmissionAdmin(VersionAdmin):
             self.message_user(request, gettext('You do not have the permission to rejudge submissions.'),
                               level=messages.ERROR)
             return
-        submissions = list(queryset.defer(None).select_related(None).select_related('problem')
-                           .only('points', 'case_points', 'case_total', 'problem__partial', 'problem__points'))
-        for submission in submissions:
-            submission.points = round(submission.case_points / submission.case_total * submission.problem.points
-                                      if submission.case_total else 0, 1)
-            if not submission.problem.partial and submission.points < submission.problem.points:
-                submission.points = 0
-            submission.save()
-            submission.update_contest()
-
-        for profile in Profile.objects.filter(id__in=queryset.values_list('user_id', flat=True).distinct()):
-            profile.calculate_points()
-            cache.delete('user_complete:%d' % profile.id)
-            cache.delete('user_attempted:%d' % profile.id)
-
-        for participation in ContestParticipation.objects.filter(
-                id__in=queryset.values_list('contest__participation_id')).prefetch_related('contest'):
-            participation.recompute_results()
+        rescored = rescore_submissions(queryset.select_related(None).order_by())
 
         self.message_user(request, ngettext('%d submission was successfully rescored.',
                                             '%d submissions were successfully rescored.',
-                                            len(submissions)) % len(submissions))
+                                            rescored) % rescored)
 
     @admin.display(description=_('problem code'), ordering='problem__code')
     def problem_code(self, obj):
@@ -21,7 +21,7 @@ def reset_judges():
 def judge_daemon():
     reset_judges()
     Submission.objects.filter(status__in=Submission.IN_PROGRESS_GRADING_STATUS) \
-        .update(status='IE', result='IE', error=None)
+        .update_result(status='IE', result='IE', error=None)
     judges = JudgeList()
 
     judge_server = Server(settings.BRIDGED_JUDGE_ADDRESS, partial(JudgeHandler, judges=judges))
@@ -16,6 +16,7 @@ class DjangoHandler(ZlibPacketHandler):
 
         self.handlers = {
             'submission-request': self.on_submission,
+            'submission-batch-request': self.on_submission_batch,
             'terminate-submission': self.on_termination,
             'disconnect-judge': self.on_disconnect_request,
             'disable-judge': self.on_disable_judge,
@@ -47,6 +48,22 @@ class DjangoHandler(ZlibPacketHandler):
         self.judges.judge(id, problem, language, source, judge_id, priority)
         return {'name': 'submission-received', 'submission-id': id}
 
+    def on_submission_batch(self, data):
+        # Submissions are acknowledged one by one, so that a failure only marks the submissions it affects as
+        # internal errors rather than the whole batch.
+        received = []
+        for submission in data['submissions']:
+            if not self.judges.check_priority(submission['priority']):
+                continue
+            try:
+                self.judges.judge(submission['submission-id'], submission['problem-id'], submission['language'],
+                                  submission['source'], submission['judge-id'], submission['priority'])
+            except Exception:
+                logger.exception('Failed to queue submission %s', submission['submission-id'])
+            else:
+                received.append(submission['submission-id'])
+        return {'name': 'submission-batch-received', 'submission-ids': received}
+
     def on_termination(self, data):
         return {'name': 'submission-received', 'judge-aborted': self.judges.abort(data['submission-id'])}
 
@@ -3,7 +3,7 @@ import json
 import logging
 import threading
 import time
-from collections import deque, namedtuple
+from collections import OrderedDict, deque, namedtuple
 from operator import itemgetter
 
 from django import db
@@ -13,20 +13,71 @@ from django.utils import timezone
 from judge import event_poster as event
 from judge.bridge.base_handler import ZlibPacketHandler, proxy_list
 from judge.caching import finished_submission
-from judge.models import Judge, Language, LanguageLimit, Problem, RuntimeVersion, Submission, SubmissionTestCase
+from judge.models import Judge, Language, LanguageLimit, Problem, RuntimeVersion, Submission, SubmissionResultCount, \
+    SubmissionTestCase
 
 logger = logging.getLogger('judge.bridge')
 json_log = logging.getLogger('judge.json.bridge')
 
 UPDATE_RATE_LIMIT = 5
 UPDATE_RATE_TIME = 0.5
-SubmissionData = namedtuple('SubmissionData', 'time memory short_circuit pretests_only contest_no attempt_no user_id')
+SubmissionData = namedtuple('SubmissionData',
+                            'time memory short_circuit pretests_only contest_no attempt_no user_id meta')
+SubmissionMeta = namedtuple('SubmissionMeta', 'id_secret is_public contest_id user_id problem_id language_key')
+SUBMISSION_META_CACHE_SIZE = 1024
+STATE_STATUS = {
+    'processing': 'P',
+    'grading-begin': 'G',
+    'test-case': 'G',
+    'grading-end': 'D',
+    'compile-error': 'CE',
+    'internal-error': 'IE',
+    'aborted': 'AB',
+}
 
 
 def _ensure_connection():
     db.connection.close_if_unusable_or_obsolete()
 
 
+class SubmissionMetaCache:
+    # Shared by all judge handlers: what a judge reports about a submission never changes these fields,
+    # so they are looked up once at dispatch instead of on every packet.
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def put(self, id, meta):
+        with self.lock:
+            self.data[id] = meta
+            self.data.move_to_end(id)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def get(self, id):
+        with self.lock:
+            meta = self.data.get(id)
+            if meta is not None:
+                self.data.move_to_end(id)
+                return meta
+
+        try:
+            is_public, contest_id, user_id, problem_id, language_key = (
+                Submission.objects.filter(id=id)
+                          .values_list('problem__is_public', 'contest_object_id', 'user_id', 'problem_id',
+                                       'language__key').get())
+        except Submission.DoesNotExist:
+            return None
+        meta = SubmissionMeta(id_secret=Submission.get_id_secret(id), is_public=is_public, contest_id=contest_id,
+                              user_id=user_id, problem_id=problem_id, language_key=language_key)
+        self.put(id, meta)
+        return meta
+
+
+submission_meta = SubmissionMetaCache(SUBMISSION_META_CACHE_SIZE)
+
+
 class JudgeHandler(ZlibPacketHandler):
     proxies = proxy_list(settings.BRIDGED_JUDGE_PROXIES or [])
 
@@ -71,9 +122,6 @@ class JudgeHandler(ZlibPacketHandler):
         self.judge = None
         self.judge_address = None
 
-        self._submission_cache_id = None
-        self._submission_cache = {}
-
     def on_connect(self):
         self.timeout = 15
         logger.info('Judge connected from: %s', self.client_address)
@@ -90,7 +138,7 @@ class JudgeHandler(ZlibPacketHandler):
 
         json_log.info(self._make_json_log(action='disconnect', info='judge disconnected'))
         if self._working:
-            Submission.objects.filter(id=self._working).update(status='IE', result='IE', error='')
+            Submission.objects.filter(id=self._working).update_result(status='IE', result='IE', error='')
             json_log.error(self._make_json_log(sub=self._working, action='close', info='IE due to shutdown on grading'))
 
     def _authenticate(self, id, key):
@@ -187,11 +235,13 @@ class JudgeHandler(ZlibPacketHandler):
         _ensure_connection()
 
         try:
-            pid, time, memory, short_circuit, lid, is_pretested, sub_date, uid, part_virtual, part_id = (
+            (pid, time, memory, short_circuit, lid, is_pretested, sub_date, uid, part_virtual, part_id, is_public,
+             contest_id, language_key) = (
                 Submission.objects.filter(id=submission)
                           .values_list('problem__id', 'problem__time_limit', 'problem__memory_limit',
                                        'problem__short_circuit', 'language__id', 'is_pretested', 'date', 'user__id',
-                                       'contest__participation__virtual', 'contest__participation__id')).get()
+                                       'contest__participation__virtual', 'contest__participation__id',
+                                       'problem__is_public', 'contest_object_id', 'language__key')).get()
         except Submission.DoesNotExist:
             logger.error('Submission vanished: %s', submission)
             json_log.error(self._make_json_log(
@@ -217,6 +267,10 @@ class JudgeHandler(ZlibPacketHandler):
             contest_no=part_virtual,
             attempt_no=attempt_no,
             user_id=uid,
+            meta=SubmissionMeta(
+                id_secret=Submission.get_id_secret(submission), is_public=is_public, contest_id=contest_id,
+                user_id=uid, problem_id=pid, language_key=language_key,
+            ),
         )
 
     def disconnect(self, force=False):
@@ -228,6 +282,7 @@ class JudgeHandler(ZlibPacketHandler):
 
     def submit(self, id, problem, language, source):
         data = self.get_related_submission_data(id)
+        submission_meta.put(id, data.meta)
         self._working = id
         self._no_response_job = threading.Timer(20, self._kill_if_no_response)
         self.send({
@@ -260,7 +315,7 @@ class JudgeHandler(ZlibPacketHandler):
 
         id = packet['submission-id']
         if Submission.objects.filter(id=id).update(status='P', judged_on=self.judge):
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'processing'})
+            event.post(self._channel(id), {'type': 'processing'})
             self._post_update_submission(id, 'processing')
             json_log.info(self._make_json_log(packet, action='processing'))
         else:
@@ -269,8 +324,8 @@ class JudgeHandler(ZlibPacketHandler):
 
     def on_submission_wrong_acknowledge(self, packet, expected, got):
         json_log.error(self._make_json_log(packet, action='processing', info='wrong-acknowledge', expected=expected))
-        Submission.objects.filter(id=expected).update(status='IE', result='IE', error=None)
-        Submission.objects.filter(id=got, status='QU').update(status='IE', result='IE', error=None)
+        Submission.objects.filter(id=expected).update_result(status='IE', result='IE', error=None)
+        Submission.objects.filter(id=got, status='QU').update_result(status='IE', result='IE', error=None)
 
     def on_submission_acknowledged(self, packet):
         if not packet.get('submission-id', None) == self._working:
@@ -335,7 +390,7 @@ class JudgeHandler(ZlibPacketHandler):
                 status='G', is_pretested=packet['pretested'], current_testcase=1,
                 batch=False, judged_date=timezone.now()):
             SubmissionTestCase.objects.filter(submission_id=packet['submission-id']).delete()
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'grading-begin'})
+            event.post(self._channel(packet['submission-id']), {'type': 'grading-begin'})
             self._post_update_submission(packet['submission-id'], 'grading-begin')
             json_log.info(self._make_json_log(packet, action='grading-begin'))
         else:
@@ -392,12 +447,16 @@ class JudgeHandler(ZlibPacketHandler):
         if not problem.partial and sub_points != problem.points:
             sub_points = 0
 
+        old_result = submission.result
         submission.status = 'D'
         submission.time = time
         submission.memory = memory
         submission.points = sub_points
         submission.result = status_codes[status]
         submission.save()
+        SubmissionResultCount.record(
+            [(submission.problem_id, submission.language_id, submission.user_id, old_result)], submission.result,
+        )
 
         json_log.info(self._make_json_log(
             packet, action='grading-end', time=time, memory=memory,
@@ -416,7 +475,7 @@ class JudgeHandler(ZlibPacketHandler):
 
         finished_submission(submission)
 
-        event.post('sub_%s' % submission.id_secret, {
+        event.post(self._channel(submission.id), {
             'type': 'grading-end',
             'time': time,
             'memory': memory,
@@ -433,8 +492,9 @@ class JudgeHandler(ZlibPacketHandler):
         logger.info('%s: Submission failed to compile: %s', self.name, packet['submission-id'])
         self._free_self(packet)
 
-        if Submission.objects.filter(id=packet['submission-id']).update(status='CE', result='CE', error=packet['log']):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {
+        if Submission.objects.filter(id=packet['submission-id']).update_result(status='CE', result='CE',
+                                                                               error=packet['log']):
+            event.post(self._channel(packet['submission-id']), {
                 'type': 'compile-error',
                 'log': packet['log'],
             })
@@ -450,7 +510,7 @@ class JudgeHandler(ZlibPacketHandler):
         logger.info('%s: Submission generated compiler messages: %s', self.name, packet['submission-id'])
 
         if Submission.objects.filter(id=packet['submission-id']).update(error=packet['log']):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'compile-message'})
+            event.post(self._channel(packet['submission-id']), {'type': 'compile-message'})
             json_log.info(self._make_json_log(packet, action='compile-message', log=packet['log']))
         else:
             logger.warning('Unknown submission: %s', packet['submission-id'])
@@ -465,8 +525,8 @@ class JudgeHandler(ZlibPacketHandler):
         self._free_self(packet)
 
         id = packet['submission-id']
-        if Submission.objects.filter(id=id).update(status='IE', result='IE', error=packet['message']):
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'internal-error'})
+        if Submission.objects.filter(id=id).update_result(status='IE', result='IE', error=packet['message']):
+            event.post(self._channel(id), {'type': 'internal-error'})
             self._post_update_submission(id, 'internal-error', done=True)
             json_log.info(self._make_json_log(packet, action='internal-error', message=packet['message'],
                                               finish=True, result='IE'))
@@ -479,8 +539,8 @@ class JudgeHandler(ZlibPacketHandler):
         logger.info('%s: Submission aborted: %s', self.name, packet['submission-id'])
         self._free_self(packet)
 
-        if Submission.objects.filter(id=packet['submission-id']).update(status='AB', result='AB', points=0):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'aborted'})
+        if Submission.objects.filter(id=packet['submission-id']).update_result(status='AB', result='AB', points=0):
+            event.post(self._channel(packet['submission-id']), {'type': 'aborted'})
             self._post_update_submission(packet['submission-id'], 'aborted', done=True)
             json_log.info(self._make_json_log(packet, action='aborted', finish=True, result='AB'))
         else:
@@ -570,7 +630,7 @@ class JudgeHandler(ZlibPacketHandler):
             self.update_counter[id] = (1, time.monotonic())
 
         if do_post:
-            event.post('sub_%s' % Submission.get_id_secret(id), {
+            event.post(self._channel(id), {
                 'type': 'test-case',
                 'id': max_position,
             })
@@ -617,23 +677,25 @@ class JudgeHandler(ZlibPacketHandler):
         data.update(kwargs)
         return json.dumps(data)
 
-    def _post_update_submission(self, id, state, done=False):
-        if self._submission_cache_id == id:
-            data = self._submission_cache
-        else:
-            self._submission_cache = data = Submission.objects.filter(id=id).values(
-                'problem__is_public', 'contest_object_id',
-                'user_id', 'problem_id', 'status', 'language__key',
-            ).get()
-            self._submission_cache_id = id
+    def _channel(self, id):
+        meta = submission_meta.get(id)
+        return 'sub_%s' % (meta.id_secret if meta is not None else Submission.get_id_secret(id))
 
-        if data['problem__is_public']:
+    def _post_update_submission(self, id, state, done=False):
+        meta = submission_meta.get(id)
+        if meta is not None and meta.is_public:
             event.post('submissions', {
                 'type': 'done-submission' if done else 'update-submission',
                 'state': state, 'id': id,
-                'contest': data['contest_object_id'],
-                'user': data['user_id'], 'problem': data['problem_id'],
-                'status': data['status'], 'language': data['language__key'],
+                'contest': meta.contest_id,
+                'user': meta.user_id, 'problem': meta.problem_id,
+                'status': STATE_STATUS[state], 'language': meta.language_key,
+            })
+        if done and meta is not None and meta.contest_id is not None:
+            # Contest problems are rarely public, so contests get their own notification of finished submissions.
+            event.post('contest_%d' % meta.contest_id, {
+                'type': 'submission', 'id': id, 'user': meta.user_id, 'problem': meta.problem_id,
+                'status': STATE_STATUS[state],
             })
 
     def on_cleanup(self):
@@ -1,10 +1,298 @@
+import hashlib
+import time
+from array import array
+from bisect import bisect_right
+
 from django.core.cache import cache
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
+ID_SET_TIMEOUT = 86400
 
-def finished_submission(sub):
-    keys = ['user_complete:%d' % sub.user_id, 'user_attempted:%s' % sub.user_id]
+
+def _current_version(key, timeout):
+    version = cache.get(key)
+    if version is None:
+        # Started from the clock rather than zero, so that values left behind by an expired counter are never
+        # mistaken for current ones.
+        cache.add(key, time.time_ns() // 1000, timeout)
+        version = cache.get(key)
+    return version
+
+
+def get_versioned(key, compute, timeout):
+    """Returns the value cached for `key`, computing it if missing.
+
+    `key` holds a version counter and the value is stored under the current version, so that update_versioned
+    can replace it with an atomic compare-and-set. Deleting `key` invalidates the value.
+    """
+    version = _current_version(key, timeout)
+    if version is None:
+        return compute()
+    value_key = '%s:%d' % (key, version)
+    value = cache.get(value_key)
+    if value is None:
+        value = compute()
+        cache.add(value_key, value, timeout)
+    return value
+
+
+def update_versioned(key, update, timeout):
+    """Replaces the value cached for `key` with `update(value)`, unless nothing is cached.
+
+    `update` returns the value itself if nothing changes, or None if the value can only be recomputed. Writers
+    bump the version with an atomic increment, and only the writer whose increment directly follows the version it
+    read stores its result: after a concurrent update, the new version is left empty and recomputed on next use.
+    """
+    version = cache.get(key)
+    if version is None:
+        return
+    value_key = '%s:%d' % (key, version)
+    value = cache.get(value_key)
+    if value is None:
+        return
+    new_value = update(value)
+    if new_value is value:
+        return
+    try:
+        new_version = cache.incr(key)
+    except ValueError:
+        # The counter was deleted or evicted meanwhile, and with it the cached value.
+        return
+    if new_value is not None and new_version == version + 1:
+        cache.add('%s:%d' % (key, new_version), new_value, timeout)
+    cache.delete(value_key)
+
+
+def pack_ids(ids):
+    # Problem id sets are cached as sorted arrays of 32-bit ints, which are far smaller than a pickled set.
+    return array('I', sorted(ids)).tobytes()
+
+
+def unpack_ids(data):
+    ids = array('I')
+    ids.frombytes(data)
+    return ids
+
+
+def get_id_set(key, compute):
+    return set(unpack_ids(get_versioned(key, lambda: pack_ids(set(compute())), ID_SET_TIMEOUT)))
+
+
+# Renamed when the sets were first stored packed and versioned, since pickled sets may still be cached under the
+# previous names.
+USER_COMPLETE_IDS_KEY = 'user_complete_ids:%d'
+USER_ATTEMPTED_IDS_KEY = 'user_attempted_ids:%d'
+CONTEST_COMPLETE_IDS_KEY = 'contest_complete_ids:%d'
+CONTEST_ATTEMPTED_IDS_KEY = 'contest_attempted_ids:%d'
+
+
+def invalidate_user_id_sets(profile_ids):
+    cache.delete_many([key % profile_id for profile_id in profile_ids
+                       for key in (USER_COMPLETE_IDS_KEY, USER_ATTEMPTED_IDS_KEY)])
+
+
+def _submission_id_sets(sub):
+    completed = sub.result == 'AC' and sub.case_points >= sub.case_total
+    id_sets = [
+        (USER_COMPLETE_IDS_KEY % sub.user_id, sub.problem_id, completed),
+        (USER_ATTEMPTED_IDS_KEY % sub.user_id, sub.problem_id, True),
+    ]
     if hasattr(sub, 'contest'):
-        participation = sub.contest.participation
-        keys += ['contest_complete:%d' % participation.id]
-        keys += ['contest_attempted:%d' % participation.id]
-    cache.delete_many(keys)
+        contest = sub.contest
+        participation = contest.participation
+        problem = contest.problem
+        completed = sub.result == 'AC' and contest.points >= problem.points
+        id_sets += [
+            (CONTEST_COMPLETE_IDS_KEY % participation.id, problem.problem_id, completed),
+            (CONTEST_ATTEMPTED_IDS_KEY % participation.id, problem.problem_id, True),
+        ]
+    return id_sets
+
+
+def _update_id_set(problem_id, member):
+    def update(data):
+        ids = unpack_ids(data)
+        if (problem_id in ids) == member:
+            return data
+        if member:
+            ids.append(problem_id)
+            return pack_ids(ids)
+        # A problem that is no longer completed may still be completed by another submission.
+        return None
+    return update
+
+
+def finished_submission(sub):
+    # Sets that are not cached are left alone, they will be computed on next use.
+    for key, problem_id, member in _submission_id_sets(sub):
+        update_versioned(key, _update_id_set(problem_id, member), ID_SET_TIMEOUT)
+    invalidate_contest_problem_status([(sub.contest_object_id, sub.user_id)])
+    if sub.result == 'AC':
+        _add_to_ac_heatmap(sub)
+
+
+def deleted_submission(sub):
+    cache.delete_many([key for key, _, _ in _submission_id_sets(sub)])
+    invalidate_contest_problem_status([(sub.contest_object_id, sub.user_id)])
+    if sub.result == 'AC':
+        invalidate_ac_heatmaps([sub.user_id])
+
+
+CONTEST_PROBLEM_STATUS_TIMEOUT = 3600
+
+
+def contest_problem_status_key(contest_id, user_id):
+    return 'contest_problem_status:%d:%d' % (contest_id, user_id)
+
+
+def invalidate_contest_problem_status(pairs):
+    # Called for every change to a submission's result, so that the cached status is never stale.
+    keys = {contest_problem_status_key(contest_id, user_id) for contest_id, user_id in pairs if contest_id}
+    if keys:
+        cache.delete_many(list(keys))
+
+
+USER_REFERENCE_TIMEOUT = 3600
+
+
+def _user_reference_key(username):
+    # Usernames come from markdown of any length, so they are hashed to be safe as cache keys.
+    return 'user_ref:%s' % hashlib.sha1(username.encode('utf-8')).hexdigest()
+
+
+def get_user_references(usernames):
+    """Returns {username: (display_rank, rating)} for the usernames that exist, from the cache where possible."""
+    from judge.models import Profile
+
+    keys = {_user_reference_key(username): username for username in set(usernames)}
+    found = {keys[key]: data for key, data in cache.get_many(list(keys)).items()}
+    missing = set(keys.values()) - found.keys()
+    if missing:
+        queried = {name: (rank, rating) for name, rank, rating in
+                   Profile.objects.filter(user__username__in=missing)
+                          .values_list('user__username', 'display_rank', 'rating')}
+        # Unknown usernames are cached as empty tuples, and are invalidated when a profile is created.
+        cache.set_many({_user_reference_key(name): queried.get(name, ()) for name in missing},
+                       USER_REFERENCE_TIMEOUT)
+        found.update(queried)
+    return {name: data for name, data in found.items() if data}
+
+
+def invalidate_user_references(usernames):
+    cache.delete_many([_user_reference_key(username) for username in usernames])
+
+
+RATING_RANK_INDEX_TIMEOUT = 600
+
+
+def get_rating_rank(rating):
+    """Returns the rank of `rating` among listed users: one more than the number of strictly higher ratings.
+
+    The ratings of listed users are cached as a sorted array, refreshed every few minutes and after contests are
+    rated, so that ranking a user is a bisection instead of a COUNT over every profile.
+    """
+    from judge.models import Profile
+
+    data = cache.get('rating_rank_index')
+    ratings = array('i')
+    if data is None:
+        ratings.extend(sorted(Profile.objects.filter(is_unlisted=False, rating__isnull=False)
+                              .values_list('rating', flat=True)))
+        cache.set('rating_rank_index', ratings.tobytes(), RATING_RANK_INDEX_TIMEOUT)
+    else:
+        ratings.frombytes(data)
+    return len(ratings) - bisect_right(ratings, rating) + 1
+
+
+def invalidate_rating_rank_index():
+    cache.delete('rating_rank_index')
+
+
+AC_HEATMAP_TIMEOUT = 86400
+
+
+def _ac_heatmap_key(user_id):
+    return 'user_ac_days:%d' % user_id
+
+
+def _ac_heatmap_day(date):
+    # Days are always in the default timezone, whichever timezone the request or the judge bridge has activated.
+    return timezone.localdate(date, timezone.get_default_timezone()).isoformat()
+
+
+def get_ac_heatmap(profile):
+    """Returns {ISO date: number of distinct problems solved that day} for a user.
+
+    Cached as the solved problem ids of each day, which are extended as submissions finish.
+    """
+    def compute():
+        solved = {}
+        for day, problem_id in (profile.submission_set.filter(result='AC')
+                                .annotate(day=TruncDate('date', tzinfo=timezone.get_default_timezone()))
+                                .values_list('day', 'problem_id').distinct()):
+            solved.setdefault(day.isoformat(), []).append(problem_id)
+        return {day: pack_ids(ids) for day, ids in solved.items()}
+
+    days = get_versioned(_ac_heatmap_key(profile.id), compute, AC_HEATMAP_TIMEOUT)
+    return {day: len(data) // array('I').itemsize for day, data in days.items()}
+
+
+def _add_to_ac_heatmap(sub):
+    day = _ac_heatmap_day(sub.date)
+
+    def update(days):
+        ids = unpack_ids(days.get(day, b''))
+        if sub.problem_id in ids:
+            return days
+        ids.append(sub.problem_id)
+        return {**days, day: pack_ids(ids)}
+
+    update_versioned(_ac_heatmap_key(sub.user_id), update, AC_HEATMAP_TIMEOUT)
+
+
+def invalidate_ac_heatmaps(user_ids):
+    # A submission that is no longer accepted may share its day and problem with another accepted one,
+    # so the heatmap is recomputed rather than updated.
+    cache.delete_many([_ac_heatmap_key(user_id) for user_id in set(user_ids)])
+
+
+def _contest_staff_key(contest_id):
+    return 'contest_staff:%d' % contest_id
+
+
+def get_contest_staff_ids(contest_id):
+    """Returns the ids of the profiles who are authors, curators or testers of a contest."""
+    from judge.models import Contest
+
+    def compute():
+        return Contest.authors.through.objects.filter(contest_id=contest_id).values_list('profile_id', flat=True) \
+            .union(Contest.curators.through.objects.filter(contest_id=contest_id).values_list('profile_id', flat=True),
+                   Contest.testers.through.objects.filter(contest_id=contest_id).values_list('profile_id', flat=True))
+
+    return get_id_set(_contest_staff_key(contest_id), compute)
+
+
+def invalidate_contest_staff_ids(contest_ids):
+    cache.delete_many([_contest_staff_key(contest_id) for contest_id in contest_ids])
+
+
+COMMENT_TREE_TIMEOUT = 3600
+
+
+def comment_tree_key(page, math_engine):
+    return 'comment_tree:%s:%s' % (page, math_engine)
+
+
+def invalidate_comment_trees(pages):
+    from judge.models import EFFECTIVE_MATH_ENGINES
+
+    cache.delete_many([comment_tree_key(page, engine) for page in set(pages) for engine in EFFECTIVE_MATH_ENGINES])
+
+
+RECENT_COMMENTS_KEY = 'recent_public_comments'
+RECENT_COMMENTS_TIMEOUT = 3600
+
+
+def invalidate_recent_comments():
+    cache.delete(RECENT_COMMENTS_KEY)
@@ -2,10 +2,8 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db.models import FilteredRelation, Q
-from django.db.models.expressions import F, Value
-from django.db.models.functions import Coalesce
 from django.forms import ModelForm
 from django.http import HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound, HttpResponseRedirect
 from django.urls import reverse_lazy
@@ -15,11 +13,15 @@ from django.utils.translation import gettext as _
 from django.views.generic import View
 from django.views.generic.base import TemplateResponseMixin
 from django.views.generic.detail import SingleObjectMixin
+from mptt.utils import get_cached_trees
 from reversion import revisions
 from reversion.models import Revision, Version
 
+from judge.caching import COMMENT_TREE_TIMEOUT, comment_tree_key
 from judge.dblock import LockModel
-from judge.models import Comment, CommentLock
+from judge.jinja2.markdown import render_markdown_many
+from judge.models import Comment, CommentLock, CommentVote
+from judge.template_context import math_setting
 from judge.widgets import MartorWidget
 
 
@@ -48,6 +50,32 @@ class CommentForm(ModelForm):
         return super(CommentForm, self).clean()
 
 
+def get_comment_tree(page, math_engine):
+    """Returns the top level visible comments of a page, with their replies cached on them, and their rendered
+    bodies by id.
+
+    Both are cached per page and math engine, and invalidated when a comment on the page is posted, edited, hidden
+    or voted on. Details of the authors may lag behind by up to COMMENT_TREE_TIMEOUT.
+    """
+    key = comment_tree_key(page, math_engine)
+    result = cache.get(key)
+    if result is None:
+        queryset = Comment.objects.filter(hidden=False, page=page).select_related('author__user') \
+                                  .defer('author__about')
+        # Given the queryset rather than a list, so that replies to hidden comments still find their place.
+        tree = get_cached_trees(queryset)
+        # The comments are collected from the tree, whose children are cached, rather than from another query.
+        comments, nodes = [], list(tree)
+        while nodes:
+            comment = nodes.pop()
+            comments.append(comment)
+            nodes.extend(comment.get_children())
+        bodies = render_markdown_many([comment.body for comment in comments], 'comment', math_engine, True)
+        result = tree, {comment.id: body for comment, body in zip(comments, bodies)}
+        cache.set(key, result, COMMENT_TREE_TIMEOUT)
+    return result
+
+
 class CommentedDetailView(TemplateResponseMixin, SingleObjectMixin, View):
     comment_page = None
 
@@ -107,18 +135,20 @@ class CommentedDetailView(TemplateResponseMixin, SingleObjectMixin, View):
 
     def get_context_data(self, **kwargs):
         context = super(CommentedDetailView, self).get_context_data(**kwargs)
-        queryset = Comment.objects.filter(hidden=False, page=self.get_comment_page())
-        context['has_comments'] = queryset.exists()
+        page = self.get_comment_page()
+        context['comment_tree'], context['comment_bodies'] = \
+            get_comment_tree(page, math_setting(self.request)['MATH_ENGINE'])
+        context['has_comments'] = bool(context['comment_tree'])
         context['comment_lock'] = self.is_comment_locked()
-        queryset = queryset.select_related('author__user').defer('author__about')
 
+        # The only part that depends on the viewer, overlaid on the cached tree when rendering.
+        context['comment_votes'] = {}
         if self.request.user.is_authenticated:
             profile = self.request.profile
-            queryset = queryset.annotate(
-                my_vote=FilteredRelation('votes', condition=Q(votes__voter_id=profile.id)),
-            ).annotate(vote_score=Coalesce(F('my_vote__score'), Value(0)))
+            if context['has_comments']:
+                context['comment_votes'] = dict(CommentVote.objects.filter(voter=profile, comment__page=page)
+                                                .values_list('comment_id', 'score'))
             context['is_new_user'] = not self.request.user.is_staff and not profile.has_any_solves
-        context['comment_list'] = queryset
         context['vote_hide_threshold'] = settings.DMOJ_COMMENT_VOTE_HIDE_THRESHOLD
         context['reply_cutoff'] = timezone.now() - settings.DMOJ_COMMENT_REPLY_TIMEFRAME
 
@@ -1,16 +1,15 @@
+from bisect import bisect_right
 from datetime import timedelta
 
 from django.core.exceptions import ValidationError
-from django.db import connection
 from django.template.defaultfilters import floatformat
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _, gettext_lazy, ngettext
 
-from judge.contest_format.default import DefaultContestFormat
+from judge.contest_format.default import DefaultContestFormat, first_best_submission
 from judge.contest_format.registry import register_contest_format
-from judge.timezone import from_database_time
 from judge.utils.timedelta import nice_repr
 
 
@@ -50,44 +49,29 @@ class AtCoderContestFormat(DefaultContestFormat):
         points = 0
         format_data = {}
 
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT MAX(cs.points) as `score`, (
-                    SELECT MIN(csub.date)
-                        FROM judge_contestsubmission ccs LEFT OUTER JOIN
-                             judge_submission csub ON (csub.id = ccs.submission_id)
-                        WHERE ccs.problem_id = cp.id AND ccs.participation_id = %s AND ccs.points = MAX(cs.points)
-                ) AS `time`, cp.id AS `prob`
-                FROM judge_contestproblem cp INNER JOIN
-                     judge_contestsubmission cs ON (cs.problem_id = cp.id AND cs.participation_id = %s) LEFT OUTER JOIN
-                     judge_submission sub ON (sub.id = cs.submission_id)
-                GROUP BY cp.id
-            """, (participation.id, participation.id))
-
-            for score, time, prob in cursor.fetchall():
-                time = from_database_time(time)
-                dt = (time - participation.start).total_seconds()
-
-                # Compute penalty
-                if self.config['penalty']:
-                    # An IE can have a submission result of `None`
-                    subs = participation.submissions.exclude(submission__result__isnull=True) \
-                                                    .exclude(submission__result__in=['IE', 'CE']) \
-                                                    .filter(problem_id=prob)
-                    if score:
-                        prev = subs.filter(submission__date__lte=time).count() - 1
-                        penalty += prev * self.config['penalty'] * 60
-                    else:
-                        # We should always display the penalty, even if the user has a score of 0
-                        prev = subs.count()
-                else:
-                    prev = 0
+        for problem_id, problem_points, submissions in self.iter_problem_submissions(participation):
+            score, time = first_best_submission(submissions)
+            dt = (time - participation.start).total_seconds()
 
+            # Compute penalty
+            if self.config['penalty']:
+                # An IE can have a submission result of `None`
+                judged = [date for date, sub_points, result in submissions
+                          if result is not None and result not in ('IE', 'CE')]
                 if score:
-                    cumtime = max(cumtime, dt)
+                    prev = bisect_right(judged, time) - 1
+                    penalty += prev * self.config['penalty'] * 60
+                else:
+                    # We should always display the penalty, even if the user has a score of 0
+                    prev = len(judged)
+            else:
+                prev = 0
+
+            if score:
+                cumtime = max(cumtime, dt)
 
-                format_data[str(prob)] = {'time': dt, 'points': score, 'penalty': prev}
-                points += score
+            format_data[str(problem_id)] = {'time': dt, 'points': score, 'penalty': prev}
+            points += score
 
         participation.cumtime = cumtime + penalty
         participation.score = round(points, self.contest.points_precision)
@@ -1,4 +1,6 @@
 from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
 
 from django.core.exceptions import ValidationError
 from django.db.models import Max
@@ -13,6 +15,16 @@ from judge.contest_format.registry import register_contest_format
 from judge.utils.timedelta import nice_repr
 
 
+def first_best_submission(submissions):
+    """Returns (points, date) of the earliest maximum score submission, given (date, points, result) tuples
+    ordered by date."""
+    best_points, best_date = None, None
+    for date, points, result in submissions:
+        if best_points is None or points > best_points:
+            best_points, best_date = points, date
+    return best_points, best_date
+
+
 @register_contest_format('default')
 class DefaultContestFormat(BaseContestFormat):
     name = gettext_lazy('Default')
@@ -25,6 +37,17 @@ class DefaultContestFormat(BaseContestFormat):
     def __init__(self, contest, config):
         super(DefaultContestFormat, self).__init__(contest, config)
 
+    def iter_problem_submissions(self, participation):
+        """
+        Yields (contest problem id, contest problem points, submissions) for each problem the participation
+        submitted to, where submissions is a list of (date, points, result) ordered by date. Everything comes from
+        a single query, so formats can compute their results in one pass instead of a query per problem.
+        """
+        rows = (participation.submissions.order_by('problem_id', 'submission__date', 'submission_id')
+                .values_list('problem_id', 'problem__points', 'submission__date', 'points', 'submission__result'))
+        for (problem_id, problem_points), group in groupby(rows.iterator(), key=itemgetter(0, 1)):
+            yield problem_id, problem_points, [row[2:] for row in group]
+
     def update_participation(self, participation):
         cumtime = 0
         points = 0
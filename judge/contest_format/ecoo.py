@@ -1,7 +1,6 @@
 from datetime import timedelta
 
 from django.core.exceptions import ValidationError
-from django.db.models import Count, Max, OuterRef, Subquery
 from django.template.defaultfilters import floatformat
 from django.urls import reverse
 from django.utils.html import format_html
@@ -51,28 +50,15 @@ class ECOOContestFormat(DefaultContestFormat):
         score = 0
         format_data = {}
 
-        submissions = participation.submissions.exclude(submission__result__in=('IE', 'CE'))
-
-        submission_counts = {
-            data['problem_id']: data['count'] for data in submissions.values('problem_id').annotate(count=Count('id'))
-        }
-        queryset = (
-            submissions
-            .values('problem_id')
-            .filter(
-                submission__date=Subquery(
-                    submissions
-                    .filter(problem_id=OuterRef('problem_id'))
-                    .order_by('-submission__date')
-                    .values('submission__date')[:1],
-                ),
-            )
-            .annotate(points=Max('points'))
-            .values_list('problem_id', 'problem__points', 'points', 'submission__date')
-        )
+        for problem_id, problem_points, submissions in self.iter_problem_submissions(participation):
+            submissions = [submission for submission in submissions if submission[2] not in ('IE', 'CE')]
+            if not submissions:
+                continue
+            sub_cnt = len(submissions)
 
-        for problem_id, problem_points, points, date in queryset:
-            sub_cnt = submission_counts.get(problem_id, 0)
+            # The last submission counts, taking the best of any submitted at the same time.
+            date = submissions[-1][0]
+            points = max(sub_points for sub_date, sub_points, result in submissions if sub_date == date)
 
             dt = (date - participation.start).total_seconds()
 
@@ -0,0 +1,215 @@
+import random
+
+from django.db import connection
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.contest_format.atcoder import AtCoderContestFormat
+from judge.contest_format.ecoo import ECOOContestFormat
+from judge.contest_format.legacy_ioi import LegacyIOIContestFormat
+from judge.models import ContestSubmission, Language, Submission
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_contest_problem, create_problem, create_user
+from judge.timezone import from_database_time
+
+
+# The SQL based implementations that the single pass versions replaced, kept as the reference behaviour.
+
+class ReferenceAtCoderContestFormat(AtCoderContestFormat):
+    def update_participation(self, participation):
+        cumtime = 0
+        penalty = 0
+        points = 0
+        format_data = {}
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT MAX(cs.points) as `score`, (
+                    SELECT MIN(csub.date)
+                        FROM judge_contestsubmission ccs LEFT OUTER JOIN
+                             judge_submission csub ON (csub.id = ccs.submission_id)
+                        WHERE ccs.problem_id = cp.id AND ccs.participation_id = %s AND ccs.points = MAX(cs.points)
+                ) AS `time`, cp.id AS `prob`
+                FROM judge_contestproblem cp INNER JOIN
+                     judge_contestsubmission cs ON (cs.problem_id = cp.id AND cs.participation_id = %s) LEFT OUTER JOIN
+                     judge_submission sub ON (sub.id = cs.submission_id)
+                GROUP BY cp.id
+            """, (participation.id, participation.id))
+
+            for score, time, prob in cursor.fetchall():
+                time = from_database_time(time)
+                dt = (time - participation.start).total_seconds()
+
+                if self.config['penalty']:
+                    subs = participation.submissions.exclude(submission__result__isnull=True) \
+                                                    .exclude(submission__result__in=['IE', 'CE']) \
+                                                    .filter(problem_id=prob)
+                    if score:
+                        prev = subs.filter(submission__date__lte=time).count() - 1
+                        penalty += prev * self.config['penalty'] * 60
+                    else:
+                        prev = subs.count()
+                else:
+                    prev = 0
+
+                if score:
+                    cumtime = max(cumtime, dt)
+
+                format_data[str(prob)] = {'time': dt, 'points': score, 'penalty': prev}
+                points += score
+
+        participation.cumtime = cumtime + penalty
+        participation.score = round(points, self.contest.points_precision)
+        participation.tiebreaker = 0
+        participation.format_data = format_data
+        participation.save()
+
+
+class ReferenceECOOContestFormat(ECOOContestFormat):
+    def update_participation(self, participation):
+        cumtime = 0
+        score = 0
+        format_data = {}
+
+        submissions = participation.submissions.exclude(submission__result__in=('IE', 'CE'))
+
+        submission_counts = {
+            data['problem_id']: data['count'] for data in submissions.values('problem_id').annotate(count=Count('id'))
+        }
+        queryset = (
+            submissions
+            .values('problem_id')
+            .filter(
+                submission__date=Subquery(
+                    submissions
+                    .filter(problem_id=OuterRef('problem_id'))
+                    .order_by('-submission__date')
+                    .values('submission__date')[:1],
+                ),
+            )
+            .annotate(points=Max('points'))
+            .values_list('problem_id', 'problem__points', 'points', 'submission__date')
+        )
+
+        for problem_id, problem_points, points, date in queryset:
+            sub_cnt = submission_counts.get(problem_id, 0)
+
+            dt = (date - participation.start).total_seconds()
+
+            bonus = 0
+            if points > 0:
+                if sub_cnt == 1 and points == problem_points:
+                    bonus += self.config['first_ac_bonus']
+                if self.config['time_bonus']:
+                    bonus += (participation.end_time - date).total_seconds() // 60 // self.config['time_bonus']
+
+            format_data[str(problem_id)] = {'time': dt, 'points': points, 'bonus': bonus}
+
+        for data in format_data.values():
+            if self.config['cumtime']:
+                cumtime += data['time']
+            score += data['points'] + data['bonus']
+
+        participation.cumtime = cumtime
+        participation.score = round(score, self.contest.points_precision)
+        participation.tiebreaker = 0
+        participation.format_data = format_data
+        participation.save()
+
+
+class ReferenceLegacyIOIContestFormat(LegacyIOIContestFormat):
+    def update_participation(self, participation):
+        cumtime = 0
+        score = 0
+        format_data = {}
+
+        queryset = (participation.submissions.values('problem_id')
+                                             .filter(points=Subquery(
+                                                 participation.submissions.filter(problem_id=OuterRef('problem_id'))
+                                                                          .order_by('-points').values('points')[:1]))
+                                             .annotate(time=Min('submission__date'))
+                                             .values_list('problem_id', 'time', 'points'))
+
+        for problem_id, time, points in queryset:
+            if self.config['cumtime']:
+                dt = (time - participation.start).total_seconds()
+                if points:
+                    cumtime += dt
+            else:
+                dt = 0
+
+            format_data[str(problem_id)] = {'points': points, 'time': dt}
+            score += points
+
+        participation.cumtime = max(cumtime, 0)
+        participation.score = round(score, self.contest.points_precision)
+        participation.tiebreaker = 0
+        participation.format_data = format_data
+        participation.save()
+
+
+class SinglePassEquivalenceTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        rng = random.Random(1337)
+        now = timezone.now()
+
+        self.contest = create_contest(key='single_pass', start_time=now - timezone.timedelta(hours=5),
+                                      end_time=now + timezone.timedelta(hours=1))
+        contest_problems = [
+            create_contest_problem(contest=self.contest, problem=create_problem(code='single_pass_%d' % i),
+                                   points=points, order=i, partial=True)
+            for i, points in enumerate((100, 7, 50, 1))
+        ]
+
+        self.participations = []
+        for i in range(8):
+            participation = create_contest_participation(
+                contest=self.contest, user=create_user(username='single_pass_%d' % i).profile,
+                real_start=now - timezone.timedelta(hours=4),
+            )
+            self.participations.append(participation)
+            for contest_problem in contest_problems:
+                for _ in range(rng.randint(0, 6)):
+                    submission = Submission.objects.create(
+                        user=participation.user,
+                        problem=contest_problem.problem,
+                        language=Language.get_python3(),
+                        contest_object=self.contest,
+                        result=rng.choice(('AC', 'WA', 'TLE', 'IE', 'CE', None)),
+                    )
+                    # Few distinct times, so that simultaneous submissions are exercised as well.
+                    Submission.objects.filter(id=submission.id).update(
+                        date=participation.real_start + timezone.timedelta(minutes=rng.choice((1, 17, 30, 31, 90))),
+                    )
+                    ContestSubmission.objects.create(
+                        submission=submission,
+                        problem=contest_problem,
+                        participation=participation,
+                        points=rng.choice((0, 0, contest_problem.points / 2, contest_problem.points)),
+                    )
+
+    def assertEquivalent(self, format_class, reference_class, config):
+        for participation in self.participations:
+            reference_class(self.contest, config).update_participation(participation)
+            expected = (participation.score, participation.cumtime, participation.format_data)
+            with self.assertNumQueries(2):  # the submissions, and saving the participation
+                format_class(self.contest, config).update_participation(participation)
+            self.assertEqual((participation.score, participation.cumtime, participation.format_data), expected)
+
+    def test_atcoder(self):
+        for config in ({}, {'penalty': 0}, {'penalty': 7}):
+            with self.subTest(config=config):
+                self.assertEquivalent(AtCoderContestFormat, ReferenceAtCoderContestFormat, config)
+
+    def test_ecoo(self):
+        for config in ({}, {'cumtime': True, 'first_ac_bonus': 3, 'time_bonus': 0}):
+            with self.subTest(config=config):
+                self.assertEquivalent(ECOOContestFormat, ReferenceECOOContestFormat, config)
+
+    def test_legacy_ioi(self):
+        for config in ({}, {'cumtime': True}):
+            with self.subTest(config=config):
+                self.assertEquivalent(LegacyIOIContestFormat, ReferenceLegacyIOIContestFormat, config)
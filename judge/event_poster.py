@@ -1,18 +1,21 @@
 from django.conf import settings
 
-__all__ = ['last', 'post']
+__all__ = ['last', 'post', 'stats']
 
 if not settings.EVENT_DAEMON_USE:
     real = False
 
-    def post(channel, message):
+    def post(channel, message, wait=None):
         return 0
 
     def last():
         return 0
+
+    def stats():
+        return {}
 elif hasattr(settings, 'EVENT_DAEMON_AMQP'):
-    from .event_poster_amqp import last, post
+    from .event_poster_amqp import last, post, stats
     real = True
 else:
-    from .event_poster_ws import last, post
+    from .event_poster_ws import last, post, stats
     real = True
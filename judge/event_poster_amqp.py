@@ -1,12 +1,13 @@
 import json
-import threading
 from time import time
 
 import pika
 from django.conf import settings
 from pika.exceptions import AMQPError
 
-__all__ = ['EventPoster', 'post', 'last']
+from judge.event_poster_queue import EventQueue
+
+__all__ = ['EventPoster', 'post', 'last', 'stats']
 
 
 class EventPoster(object):
@@ -30,25 +31,33 @@ class EventPoster(object):
             self._connect()
             return self.post(channel, message, tries + 1)
 
+    def post_many(self, events, tries=0):
+        ids = []
+        try:
+            for channel, message in events:
+                id = int(time() * 1000000)
+                self._chan.basic_publish(self._exchange, '',
+                                         json.dumps({'id': id, 'channel': channel, 'message': message}))
+                ids.append(id)
+            return ids
+        except AMQPError:
+            if tries > 10:
+                raise
+            self._connect()
+            # Only the events that were not published yet are sent again.
+            return ids + self.post_many(events[len(ids):], tries + 1)
+
 
-_local = threading.local()
+_queue = EventQueue(EventPoster, batch_size=settings.EVENT_DAEMON_BATCH_SIZE,
+                    max_size=settings.EVENT_DAEMON_QUEUE_SIZE, wait=settings.EVENT_DAEMON_POST_WAIT)
 
 
-def _get_poster():
-    if 'poster' not in _local.__dict__:
-        _local.poster = EventPoster()
-    return _local.poster
+def post(channel, message, wait=None):
+    return _queue.post(channel, message, wait)
 
 
-def post(channel, message):
-    try:
-        return _get_poster().post(channel, message)
-    except AMQPError:
-        try:
-            del _local.poster
-        except AttributeError:
-            pass
-    return 0
+def stats():
+    return _queue.stats()
 
 
 def last():
@@ -0,0 +1,216 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+__all__ = ['EventQueue']
+logger = logging.getLogger('judge.event_poster')
+
+
+class _Event(object):
+    __slots__ = ('channel', 'message', 'key', 'enqueued', 'id', 'done')
+
+    def __init__(self, channel, message, key):
+        self.channel = channel
+        self.message = message
+        self.key = key
+        self.enqueued = time.monotonic()
+        self.id = 0
+        self.done = None
+
+
+def coalesce_key(channel, message):
+    # Progress updates are superseded by later progress updates for the same submission, so only the newest
+    # pending one is worth sending. State changes such as grading-begin or grading-end are never merged.
+    if not isinstance(message, dict):
+        return None
+    if message.get('type') == 'test-case':
+        return channel
+    if message.get('type') == 'update-submission' and message.get('state') == 'test-case':
+        return channel, message.get('id')
+    return None
+
+
+class EventQueue(object):
+    """Posts events from a background thread, sending everything queued since the last flush as one batch.
+
+    `poster_factory` must return an object with a `post_many([(channel, message), ...])` method returning the
+    list of event ids. Posting is fire-and-forget unless `wait` is set, in which case `post` blocks until its
+    batch has been sent and returns the event id.
+
+    Events still queued when the process exits are flushed for up to `timeout` seconds.
+
+    Servers that do not run threads started by the application, such as uWSGI without enable-threads, are detected
+    by the thread not starting within `start_timeout` seconds, and events are then posted by `post` itself.
+    """
+
+    def __init__(self, poster_factory, batch_size=100, max_size=10000, wait=False, timeout=5, start_timeout=1):
+        self.poster_factory = poster_factory
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self.wait = wait
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+
+        self._lock = threading.Condition()
+        self._queue = deque()
+        self._pending = {}
+        self._poster = None
+        self._pid = None
+        self._sending = False
+        self._running = False
+        self._threaded = True
+
+        self.posted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+        # The flushing thread is a daemon thread, which would otherwise die with whatever it has not sent yet.
+        atexit.register(self._flush_at_exit)
+
+    def _start(self):
+        # Runs under the lock. Forked processes (e.g. uWSGI workers) need their own flushing thread.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue.clear()
+        self._pending.clear()
+        self._poster = None
+        self._sending = False
+        self._running = False
+        self._threaded = True
+        threading.Thread(target=self._run, name='event-poster', daemon=True).start()
+        if not self._lock.wait_for(lambda: self._running, self.start_timeout):
+            logger.warning('Event poster thread did not start, posting events synchronously')
+            self._threaded = False
+
+    def post(self, channel, message, wait=None):
+        wait = self.wait if wait is None else wait
+        key = coalesce_key(channel, message)
+
+        with self._lock:
+            self._start()
+            event = self._pending.get(key) if key is not None else None
+            if event is not None:
+                event.message = message
+                self.coalesced += 1
+            elif len(self._queue) >= self.max_size:
+                self.dropped += 1
+                logger.warning('Event queue full, dropping event for channel %s', channel)
+                return 0
+            else:
+                event = _Event(channel, message, key)
+                self._queue.append(event)
+                if key is not None:
+                    self._pending[key] = event
+                self._lock.notify_all()
+
+            if wait and event.done is None:
+                event.done = threading.Event()
+            threaded = self._threaded
+
+        if not threaded:
+            self._drain()
+        if not wait:
+            return 0
+        event.done.wait(self.timeout)
+        return event.id
+
+    def _take_batch(self, block=True):
+        # Batches are sent one at a time, so that events are posted in order.
+        with self._lock:
+            while not self._queue or self._sending:
+                if not block:
+                    return None
+                self._lock.wait()
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                event = self._queue.popleft()
+                if event.key is not None:
+                    del self._pending[event.key]
+                batch.append(event)
+            self._sending = True
+            return batch
+
+    def _send(self, batch):
+        if self._poster is None:
+            self._poster = self.poster_factory()
+        return self._poster.post_many([(event.channel, event.message) for event in batch])
+
+    def _process(self, batch):
+        try:
+            ids = self._send(batch)
+        except Exception:
+            logger.exception('Failed to post %d events', len(batch))
+            self._poster = None
+            ids = [0] * len(batch)
+            self.failed += len(batch)
+        else:
+            self.posted += len(batch)
+
+        now = time.monotonic()
+        self.batches += 1
+        self.last_latency = now - batch[0].enqueued
+        self.max_latency = max(self.max_latency, self.last_latency)
+        for event, id in zip(batch, ids):
+            event.id = id
+            if event.done is not None:
+                event.done.set()
+
+        with self._lock:
+            self._sending = False
+            self._lock.notify_all()
+
+    def _run(self):
+        with self._lock:
+            self._running = True
+            self._lock.notify_all()
+        while True:
+            self._process(self._take_batch())
+
+    def _drain(self):
+        # Sends whatever is queued from the calling thread, when the flushing thread is not running.
+        while True:
+            batch = self._take_batch(block=False)
+            if batch is None:
+                return
+            self._process(batch)
+
+    def flush(self, timeout=None):
+        """Waits until every queued event has been sent, for at most `timeout` seconds.
+
+        Returns whether the queue was drained.
+        """
+        with self._lock:
+            # Nothing was queued by this process, whatever its parent left behind.
+            if self._pid != os.getpid():
+                return True
+            threaded = self._threaded
+        if not threaded:
+            self._drain()
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._queue and not self._sending, timeout)
+
+    def _flush_at_exit(self):
+        if not self.flush(self.timeout):
+            logger.warning('Exiting with %d events unsent', len(self._queue))
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._queue)
+        return {
+            'depth': depth,
+            'posted': self.posted,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+        }
@@ -5,7 +5,9 @@ import threading
 from django.conf import settings
 from websocket import WebSocketException, create_connection
 
-__all__ = ['EventPostingError', 'EventPoster', 'post', 'last']
+from judge.event_poster_queue import EventQueue
+
+__all__ = ['EventPostingError', 'EventPoster', 'post', 'last', 'stats']
 _local = threading.local()
 
 
@@ -39,6 +41,23 @@ class EventPoster(object):
             self._connect()
             return self.post(channel, message, tries + 1)
 
+    def post_many(self, events, tries=0):
+        # Pipeline the whole batch and only then collect the acknowledgements, in order.
+        ids = []
+        try:
+            for channel, message in events:
+                self._conn.send(json.dumps({'command': 'post', 'channel': channel, 'message': message}))
+            for _ in events:
+                resp = json.loads(self._conn.recv())
+                ids.append(0 if resp['status'] == 'error' else resp['id'])
+            return ids
+        except WebSocketException:
+            if tries > 10:
+                raise
+            self._connect()
+            # The daemon already has the events it acknowledged, so only the rest are sent again.
+            return ids + self.post_many(events[len(ids):], tries + 1)
+
     def last(self, tries=0):
         try:
             self._conn.send('{"command": "last-msg"}')
@@ -60,15 +79,16 @@ def _get_poster():
     return _local.poster
 
 
-def post(channel, message):
-    try:
-        return _get_poster().post(channel, message)
-    except (WebSocketException, socket.error):
-        try:
-            del _local.poster
-        except AttributeError:
-            pass
-    return 0
+_queue = EventQueue(EventPoster, batch_size=settings.EVENT_DAEMON_BATCH_SIZE,
+                    max_size=settings.EVENT_DAEMON_QUEUE_SIZE, wait=settings.EVENT_DAEMON_POST_WAIT)
+
+
+def post(channel, message, wait=None):
+    return _queue.post(channel, message, wait)
+
+
+def stats():
+    return _queue.stats()
 
 
 def last():
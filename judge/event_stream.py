@@ -0,0 +1,49 @@
+import json
+
+from django.conf import settings
+
+__all__ = ['EventStreamError', 'EventSubscriber', 'format_event']
+
+
+class EventStreamError(RuntimeError):
+    pass
+
+
+class EventSubscriber(object):
+    """Receives the messages posted to some channels of the event daemon, starting after the message `last_id`.
+
+    Connection failures are raised as EventStreamError.
+    """
+
+    def __init__(self, channels, last_id=0):
+        # websocket-client is only needed when the event daemon is used, like in judge.event_poster_ws.
+        from websocket import WebSocketException, create_connection
+
+        try:
+            self._conn = create_connection(settings.EVENT_DAEMON_SUBSCRIBE or settings.EVENT_DAEMON_GET,
+                                           timeout=settings.EVENT_STREAM_KEEPALIVE)
+            self._conn.send(json.dumps({'command': 'start-msg', 'start': last_id}))
+            self._conn.send(json.dumps({'command': 'set-filter', 'filter': list(channels)}))
+        except (WebSocketException, OSError) as e:
+            raise EventStreamError(str(e)) from e
+
+    def recv(self):
+        """Returns the next message as a dict with its id, channel and message, or None if none arrived in time."""
+        from websocket import WebSocketException, WebSocketTimeoutException
+
+        try:
+            data = json.loads(self._conn.recv())
+        except WebSocketTimeoutException:
+            return None
+        except (WebSocketException, OSError) as e:
+            raise EventStreamError(str(e)) from e
+        if data.get('status') == 'error':
+            raise EventStreamError(data['code'])
+        return data
+
+    def close(self):
+        self._conn.close()
+
+
+def format_event(id, type, data):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (id, type, json.dumps(data))
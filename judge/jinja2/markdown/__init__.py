@@ -1,5 +1,8 @@
+import hashlib
+import json
 import logging
 import re
+import threading
 from html import unescape
 from urllib.parse import urlparse
 
@@ -7,6 +10,7 @@ import mistune
 from bleach.css_sanitizer import CSSSanitizer
 from bleach.sanitizer import Cleaner
 from django.conf import settings
+from django.core.cache import caches
 from lxml import html
 from lxml.etree import ParserError, XMLSyntaxError
 from markupsafe import Markup
@@ -164,9 +168,39 @@ def fragment_tree_to_str(tree):
     return html.tostring(tree, encoding='unicode')[len('<div>'):-len('</div>')]
 
 
-@registry.filter
-def markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
-    styles = settings.MARKDOWN_STYLES.get(style, settings.MARKDOWN_DEFAULT_STYLE)
+_local = threading.local()
+
+
+def get_markdown_parser(escape, nofollow, texoid, math, math_engine):
+    # Renderers are stateful while rendering, so each thread keeps its own instance per configuration.
+    parsers = getattr(_local, 'parsers', None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+
+    key = (escape, nofollow, texoid, math, math_engine)
+    if key not in parsers:
+        renderer = AwesomeRenderer(escape=escape, nofollow=nofollow, texoid=texoid, math=math, math_engine=math_engine)
+        parsers[key] = mistune.Markdown(renderer=renderer, inline=AwesomeInlineLexer,
+                                        parse_block_html=1, parse_inline_html=1)
+    return parsers[key]
+
+
+def discard_markdown_parsers():
+    _local.parsers = {}
+
+
+style_digests = {}
+
+
+def get_style_digest(style, styles):
+    # Part of the cache key, so that changing a style's settings doesn't serve HTML rendered under the old ones.
+    if style not in style_digests:
+        style_digests[style] = hashlib.sha1(json.dumps(styles, sort_keys=True, default=repr).encode('utf-8')) \
+            .hexdigest()[:16]
+    return style_digests[style]
+
+
+def render_markdown(value, style, styles, math_engine, lazy_load, strip_paragraphs):
     escape = styles.get('safe_mode', True)
     nofollow = styles.get('nofollow', True)
     texoid = TEXOID_ENABLED and styles.get('texoid', False)
@@ -179,11 +213,14 @@ def markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=F
     if lazy_load:
         post_processors.append(lazy_load_processor)
 
-    renderer = AwesomeRenderer(escape=escape, nofollow=nofollow, texoid=texoid,
-                               math=math and math_engine is not None, math_engine=math_engine)
-    markdown = mistune.Markdown(renderer=renderer, inline=AwesomeInlineLexer,
-                                parse_block_html=1, parse_inline_html=1)
-    result = markdown(value)
+    markdown = get_markdown_parser(bool(escape), bool(nofollow), bool(texoid), bool(math and math_engine is not None),
+                                   math_engine)
+    try:
+        result = markdown(value)
+    except Exception:
+        # The parser may have been left halfway through a document.
+        discard_markdown_parsers()
+        raise
 
     if post_processors or strip_paragraphs:
         tree = fragments_to_tree(result)
@@ -194,4 +231,51 @@ def markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=F
         result = fragment_tree_to_str(tree)
     if bleach_params:
         result = get_cleaner(style, bleach_params).clean(result)
-    return Markup(result)
+    return result
+
+
+def render_markdown_many(values, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    """Renders a list of markdown sources with the same options, fetching and storing them in the MARKDOWN_CACHE
+    cache with one round trip each."""
+    styles = settings.MARKDOWN_STYLES.get(style, settings.MARKDOWN_DEFAULT_STYLE)
+    cache = settings.MARKDOWN_CACHE and caches[settings.MARKDOWN_CACHE]
+
+    keys = {}
+    if cache:
+        prefix = '%s:%s:%s:%d%d:' % (style, get_style_digest(style, styles), math_engine, lazy_load, strip_paragraphs)
+        for value in values:
+            if isinstance(value, str) and value not in keys:
+                keys[value] = 'md:%s' % hashlib.sha1((prefix + value).encode('utf-8')).hexdigest()
+
+    cached = cache.get_many(list(keys.values())) if keys else {}
+    rendered = {}
+    results = []
+    for value in values:
+        key = keys.get(value)
+        if key in cached:
+            result = cached[key]
+        elif key in rendered:
+            result = rendered[key]
+        else:
+            result = render_markdown(value, style, styles, math_engine, lazy_load, strip_paragraphs)
+            if key is not None:
+                rendered[key] = result
+        results.append(Markup(result))
+
+    if rendered:
+        cache.set_many(rendered, settings.MARKDOWN_CACHE_TTL)
+    return results
+
+
+@registry.filter
+def markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    return render_markdown_many([value], style, math_engine, lazy_load, strip_paragraphs)[0]
+
+
+@registry.function
+def markdown_batch(objects, attribute, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    """Renders `attribute` of every object in one pass, returning the results by primary key."""
+    objects = list(objects)
+    results = render_markdown_many([getattr(obj, attribute) for obj in objects], style, math_engine, lazy_load,
+                                   strip_paragraphs)
+    return {obj.pk: result for obj, result in zip(objects, results)}
@@ -1,7 +1,10 @@
-from django.test import SimpleTestCase
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
 from lxml import html
 
-from . import fragment_tree_to_str, fragments_to_tree, get_cleaner, markdown
+from . import fragment_tree_to_str, fragments_to_tree, get_cleaner, markdown, render_markdown_many
 
 MATHML_N = """\
 <math xmlns="http://www.w3.org/1998/Math/MathML">
@@ -130,6 +133,19 @@ class TestMarkdown(SimpleTestCase):
                              '<p><noscript><img src="test.png"></noscript>'
                              '<img src="/static/blank.gif" data-src="test.png" class="unveil"></p>')
 
+    @override_settings(MARKDOWN_CACHE='default')
+    def test_cached(self):
+        caches['default'].clear()
+        self.assertHTMLEqual(markdown('**bold**', self.BLEACHED_STYLE), '<p><strong>bold</strong></p>')
+        with mock.patch('judge.jinja2.markdown.render_markdown') as render:
+            self.assertHTMLEqual(markdown('**bold**', self.BLEACHED_STYLE), '<p><strong>bold</strong></p>')
+            render.assert_not_called()
+
+    def test_batch(self):
+        values = ['*a*', '<script>void(0)</script>', '*a*', '']
+        self.assertEqual(render_markdown_many(values, self.BLEACHED_STYLE),
+                         [markdown(value, self.BLEACHED_STYLE) for value in values])
+
 
 class TestFragmentUtils(SimpleTestCase):
     def test_simple(self):
@@ -10,6 +10,7 @@ from django.utils.safestring import mark_safe
 from lxml.html import Element
 
 from judge import lxml_tree
+from judge.caching import get_user_references
 from judge.models import Contest, Problem, Profile
 from judge.ratings import rating_class, rating_progress
 from . import registry
@@ -51,15 +52,9 @@ def get_user_rating(username, data):
     return element
 
 
-def get_user_info(usernames):
-    return {name: (rank, rating) for name, rank, rating in
-            Profile.objects.filter(user__username__in=usernames)
-                   .values_list('user__username', 'display_rank', 'rating')}
-
-
 reference_map = {
-    'user': (get_user, get_user_info),
-    'ruser': (get_user_rating, get_user_info),
+    'user': (get_user, get_user_references),
+    'ruser': (get_user_rating, get_user_references),
 }
 
 
@@ -113,22 +108,34 @@ def update_tree(list, results, is_tail=False):
             link = child
 
 
-@registry.filter
-def reference(text):
-    tree = lxml_tree.fromstring(text)
+def reference_many(fragments):
+    """Resolves the references in every fragment with one lookup per reference type, rather than per fragment."""
+    trees = [lxml_tree.fromstring(text) for text in fragments]
     texts = []
     tails = []
     queries = defaultdict(list)
-    for element in tree.iter():
-        if element.text:
-            populate_list(queries, texts, element, *process_reference(element.text))
-        if element.tail:
-            populate_list(queries, tails, element, *process_reference(element.tail))
+    for tree in trees:
+        for element in tree.iter():
+            if element.text:
+                populate_list(queries, texts, element, *process_reference(element.text))
+            if element.tail:
+                populate_list(queries, tails, element, *process_reference(element.tail))
 
     results = {type: reference_map[type][1](values) for type, values in queries.items()}
     update_tree(texts, results, is_tail=False)
     update_tree(tails, results, is_tail=True)
-    return tree
+    return trees
+
+
+@registry.filter
+def reference(text):
+    return reference_many([text])[0]
+
+
+@registry.function
+def reference_batch(fragments):
+    """Like the reference filter, for a dict of fragments such as the one returned by markdown_batch."""
+    return dict(zip(fragments.keys(), reference_many(fragments.values())))
 
 
 @registry.filter
@@ -5,13 +5,19 @@ import struct
 import zlib
 
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.db import transaction
 from django.utils import timezone
+from reversion.models import Revision, Version
 
 from judge import event_poster as event
 from judge.judge_priority import BATCH_REJUDGE_PRIORITY, CONTEST_SUBMISSION_PRIORITY, DEFAULT_PRIORITY, REJUDGE_PRIORITY
+from judge.utils.iterator import chunk
 
 logger = logging.getLogger('judge.judgeapi')
 size_pack = struct.Struct('!I')
+REJUDGE_CHUNK_SIZE = 500
 
 
 def _post_update_submission(submission, done=False):
@@ -21,6 +27,11 @@ def _post_update_submission(submission, done=False):
                                    'contest': submission.contest_key,
                                    'user': submission.user_id, 'problem': submission.problem_id,
                                    'status': submission.status, 'language': submission.language.key})
+    if done and submission.contest_object_id is not None:
+        event.post('contest_%d' % submission.contest_object_id, {'type': 'submission', 'id': submission.id,
+                                                                 'user': submission.user_id,
+                                                                 'problem': submission.problem_id,
+                                                                 'status': submission.status})
 
 
 def judge_request(packet, reply=True):
@@ -73,7 +84,7 @@ def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=No
     # as that would prevent people from knowing a submission is being scheduled for rejudging.
     # It is worth noting that this mechanism does not prevent a new rejudge from being scheduled
     # while already queued, but that does not lead to data corruption.
-    if not Submission.objects.filter(id=submission.id).exclude(status__in=('P', 'G')).update(**updates):
+    if not Submission.objects.filter(id=submission.id).exclude(status__in=('P', 'G')).update_result(**updates):
         return False
 
     SubmissionTestCase.objects.filter(submission_id=submission.id).delete()
@@ -90,16 +101,105 @@ def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=No
         })
     except BaseException:
         logger.exception('Failed to send request to judge')
-        Submission.objects.filter(id=submission.id).update(status='IE', result='IE')
+        Submission.objects.filter(id=submission.id).update_result(status='IE', result='IE')
         success = False
     else:
         if response['name'] != 'submission-received' or response['submission-id'] != submission.id:
-            Submission.objects.filter(id=submission.id).update(status='IE', result='IE')
+            Submission.objects.filter(id=submission.id).update_result(status='IE', result='IE')
         _post_update_submission(submission)
         success = True
     return success
 
 
+def _save_rejudge_revision(submissions, user):
+    # Equivalent to a reversion revision following `test_cases`, but written with one bulk INSERT of versions.
+    from .models import Submission, SubmissionTestCase
+
+    revision = Revision.objects.create(date_created=timezone.now(), user=user, comment='Rejudged')
+    content_types = ContentType.objects.get_for_models(Submission, SubmissionTestCase)
+    versions = []
+    for submission in submissions:
+        for obj in [submission] + list(submission.test_cases.all()):
+            versions.append(Version(
+                revision=revision, object_id=str(obj.pk), content_type=content_types[type(obj)],
+                db='default', format='json', serialized_data=serializers.serialize('json', (obj,)),
+                object_repr=str(obj),
+            ))
+    Version.objects.bulk_create(versions, batch_size=REJUDGE_CHUNK_SIZE)
+
+
+def _rejudge_chunk(ids, rejudge_user):
+    from .models import ContestSubmission, Submission, SubmissionTestCase
+
+    updates = {'time': None, 'memory': None, 'points': None, 'result': None, 'case_points': 0, 'case_total': 0,
+               'error': None, 'rejudged_date': timezone.now(), 'status': 'QU'}
+
+    with transaction.atomic():
+        # As in judge_submission, submissions that are being graded right now are left alone.
+        ids = list(Submission.objects.filter(id__in=ids).exclude(status__in=('P', 'G'))
+                                     .select_for_update().values_list('id', flat=True))
+        if not ids:
+            return 0
+        submissions = list(Submission.objects.filter(id__in=ids)
+                                     .select_related('problem', 'user__user', 'language', 'source', 'contest_object')
+                                     .prefetch_related('test_cases'))
+        _save_rejudge_revision(submissions, rejudge_user)
+
+        Submission.objects.filter(id__in=ids).update_result(**updates)
+        pretested = {}
+        for sub_id, run_pretests_only, is_pretested in ContestSubmission.objects.filter(submission_id__in=ids) \
+                .values_list('submission_id', 'problem__contest__run_pretests_only', 'problem__is_pretested'):
+            pretested.setdefault(run_pretests_only and is_pretested, []).append(sub_id)
+        for is_pretested, sub_ids in pretested.items():
+            Submission.objects.filter(id__in=sub_ids).update(is_pretested=is_pretested)
+        SubmissionTestCase.objects.filter(submission_id__in=ids).delete()
+
+    try:
+        response = judge_request({
+            'name': 'submission-batch-request',
+            'submissions': [{
+                'submission-id': submission.id,
+                'problem-id': submission.problem.code,
+                'language': submission.language.key,
+                'source': submission.source.source,
+                'judge-id': None,
+                'priority': BATCH_REJUDGE_PRIORITY,
+            } for submission in submissions],
+        })
+    except Exception:
+        logger.exception('Failed to send batch request to judge')
+        # The bridge may have queued some of the batch before failing, and those a judge has already picked up
+        # are no longer queued. Only the rest are known not to be judged.
+        Submission.objects.filter(id__in=ids, status='QU').update_result(status='IE', result='IE')
+        return 0
+
+    received = set(response.get('submission-ids', ())) if response['name'] == 'submission-batch-received' else set()
+    rejected = [sub_id for sub_id in ids if sub_id not in received]
+    if rejected:
+        Submission.objects.filter(id__in=rejected).update_result(status='IE', result='IE')
+
+    for submission in submissions:
+        if submission.problem.is_public:
+            event.post('submissions', {'type': 'update-submission', 'id': submission.id,
+                                       'contest': submission.contest_object and submission.contest_object.key,
+                                       'user': submission.user_id, 'problem': submission.problem_id,
+                                       'status': 'QU', 'language': submission.language.key})
+    return len(received)
+
+
+def rejudge_submissions(queryset, rejudge_user=None, progress=None):
+    ids = list(queryset.exclude(locked_after__lt=timezone.now()).order_by('id').values_list('id', flat=True))
+    if progress is not None:
+        progress.total = len(ids)
+
+    rejudged = 0
+    for ids_chunk in chunk(ids, REJUDGE_CHUNK_SIZE):
+        rejudged += _rejudge_chunk(ids_chunk, rejudge_user)
+        if progress is not None:
+            progress.did(len(ids_chunk))
+    return rejudged
+
+
 def disconnect_judge(judge, force=False):
     judge_request({'name': 'disconnect-judge', 'judge-id': judge.name, 'force': force}, reply=False)
 
@@ -118,6 +218,6 @@ def abort_submission(submission):
     # This defaults to true, so that in the case the JudgeList fails to remove the submission from the queue,
     # and returns a bad-request, the submission is not falsely shown as "Aborted" when it will still be judged.
     if not response.get('judge-aborted', True):
-        Submission.objects.filter(id=submission.id).update(status='AB', result='AB', points=0)
+        Submission.objects.filter(id=submission.id).update_result(status='AB', result='AB', points=0)
         event.post('sub_%s' % Submission.get_id_secret(submission.id), {'type': 'aborted'})
         _post_update_submission(submission, done=True)
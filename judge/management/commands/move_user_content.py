@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
-from judge.models import Comment, CommentVote, ContestParticipation, Profile, Submission
+from judge.caching import invalidate_ac_heatmaps, invalidate_user_id_sets
+from judge.models import Comment, CommentVote, ContestParticipation, Profile, Submission, UserSubmissionResultCount
 
 
 class Command(BaseCommand):
@@ -27,5 +28,8 @@ class Command(BaseCommand):
 
         with transaction.atomic():
             Submission.objects.filter(user=source).update(user=target)
+            UserSubmissionResultCount.rebuild_users([source.id, target.id])
             Comment.objects.filter(author=source).update(author=target)
             CommentVote.objects.filter(voter=source).update(voter=target)
+        invalidate_user_id_sets([source.id, target.id])
+        invalidate_ac_heatmaps([source.id, target.id])
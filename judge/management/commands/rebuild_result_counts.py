@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from judge.models import SubmissionResultCount
+
+
+class Command(BaseCommand):
+    help = 'rebuilds the submission result counters from the submission table'
+
+    def handle(self, *args, **options):
+        SubmissionResultCount.rebuild()
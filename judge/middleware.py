@@ -1,13 +1,16 @@
 import base64
 import hmac
+import logging
 import re
 import struct
+import time
 from urllib.parse import quote
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.cache import cache
+from django.db import connection
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import Resolver404, resolve, reverse
 from django.utils.encoding import force_bytes
@@ -20,6 +23,40 @@ try:
 except ImportError:
     uwsgi = None
 
+api_logger = logging.getLogger('judge.api.esep')
+
+
+class APIInstrumentationMiddleware:
+    """Logs the latency and query count of every esep API call, by endpoint, to find the calls that dominate."""
+    prefix = '/api/esep/'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path_info.startswith(self.prefix):
+            return self.get_response(request)
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = getattr(match.func, 'view_class', match.func) if match is not None else None
+        endpoint = view.__name__ if view is not None else request.path_info
+        api_logger.info('%s %s: %d in %.1fms with %d queries', request.method, endpoint, response.status_code,
+                        elapsed * 1000, queries,
+                        extra={'endpoint': endpoint, 'latency': elapsed, 'queries': queries})
+        return response
+
 
 class ShortCircuitMiddleware:
     def __init__(self, get_response):
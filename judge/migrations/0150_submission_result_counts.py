@@ -0,0 +1,57 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_counts(apps, schema_editor):
+    schema_editor.execute("""\
+INSERT INTO `judge_submissionresultcount` (`problem_id`, `language_id`, `result`, `count`)
+SELECT `problem_id`, `language_id`, COALESCE(`result`, ''), COUNT(*)
+FROM `judge_submission`
+GROUP BY 1, 2, 3;
+""")
+    schema_editor.execute("""\
+INSERT INTO `judge_usersubmissionresultcount` (`user_id`, `result`, `count`)
+SELECT `user_id`, COALESCE(`result`, ''), COUNT(*)
+FROM `judge_submission`
+GROUP BY 1, 2;
+""")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0149_add_organization_private_problems_permission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionResultCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.CharField(blank=True, max_length=3, verbose_name='result')),
+                ('count', models.IntegerField(default=0, verbose_name='submission count')),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='judge.language', verbose_name='language')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='judge.problem', verbose_name='problem')),
+            ],
+            options={
+                'verbose_name': 'submission result count',
+                'verbose_name_plural': 'submission result counts',
+                'unique_together': {('problem', 'language', 'result')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSubmissionResultCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.CharField(blank=True, max_length=3, verbose_name='result')),
+                ('count', models.IntegerField(default=0, verbose_name='submission count')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='judge.profile', verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'user submission result count',
+                'verbose_name_plural': 'user submission result counts',
+                'unique_together': {('user', 'result')},
+            },
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop, atomic=False, elidable=True),
+    ]
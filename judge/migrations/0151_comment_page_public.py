@@ -0,0 +1,65 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+from judge.utils.iterator import chunk
+
+
+def populate_page_public(apps, schema_editor):
+    Comment = apps.get_model('judge', 'Comment')
+    Problem = apps.get_model('judge', 'Problem')
+    Solution = apps.get_model('judge', 'Solution')
+    Contest = apps.get_model('judge', 'Contest')
+    BlogPost = apps.get_model('judge', 'BlogPost')
+
+    # The same rules as the access checks of each page for a logged out user.
+    now = timezone.now()
+    pages = set(Comment.objects.order_by().values_list('page', flat=True).distinct())
+    codes = {}
+    for page in pages:
+        codes.setdefault(page[:2], []).append(page[2:])
+
+    public = set()
+    for group in chunk(codes.get('p:', []), 1000):
+        public.update('p:%s' % code for code in Problem.objects.filter(
+            code__in=group, is_public=True, is_organization_private=False,
+        ).values_list('code', flat=True))
+    for group in chunk(codes.get('s:', []), 1000):
+        public.update('s:%s' % code for code in Solution.objects.filter(
+            problem__code__in=group, is_public=True, publish_on__lt=now,
+            problem__is_public=True, problem__is_organization_private=False,
+        ).values_list('problem__code', flat=True))
+    for group in chunk(codes.get('c:', []), 1000):
+        public.update('c:%s' % key for key in Contest.objects.filter(
+            key__in=group, is_visible=True, is_private=False, is_organization_private=False,
+        ).values_list('key', flat=True))
+    for group in chunk([int(id) for id in codes.get('b:', []) if id.isdigit()], 1000):
+        public.update('b:%d' % id for id in BlogPost.objects.filter(
+            id__in=group, visible=True, publish_on__lte=now,
+        ).values_list('id', flat=True))
+
+    for group in chunk(public, 1000):
+        Comment.objects.filter(page__in=group).update(page_public=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0150_submission_result_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='page_public',
+            field=models.BooleanField(default=False, help_text='Whether the page is visible to everyone, maintained automatically.', verbose_name='public page'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['hidden', 'page_public', '-id'], name='judge_comme_hidden_e4e05b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['tree_id', 'lft'], name='judge_comment_tree_id_lft_idx'),
+        ),
+        migrations.RunPython(populate_page_public, migrations.RunPython.noop, elidable=True),
+    ]
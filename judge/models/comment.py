@@ -1,27 +1,35 @@
-import itertools
+from operator import attrgetter
 
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models import CASCADE
+from django.db.models import CASCADE, Q
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
 
+from judge.caching import RECENT_COMMENTS_KEY, RECENT_COMMENTS_TIMEOUT, invalidate_recent_comments
 from judge.models.contest import Contest
 from judge.models.interface import BlogPost
 from judge.models.problem import Problem, Solution
 from judge.models.profile import Profile
-from judge.utils.cachedict import CacheDict
 
 __all__ = ['Comment', 'CommentLock', 'CommentVote']
 
 comment_validator = RegexValidator(r'^[pcs]:[a-z0-9]+$|^b:\d+$',
                                    _(r'Page code must be ^[pcs]:[a-z0-9]+$|^b:\d+$'))
 
+# The number of recent comments on public pages that are kept cached.
+RECENT_COMMENTS_SIZE = 50
+# At most this many newer comments on other pages are considered for the recent comments of a user.
+RECENT_COMMENTS_SCAN = 200
+COMMENT_PAGE_ACCESS_TIMEOUT = 300
+
 
 class Comment(MPTTModel):
     author = models.ForeignKey(Profile, verbose_name=_('commenter'), on_delete=CASCADE)
@@ -34,61 +42,155 @@ class Comment(MPTTModel):
     parent = TreeForeignKey('self', verbose_name=_('parent'), null=True, blank=True, related_name='replies',
                             on_delete=CASCADE)
     revisions = models.IntegerField(verbose_name=_('revisions'), default=1)
+    page_public = models.BooleanField(verbose_name=_('public page'), default=False,
+                                      help_text=_('Whether the page is visible to everyone, maintained automatically.'))
 
     class Meta:
         verbose_name = _('comment')
         verbose_name_plural = _('comments')
 
+        indexes = [
+            # For the recent comments feed
+            models.Index(fields=['hidden', 'page_public', '-id']),
+        ]
+
     class MPTTMeta:
         order_insertion_by = ['-time']
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.page_public = self.is_page_accessible_by(self.page, AnonymousUser())
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def is_page_accessible_by(cls, page, user):
+        try:
+            if page.startswith('p:'):
+                return Problem.objects.get(code=page[2:]).is_accessible_by(user)
+            elif page.startswith('s:'):
+                solution = Solution.objects.select_related('problem').defer('content', 'problem__description') \
+                                           .get(problem__code=page[2:])
+                return solution.problem.is_accessible_by(user) and solution.is_accessible_by(user)
+            elif page.startswith('c:'):
+                return Contest.objects.defer('description').get(key=page[2:]).is_accessible_by(user)
+            elif page.startswith('b:'):
+                return BlogPost.objects.defer('summary', 'content').get(id=page[2:]).can_see(user)
+            else:
+                return True
+        except ObjectDoesNotExist:
+            return False
+
+    @classmethod
+    def update_page_public(cls, pages):
+        """Records whether each of `pages` is visible to everyone on its comments, after the page has changed."""
+        changed = False
+        for page in set(pages):
+            page_public = cls.is_page_accessible_by(page, AnonymousUser())
+            changed |= bool(cls.objects.filter(page=page).exclude(page_public=page_public)
+                            .update(page_public=page_public))
+        if changed:
+            invalidate_recent_comments()
+
+    @classmethod
+    def update_published_pages(cls):
+        """Records the blog posts and editorials that became visible to everyone when their publication date
+        passed, which no signal reports."""
+        pages = set(cls.objects.filter(Q(page__startswith='b:') | Q(page__startswith='s:'), page_public=False)
+                       .order_by().values_list('page', flat=True).distinct())
+        if not pages:
+            return
+        now = timezone.now()
+        ids = [int(page[2:]) for page in pages if page.startswith('b:')]
+        codes = [page[2:] for page in pages if page.startswith('s:')]
+        posts = BlogPost.objects.filter(id__in=ids, visible=True, publish_on__lte=now)
+        solutions = Solution.objects.filter(problem__code__in=codes, is_public=True, publish_on__lte=now)
+        published = ['b:%d' % id for id in posts.values_list('id', flat=True)]
+        published += ['s:%s' % code for code in solutions.values_list('problem__code', flat=True)]
+        cls.update_page_public(published)
+
+    @classmethod
+    def get_page_access(cls, user, pages):
+        """Returns whether the user can see each of `pages`, cached for a few minutes per user."""
+        key = 'comment_page_access:%s' % (user.id if user.is_authenticated else 'anonymous')
+        access = cache.get(key) or {}
+        missing = set(pages) - access.keys()
+        if missing:
+            for page in missing:
+                access[page] = cls.is_page_accessible_by(page, user)
+            cache.set(key, access, COMMENT_PAGE_ACCESS_TIMEOUT)
+        return access
+
+    @classmethod
+    def get_page_titles(cls, pages):
+        """Returns the titles of the pages that exist among `pages`, with one query per kind of page."""
+        codes = {}
+        for page in set(pages):
+            codes.setdefault(page[:2], []).append(page[2:])
+
+        titles = {}
+        problem_codes = codes.get('p:', []) + codes.get('s:', [])
+        if problem_codes:
+            names = dict(Problem.objects.filter(code__in=problem_codes).values_list('code', 'name'))
+            titles.update(('p:%s' % code, names[code]) for code in codes.get('p:', []) if code in names)
+            titles.update(('s:%s' % code, _('Editorial for %s') % names[code])
+                          for code in codes.get('s:', []) if code in names)
+        if 'c:' in codes:
+            titles.update(('c:%s' % key, name)
+                          for key, name in Contest.objects.filter(key__in=codes['c:']).values_list('key', 'name'))
+        if 'b:' in codes:
+            ids = [int(id) for id in codes['b:'] if id.isdigit()]
+            titles.update(('b:%d' % id, title)
+                          for id, title in BlogPost.objects.filter(id__in=ids).values_list('id', 'title'))
+        for prefix in codes.keys() - {'p:', 's:', 'c:', 'b:'}:
+            titles.update((prefix + code, '<unknown>') for code in codes[prefix])
+        return titles
+
     @classmethod
-    def most_recent(cls, user, n, batch=None):
-        queryset = cls.objects.filter(hidden=False).select_related('author__user') \
-            .defer('author__about', 'body').order_by('-id')
-
-        problem_cache = CacheDict(lambda code: Problem.objects.defer('description', 'summary').get(code=code))
-        solution_cache = CacheDict(lambda code: Solution.objects.defer('content').get(problem__code=code))
-        contest_cache = CacheDict(lambda key: Contest.objects.defer('description').get(key=key))
-        blog_cache = CacheDict(lambda id: BlogPost.objects.defer('summary', 'content').get(id=id))
-
-        problem_access = CacheDict(lambda code: problem_cache[code].is_accessible_by(user))
-        solution_access = CacheDict(lambda code: problem_access[code] and solution_cache[code].is_accessible_by(user))
-        contest_access = CacheDict(lambda key: contest_cache[key].is_accessible_by(user))
-        blog_access = CacheDict(lambda id: blog_cache[id].can_see(user))
-
-        if batch is None:
-            batch = 2 * n
-        output = []
-        for i in itertools.count(0):
-            slice = queryset[i * batch:i * batch + batch]
-            if not slice:
-                break
-            for comment in slice:
-                page_key = comment.page[2:]
-                try:
-                    if comment.page.startswith('p:'):
-                        has_access = problem_access[page_key]
-                        comment.page_title = problem_cache[page_key].name
-                    elif comment.page.startswith('s:'):
-                        has_access = solution_access[page_key]
-                        comment.page_title = _('Editorial for %s') % problem_cache[page_key].name
-                    elif comment.page.startswith('c:'):
-                        has_access = contest_access[page_key]
-                        comment.page_title = contest_cache[page_key].name
-                    elif comment.page.startswith('b:'):
-                        has_access = blog_access[page_key]
-                        comment.page_title = blog_cache[page_key].title
-                    else:
-                        has_access = True
-                except ObjectDoesNotExist:
-                    pass
-                else:
-                    if has_access:
-                        output.append(comment)
-                if len(output) >= n:
-                    return output
-        return output
+    def _with_page_titles(cls, comments):
+        titles = cls.get_page_titles(comment.page for comment in comments)
+        result = []
+        for comment in comments:
+            if comment.page in titles:
+                comment.page_title = titles[comment.page]
+                result.append(comment)
+        return result
+
+    @classmethod
+    def recent_public(cls, n):
+        """The n most recent visible comments on pages that everyone can see, newest first.
+
+        Pages that were published since are updated whenever the cached list is rebuilt.
+        """
+        queryset = cls.objects.filter(hidden=False, page_public=True).select_related('author__user') \
+                              .defer('author__about', 'body').order_by('-id')
+        if n > RECENT_COMMENTS_SIZE:
+            return cls._with_page_titles(list(queryset[:n]))
+
+        comments = cache.get(RECENT_COMMENTS_KEY)
+        if comments is None:
+            cls.update_published_pages()
+            comments = cls._with_page_titles(list(queryset[:RECENT_COMMENTS_SIZE]))
+            cache.set(RECENT_COMMENTS_KEY, comments, RECENT_COMMENTS_TIMEOUT)
+        return comments[:n]
+
+    @classmethod
+    def most_recent(cls, user, n):
+        """The n most recent visible comments on pages that the user can see, newest first.
+
+        Comments on public pages come from a maintained list. Comments on other pages are only considered if they
+        are newer than the oldest of those, and are checked against the user's access to their pages.
+        """
+        comments = cls.recent_public(n)
+        queryset = cls.objects.filter(hidden=False, page_public=False).select_related('author__user') \
+                              .defer('author__about', 'body').order_by('-id')
+        if len(comments) >= n:
+            queryset = queryset.filter(id__gt=comments[-1].id)
+        others = list(queryset[:RECENT_COMMENTS_SCAN])
+        if others:
+            access = cls.get_page_access(user, {comment.page for comment in others})
+            others = cls._with_page_titles([comment for comment in others if access[comment.page]])
+            comments = sorted(comments + others, key=attrgetter('id'), reverse=True)
+        return comments[:n]
 
     @cached_property
     def link(self):
@@ -1,22 +1,26 @@
 import hashlib
 import hmac
+from collections import Counter
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from reversion import revisions
 
+from judge.caching import invalidate_ac_heatmaps, invalidate_contest_problem_status
 from judge.judgeapi import abort_submission, judge_submission
 from judge.models.problem import Problem, SubmissionSourceAccess
 from judge.models.profile import Profile
 from judge.models.runtime import Language
 from judge.utils.unicode import utf8bytes
 
-__all__ = ['SUBMISSION_RESULT', 'Submission', 'SubmissionSource', 'SubmissionTestCase']
+__all__ = ['SUBMISSION_RESULT', 'Submission', 'SubmissionResultCount', 'SubmissionSource', 'SubmissionTestCase',
+           'UserSubmissionResultCount']
 
 SUBMISSION_RESULT = (
     ('AC', _('Accepted')),
@@ -33,6 +37,26 @@ SUBMISSION_RESULT = (
 )
 
 
+class SubmissionQuerySet(models.QuerySet):
+    def update_result(self, **updates):
+        # Updates that touch `result` must go through here so that the result counters stay in step.
+        with transaction.atomic():
+            changed = list(self.select_for_update().values_list('problem_id', 'language_id', 'user_id', 'result',
+                                                                'contest_object_id'))
+            if not changed:
+                return 0
+            count = self.update(**updates)
+            SubmissionResultCount.record([row[:4] for row in changed], updates['result'])
+            transaction.on_commit(lambda: invalidate_contest_problem_status(
+                (contest_id, user_id) for _, _, user_id, _, contest_id in changed))
+            if updates['result'] != 'AC':
+                transaction.on_commit(lambda: invalidate_ac_heatmaps(
+                    user_id for _, _, user_id, result, _ in changed if result == 'AC'))
+        return count
+
+    update_result.alters_data = True
+
+
 @revisions.register(follow=['test_cases'])
 class Submission(models.Model):
     STATUS = (
@@ -89,6 +113,8 @@ class Submission(models.Model):
                                        on_delete=models.SET_NULL, related_name='+', db_index=False)
     locked_after = models.DateTimeField(verbose_name=_('submission lock'), null=True, blank=True)
 
+    objects = SubmissionQuerySet.as_manager()
+
     @classmethod
     def result_class_from_code(cls, result, case_points, case_total):
         if result == 'AC':
@@ -258,6 +284,98 @@ class Submission(models.Model):
         ]
 
 
+def _add_to_count(model, delta, **key):
+    if not delta:
+        return
+    if model.objects.filter(**key).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **key)
+    except IntegrityError:
+        model.objects.filter(**key).update(count=F('count') + delta)
+
+
+class SubmissionResultCount(models.Model):
+    problem = models.ForeignKey(Problem, verbose_name=_('problem'), on_delete=models.CASCADE, related_name='+')
+    language = models.ForeignKey(Language, verbose_name=_('language'), on_delete=models.CASCADE, related_name='+')
+    # Empty string stands for submissions without a result yet, since NULLs do not participate in unique keys.
+    result = models.CharField(verbose_name=_('result'), max_length=3, blank=True)
+    count = models.IntegerField(verbose_name=_('submission count'), default=0)
+
+    @classmethod
+    def record(cls, changed, new_result):
+        """Move each (problem_id, language_id, user_id, old_result) in `changed` to `new_result`."""
+        new_result = new_result or ''
+        deltas = Counter()
+        user_deltas = Counter()
+        for problem_id, language_id, user_id, old_result in changed:
+            old_result = old_result or ''
+            if old_result == new_result:
+                continue
+            deltas[problem_id, language_id, old_result] -= 1
+            deltas[problem_id, language_id, new_result] += 1
+            user_deltas[user_id, old_result] -= 1
+            user_deltas[user_id, new_result] += 1
+
+        for (problem_id, language_id, result), delta in deltas.items():
+            _add_to_count(cls, delta, problem_id=problem_id, language_id=language_id, result=result)
+        for (user_id, result), delta in user_deltas.items():
+            _add_to_count(UserSubmissionResultCount, delta, user_id=user_id, result=result)
+
+    @classmethod
+    def add(cls, submission, delta=1):
+        result = submission.result or ''
+        _add_to_count(cls, delta, problem_id=submission.problem_id, language_id=submission.language_id,
+                      result=result)
+        _add_to_count(UserSubmissionResultCount, delta, user_id=submission.user_id, result=result)
+
+    @classmethod
+    def rebuild(cls):
+        counts = Submission.objects.order_by().values('problem_id', 'language_id', 'result') \
+                           .annotate(count=models.Count('id'))
+        user_counts = Submission.objects.order_by().values('user_id', 'result').annotate(count=models.Count('id'))
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(problem_id=row['problem_id'], language_id=row['language_id'], result=row['result'] or '',
+                    count=row['count']) for row in counts
+            ], batch_size=1000)
+            UserSubmissionResultCount.objects.all().delete()
+            UserSubmissionResultCount.objects.bulk_create([
+                UserSubmissionResultCount(user_id=row['user_id'], result=row['result'] or '', count=row['count'])
+                for row in user_counts
+            ], batch_size=1000)
+
+    class Meta:
+        unique_together = ('problem', 'language', 'result')
+        verbose_name = _('submission result count')
+        verbose_name_plural = _('submission result counts')
+
+
+class UserSubmissionResultCount(models.Model):
+    user = models.ForeignKey(Profile, verbose_name=_('user'), on_delete=models.CASCADE, related_name='+')
+    result = models.CharField(verbose_name=_('result'), max_length=3, blank=True)
+    count = models.IntegerField(verbose_name=_('submission count'), default=0)
+
+    @classmethod
+    def rebuild_users(cls, user_ids):
+        counts = Submission.objects.filter(user_id__in=user_ids).order_by().values('user_id', 'result') \
+                           .annotate(count=models.Count('id'))
+
+        with transaction.atomic():
+            cls.objects.filter(user_id__in=user_ids).delete()
+            cls.objects.bulk_create([
+                cls(user_id=row['user_id'], result=row['result'] or '', count=row['count']) for row in counts
+            ], batch_size=1000)
+
+    class Meta:
+        unique_together = ('user', 'result')
+        verbose_name = _('user submission result count')
+        verbose_name_plural = _('user submission result counts')
+
+
 class SubmissionSource(models.Model):
     submission = models.OneToOneField(Submission, on_delete=models.CASCADE, verbose_name=_('associated submission'),
                                       related_name='source')
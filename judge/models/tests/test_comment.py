@@ -0,0 +1,91 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from judge.admin.problem import ProblemAdmin
+from judge.models import BlogPost, Comment, Problem
+from judge.models.tests.util import CommonDataMixin, create_blogpost, create_problem
+
+
+class CommentMostRecentTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        author = self.users['normal'].profile
+        self.public_problem = create_problem(code='recent_public', is_public=True)
+        self.private_problem = create_problem(code='recent_private', authors=('staff_problem_edit_own',))
+        self.post = create_blogpost(title='recent_post', visible=True)
+
+        self.comments = {}
+        for name, page in (('public', 'p:recent_public'), ('private', 'p:recent_private'),
+                           ('post', 'b:%d' % self.post.id), ('deleted', 'p:recent_deleted'),
+                           ('public_2', 'p:recent_public')):
+            self.comments[name] = Comment.objects.create(author=author, page=page, body=name)
+        Comment.objects.create(author=author, page='p:recent_public', body='hidden', hidden=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def most_recent(self, user, n=10):
+        return [comment.id for comment in Comment.most_recent(user, n)]
+
+    def ids(self, *names):
+        return [self.comments[name].id for name in names]
+
+    def test_page_public(self):
+        self.assertEqual({name: comment.page_public for name, comment in self.comments.items()}, {
+            'public': True, 'private': False, 'post': True, 'deleted': False, 'public_2': True,
+        })
+
+    def test_anonymous(self):
+        self.assertEqual(self.most_recent(AnonymousUser()), self.ids('public_2', 'post', 'public'))
+        self.assertEqual(self.most_recent(AnonymousUser(), 2), self.ids('public_2', 'post'))
+
+    def test_private_page(self):
+        self.assertEqual(self.most_recent(self.users['staff_problem_edit_own']),
+                         self.ids('public_2', 'post', 'private', 'public'))
+        self.assertEqual(self.most_recent(self.users['normal']), self.ids('public_2', 'post', 'public'))
+
+    def test_page_titles(self):
+        titles = {comment.id: comment.page_title for comment in Comment.most_recent(self.users['superuser'], 10)}
+        self.assertEqual(titles[self.comments['post'].id], 'recent_post')
+        self.assertEqual(titles[self.comments['private'].id], 'recent_private')
+
+    def test_cached(self):
+        self.most_recent(AnonymousUser())
+        # Only the comments on other pages that are newer than the public ones are queried.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.most_recent(AnonymousUser()), self.ids('public_2', 'post', 'public'))
+
+    def test_page_visibility_change(self):
+        self.most_recent(AnonymousUser())
+        self.public_problem.is_public = False
+        self.public_problem.save()
+        self.assertEqual(self.most_recent(AnonymousUser()), self.ids('post'))
+        self.assertFalse(Comment.objects.get(id=self.comments['public'].id).page_public)
+
+        self.post.visible = False
+        self.post.save()
+        self.assertEqual(self.most_recent(AnonymousUser()), [])
+
+    def test_published_page(self):
+        post = create_blogpost(title='recent_scheduled', visible=True, publish_on=timezone.now() + timedelta(days=1))
+        comment = Comment.objects.create(author=self.users['superuser'].profile, page='b:%d' % post.id, body='early')
+        self.assertNotIn(comment.id, self.most_recent(AnonymousUser()))
+
+        BlogPost.objects.filter(id=post.id).update(publish_on=timezone.now())
+        cache.clear()
+        self.assertEqual(self.most_recent(AnonymousUser())[0], comment.id)
+
+    def test_admin_make_private(self):
+        self.most_recent(AnonymousUser())
+        request = RequestFactory().post('/')
+        request.user = self.users['superuser']
+        with mock.patch.object(ProblemAdmin, 'message_user'):
+            ProblemAdmin(Problem, AdminSite()).make_private(request, Problem.objects.filter(id=self.public_problem.id))
+        self.assertEqual(self.most_recent(AnonymousUser()), self.ids('post'))
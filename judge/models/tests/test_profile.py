@@ -3,10 +3,13 @@ import hmac
 import struct
 
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 
+from judge.caching import get_rating_rank, get_user_references
+from judge.jinja2.reference import reference_batch
 from judge.models import Profile
 from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation
 
@@ -126,3 +129,49 @@ class ProfileTestCase(CommonDataMixin, TestCase):
             Profile.get_user_css_class(display_rank='random', rating=1299, rating_colors=False),
             'random',
         )
+
+
+class UserReferenceTestCase(CommonDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached(self):
+        self.assertEqual(get_user_references(['normal', 'nonexistent']), {'normal': ('user', None)})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_references(['normal', 'nonexistent']), {'normal': ('user', None)})
+
+    def test_long_username(self):
+        # Longer than memcached allows in a key.
+        self.assertEqual(get_user_references(['x' * 300]), {})
+
+    def test_invalidated_on_save(self):
+        get_user_references(['normal'])
+        profile = self.users['normal'].profile
+        profile.display_rank = 'admin'
+        profile.save()
+        self.assertEqual(get_user_references(['normal']), {'normal': ('admin', None)})
+
+    def test_batch(self):
+        fragments = {i: '<p>[user:normal] and [user:superuser]</p>' for i in range(10)}
+        with self.assertNumQueries(1):
+            trees = reference_batch(fragments)
+        self.assertEqual(trees.keys(), fragments.keys())
+        self.assertEqual(len(trees[0].xpath('.//a')), 2)
+
+
+class RatingRankTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        for username, rating in (('normal', 1500), ('superuser', 2000), ('staff_problem_edit_own', 1500)):
+            Profile.objects.filter(user__username=username).update(rating=rating)
+        Profile.objects.filter(user__username='staff_organization_admin').update(rating=3000, is_unlisted=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rank(self):
+        self.assertEqual(get_rating_rank(2000), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rating_rank(1500), 2)
+            self.assertEqual(get_rating_rank(1000), 4)
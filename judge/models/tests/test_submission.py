@@ -1,9 +1,17 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from judge.models import ContestSubmission, Language, Submission, SubmissionSource
+from judge.caching import ID_SET_TIMEOUT, USER_COMPLETE_IDS_KEY, finished_submission, get_ac_heatmap, pack_ids, \
+    update_versioned
+from judge.models import ContestSubmission, Language, Problem, Profile, Submission, SubmissionResultCount, \
+    SubmissionSource, UserSubmissionResultCount
 from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
     create_contest_problem, create_problem, create_user
+from judge.tasks import rescore_submissions
+from judge.utils.problems import get_counted_result_data, get_result_data, user_attempted_ids, user_completed_ids
 
 
 class SubmissionTestCase(CommonDataMixin, TestCase):
@@ -188,3 +196,209 @@ class SubmissionTestCase(CommonDataMixin, TestCase):
             },
         }
         self._test_object_methods_with_users(self.ie_submission, data)
+
+
+class SubmissionResultCountTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='counted')
+        self.submissions = [
+            Submission.objects.create(
+                user=self.users['normal'].profile,
+                problem=self.problem,
+                language=Language.get_python3(),
+                result=result,
+            ) for result in ('AC', 'WA', 'WA', None)
+        ]
+
+    def assertCounts(self, expected):
+        self.assertEqual(get_counted_result_data(problem_id=self.problem.id),
+                         get_result_data(problem_id=self.problem.id))
+        self.assertEqual(get_counted_result_data(user_id=self.users['normal'].profile.id),
+                         get_result_data(user_id=self.users['normal'].profile.id))
+        counts = dict(SubmissionResultCount.objects.filter(problem=self.problem).values_list('result', 'count'))
+        self.assertEqual({result: count for result, count in counts.items() if count}, expected)
+
+    def test_created(self):
+        self.assertCounts({'AC': 1, 'WA': 2, '': 1})
+
+    def test_update_result(self):
+        Submission.objects.filter(id=self.submissions[1].id).update_result(status='QU', result=None)
+        self.assertCounts({'AC': 1, 'WA': 1, '': 2})
+        Submission.objects.filter(problem=self.problem, result=None).update_result(status='CE', result='CE')
+        self.assertCounts({'AC': 1, 'WA': 1, 'CE': 2})
+
+    def test_delete(self):
+        self.submissions[0].delete()
+        self.assertCounts({'WA': 2, '': 1})
+
+    def test_rebuild(self):
+        SubmissionResultCount.objects.all().delete()
+        SubmissionResultCount.rebuild()
+        self.assertCounts({'AC': 1, 'WA': 2, '': 1})
+
+    def test_moved_user(self):
+        source, target = self.users['normal'].profile, self.users['superuser'].profile
+        Submission.objects.filter(user=source).update(user=target)
+        UserSubmissionResultCount.rebuild_users([source.id, target.id])
+        self.assertEqual(get_counted_result_data(user_id=source.id), get_result_data(user_id=source.id))
+        self.assertEqual(get_counted_result_data(user_id=target.id), get_result_data(user_id=target.id))
+
+
+class SubmissionIdSetTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.profile = self.users['normal'].profile
+        self.solved = create_problem(code='id_set_solved')
+        self.unsolved = create_problem(code='id_set_unsolved')
+        Submission.objects.create(user=self.profile, problem=self.solved, language=Language.get_python3(),
+                                  result='AC', case_points=1, case_total=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, problem, result, case_points=1):
+        return Submission.objects.create(user=self.profile, problem=problem, language=Language.get_python3(),
+                                         result=result, case_points=case_points, case_total=1)
+
+    def test_unchanged_sets_kept(self):
+        self.submit(self.unsolved, 'WA', 0)
+        user_completed_ids(self.profile)
+        user_attempted_ids(self.profile)
+
+        finished_submission(self.submit(self.solved, 'AC'))
+        finished_submission(self.submit(self.unsolved, 'WA', 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(user_completed_ids(self.profile), {self.solved.id})
+            self.assertEqual(user_attempted_ids(self.profile), {self.solved.id, self.unsolved.id})
+
+    def test_changed_sets_updated(self):
+        user_completed_ids(self.profile)
+        user_attempted_ids(self.profile)
+
+        finished_submission(self.submit(self.unsolved, 'WA', 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(user_completed_ids(self.profile), {self.solved.id})
+            self.assertEqual(user_attempted_ids(self.profile), {self.solved.id, self.unsolved.id})
+
+        finished_submission(self.submit(self.unsolved, 'AC'))
+        with self.assertNumQueries(0):
+            self.assertEqual(user_completed_ids(self.profile), {self.solved.id, self.unsolved.id})
+
+    def test_concurrent_update(self):
+        user_completed_ids(self.profile)
+        key = USER_COMPLETE_IDS_KEY % self.profile.id
+
+        def update(data):
+            # Another submission finishes between this update reading the set and storing it.
+            cache.incr(key)
+            return pack_ids({self.solved.id, self.unsolved.id})
+
+        update_versioned(key, update, ID_SET_TIMEOUT)
+        with self.assertNumQueries(1):
+            self.assertEqual(user_completed_ids(self.profile), {self.solved.id})
+
+    def test_no_longer_completed(self):
+        user_completed_ids(self.profile)
+        submission = Submission.objects.get(problem=self.solved)
+        submission.result = 'WA'
+        submission.save()
+        finished_submission(submission)
+        self.assertEqual(user_completed_ids(self.profile), set())
+
+
+class ACHeatmapTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.profile = self.users['normal'].profile
+        self.problems = [create_problem(code='heatmap_%d' % i) for i in range(2)]
+        self.day = timezone.localdate(timezone.now(), timezone.get_default_timezone()).isoformat()
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, problem, result):
+        return Submission.objects.create(user=self.profile, problem=problem, language=Language.get_python3(),
+                                         result=result, case_points=1, case_total=1)
+
+    def test_finished(self):
+        self.submit(self.problems[0], 'AC')
+        self.assertEqual(get_ac_heatmap(self.profile), {self.day: 1})
+
+        finished_submission(self.submit(self.problems[0], 'AC'))
+        finished_submission(self.submit(self.problems[1], 'WA'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_ac_heatmap(self.profile), {self.day: 1})
+
+        finished_submission(self.submit(self.problems[1], 'AC'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_ac_heatmap(self.profile), {self.day: 2})
+
+    def test_rejudged(self):
+        submission = self.submit(self.problems[0], 'AC')
+        get_ac_heatmap(self.profile)
+        with self.captureOnCommitCallbacks(execute=True):
+            Submission.objects.filter(id=submission.id).update_result(result=None)
+        self.assertEqual(get_ac_heatmap(self.profile), {})
+
+
+class RescoreSubmissionsTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='rescored', points=10, partial=True, is_public=True)
+        self.full_only = create_problem(code='rescored_full', points=10, partial=False, is_public=True)
+        contest = create_contest(key='rescored')
+        participation = create_contest_participation(contest=contest, user='normal')
+        self.contest_problem = create_contest_problem(contest=contest, problem=self.problem, points=50, partial=True)
+
+        self.partial_submission = self.submit(self.problem, case_points=1, case_total=3)
+        self.contest_submission = self.submit(self.problem, case_points=2, case_total=4)
+        self.participation = participation
+        ContestSubmission.objects.create(submission=self.contest_submission, problem=self.contest_problem,
+                                         participation=participation)
+        self.failed_submission = self.submit(self.full_only, case_points=1, case_total=2)
+        self.solved_submission = self.submit(self.full_only, case_points=2, case_total=2)
+        self.empty_submission = self.submit(self.full_only, case_points=0, case_total=0)
+
+    @classmethod
+    def submit(cls, problem, case_points, case_total):
+        return Submission.objects.create(user=cls.users['normal'].profile, problem=problem,
+                                         language=Language.get_python3(), result='AC', status='D',
+                                         case_points=case_points, case_total=case_total)
+
+    def test_rescore(self):
+        self.assertEqual(rescore_submissions(Submission.objects.filter(user=self.users['normal'].profile)), 5)
+
+        points = dict(Submission.objects.values_list('id', 'points'))
+        self.assertEqual(points[self.partial_submission.id], 3.3)
+        self.assertEqual(points[self.contest_submission.id], 5)
+        self.assertEqual(points[self.failed_submission.id], 0)
+        self.assertEqual(points[self.solved_submission.id], 10)
+        self.assertEqual(points[self.empty_submission.id], 0)
+
+        contest_submission = ContestSubmission.objects.get(submission=self.contest_submission)
+        self.assertEqual(contest_submission.points, 25)
+        self.assertEqual(contest_submission.participation.score, 25)
+        self.assertEqual(Profile.objects.get(id=self.users['normal'].profile.id).problem_count, 1)
+
+    def rescore(self, points):
+        # Every measured run changes the points, so that the conditional profile update runs each time.
+        Problem.objects.filter(id__in=[self.problem.id, self.full_only.id]).update(points=points)
+        with CaptureQueriesContext(connection) as queries:
+            rescored = rescore_submissions(Submission.objects.filter(user=self.users['normal'].profile))
+        return rescored, len(queries)
+
+    def test_constant_queries(self):
+        self.rescore(10)
+        rescored, query_count = self.rescore(20)
+        self.assertEqual(rescored, 5)
+
+        for i in range(10):
+            ContestSubmission.objects.create(submission=self.submit(self.problem, case_points=i, case_total=10),
+                                             problem=self.contest_problem, participation=self.participation)
+            self.submit(self.full_only, case_points=i, case_total=10)
+        self.assertEqual(self.rescore(30), (25, query_count))
@@ -8,6 +8,9 @@ from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
 
+from judge.caching import invalidate_rating_rank_index, invalidate_user_references
+from judge.utils.lookups import profile_lookup
+
 
 BETA2 = 328.33 ** 2
 RATING_INIT = 1200      # Newcomer's rating when applying the rating floor/ceiling
@@ -185,9 +188,13 @@ def rate_contest(contest):
     with transaction.atomic():
         Rating.objects.bulk_create(ratings)
 
-        Profile.objects.filter(contest_history__contest=contest, contest_history__virtual=0).update(
-            rating=Subquery(Rating.objects.filter(user=OuterRef('id'))
-                            .order_by('-contest__end_time').values('rating')[:1]))
+        rated = Profile.objects.filter(contest_history__contest=contest, contest_history__virtual=0)
+        rated.update(rating=Subquery(Rating.objects.filter(user=OuterRef('id'))
+                                     .order_by('-contest__end_time').values('rating')[:1]))
+        rated_profiles = list(rated.values_list('id', 'user__username'))
+    transaction.on_commit(lambda: invalidate_user_references([username for _, username in rated_profiles]))
+    transaction.on_commit(lambda: profile_lookup.invalidate([id for id, _ in rated_profiles]))
+    transaction.on_commit(invalidate_rating_rank_index)
 
 
 RATING_LEVELS = [
@@ -3,14 +3,18 @@ import os
 from typing import Optional
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from .caching import finished_submission
+from .caching import deleted_submission, invalidate_comment_trees, invalidate_contest_staff_ids, \
+    invalidate_recent_comments, invalidate_user_references
 from .models import BlogPost, Comment, Contest, ContestProblem, ContestSubmission, EFFECTIVE_MATH_ENGINES, Judge, \
-    Language, License, MiscConfig, Organization, Problem, Profile, Submission, WebAuthnCredential
+    Language, License, MiscConfig, Organization, Problem, Profile, Solution, Submission, SubmissionResultCount, \
+    WebAuthnCredential
+from .utils.lookups import contest_lookup, language_lookup, problem_lookup, profile_lookup
 
 
 def get_pdf_path(basename: str) -> Optional[str]:
@@ -59,6 +63,7 @@ def profile_update(sender, instance, **kwargs):
                        for engine in EFFECTIVE_MATH_ENGINES] +
                       [make_template_fragment_key('org_member_count', (org_id,))
                        for org_id in instance.organizations.values_list('id', flat=True)])
+    invalidate_user_references([instance.user.username])
 
 
 @receiver(post_delete, sender=WebAuthnCredential)
@@ -79,6 +84,20 @@ def contest_update(sender, instance, **kwargs):
                        for engine in EFFECTIVE_MATH_ENGINES])
 
 
+@receiver(m2m_changed, sender=Contest.authors.through)
+@receiver(m2m_changed, sender=Contest.curators.through)
+@receiver(m2m_changed, sender=Contest.testers.through)
+def contest_staff_update(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_contest_staff_ids([instance.id])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_contest_staff_ids(pk_set)
+    elif action == 'pre_clear':
+        # The contests of a profile whose memberships are cleared are only known beforehand.
+        invalidate_contest_staff_ids(sender.objects.filter(profile=instance).values_list('contest_id', flat=True))
+
+
 @receiver(post_delete, sender=ContestProblem)
 def contest_problem_delete(sender, instance, **kwargs):
     # `contest_object` is the `Contest` object indirectly associated with the `Submission` object
@@ -105,6 +124,14 @@ def judge_update(sender, instance, **kwargs):
 @receiver(post_save, sender=Comment)
 def comment_update(sender, instance, **kwargs):
     cache.delete('comment_feed:%d' % instance.id)
+    invalidate_comment_trees([instance.page])
+    invalidate_recent_comments()
+
+
+@receiver(post_delete, sender=Comment)
+def comment_delete(sender, instance, **kwargs):
+    invalidate_comment_trees([instance.page])
+    invalidate_recent_comments()
 
 
 @receiver(post_save, sender=BlogPost)
@@ -118,9 +145,16 @@ def post_update(sender, instance, **kwargs):
                        for engine in EFFECTIVE_MATH_ENGINES])
 
 
+@receiver(post_save, sender=Submission)
+def submission_create(sender, instance, created, **kwargs):
+    if created:
+        SubmissionResultCount.add(instance)
+
+
 @receiver(post_delete, sender=Submission)
 def submission_delete(sender, instance, **kwargs):
-    finished_submission(instance)
+    SubmissionResultCount.add(instance, -1)
+    deleted_submission(instance)
     instance.user._updating_stats_only = True
     instance.user.calculate_points()
     instance.problem._updating_stats_only = True
@@ -153,3 +187,64 @@ def misc_config_delete(sender, instance, **kwargs):
 @receiver(post_save, sender=ContestSubmission)
 def contest_submission_update(sender, instance, **kwargs):
     Submission.objects.filter(id=instance.submission_id).update(contest_object_id=instance.participation.contest_id)
+
+
+# The cached lookups are invalidated on every save, including those that only update statistics.
+@receiver(post_save, sender=Contest)
+@receiver(post_delete, sender=Contest)
+def contest_lookup_update(sender, instance, **kwargs):
+    contest_lookup.invalidate([instance.id])
+
+
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def problem_lookup_update(sender, instance, **kwargs):
+    problem_lookup.invalidate([instance.id])
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def language_lookup_update(sender, instance, **kwargs):
+    language_lookup.invalidate([instance.id])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_lookup_update(sender, instance, **kwargs):
+    profile_lookup.invalidate([instance.id])
+
+
+@receiver(post_save, sender=User)
+def user_lookup_update(sender, instance, update_fields=None, **kwargs):
+    # Profiles are cached with their user, but most user saves only record a login.
+    if update_fields is None or 'username' in update_fields or 'is_active' in update_fields:
+        profile_lookup.invalidate(Profile.objects.filter(user=instance).values_list('id', flat=True))
+
+
+# Comments record whether their page is visible to everyone, for the recent comments feed.
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def problem_comment_page_update(sender, instance, **kwargs):
+    if hasattr(instance, '_updating_stats_only'):
+        return
+    Comment.update_page_public(['p:%s' % instance.code, 's:%s' % instance.code])
+
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+def solution_comment_page_update(sender, instance, **kwargs):
+    Comment.update_page_public(['s:%s' % instance.problem.code])
+
+
+@receiver(post_save, sender=Contest)
+@receiver(post_delete, sender=Contest)
+def contest_comment_page_update(sender, instance, **kwargs):
+    if hasattr(instance, '_updating_stats_only'):
+        return
+    Comment.update_page_public(['c:%s' % instance.key])
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def post_comment_page_update(sender, instance, **kwargs):
+    Comment.update_page_public(['b:%d' % instance.id])
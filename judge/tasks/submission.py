@@ -1,13 +1,18 @@
 from celery import shared_task
 from django.contrib.auth.models import User
-from django.core.cache import cache
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Round
+from django.db.models.lookups import Exact, GreaterThanOrEqual
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from judge.models import Problem, Profile, Submission
+from judge.caching import invalidate_user_id_sets
+from judge.judgeapi import rejudge_submissions
+from judge.models import ContestParticipation, ContestProblem, Problem, Profile, Submission
 from judge.utils.celery import Progress
 
-__all__ = ('apply_submission_filter', 'rejudge_problem_filter', 'rescore_problem')
+__all__ = ('apply_submission_filter', 'rejudge_problem_filter', 'rejudge_submission_ids', 'rescore_problem',
+           'rescore_submissions')
 
 
 def apply_submission_filter(queryset, id_range, languages, results):
@@ -29,43 +34,74 @@ def rejudge_problem_filter(self, problem_id, id_range=None, languages=None, resu
     queryset = apply_submission_filter(queryset, id_range, languages, results)
     user = User.objects.get(id=user_id)
 
-    rejudged = 0
-    with Progress(self, queryset.count()) as p:
-        for submission in queryset.iterator():
-            submission.judge(rejudge=True, batch_rejudge=True, rejudge_user=user)
-            rejudged += 1
-            if rejudged % 10 == 0:
-                p.done = rejudged
-    return rejudged
+    with Progress(self, 0) as p:
+        return rejudge_submissions(queryset, rejudge_user=user, progress=p)
 
 
 @shared_task(bind=True)
-def rescore_problem(self, problem_id):
-    problem = Problem.objects.get(id=problem_id)
-    submissions = Submission.objects.filter(problem_id=problem_id)
-
-    with Progress(self, submissions.count(), stage=_('Modifying submissions')) as p:
-        rescored = 0
-        for submission in submissions.iterator():
-            submission.points = round(submission.case_points / submission.case_total * problem.points
-                                      if submission.case_total else 0, 1)
-            if not problem.partial and submission.points < problem.points:
-                submission.points = 0
-            submission.save(update_fields=['points'])
-            submission.update_contest()
-            rescored += 1
-            if rescored % 10 == 0:
-                p.done = rescored
-
-    with Progress(self, submissions.values('user_id').distinct().count(), stage=_('Recalculating user points')) as p:
-        users = 0
-        profiles = Profile.objects.filter(id__in=submissions.values_list('user_id', flat=True).distinct())
-        for profile in profiles.iterator():
-            profile._updating_stats_only = True
-            profile.calculate_points()
-            cache.delete('user_complete:%d' % profile.id)
-            cache.delete('user_attempted:%d' % profile.id)
-            users += 1
-            if users % 10 == 0:
-                p.done = users
+def rejudge_submission_ids(self, submission_ids, user_id=None):
+    queryset = Submission.objects.filter(id__in=submission_ids)
+    user = User.objects.get(id=user_id) if user_id is not None else None
+
+    with Progress(self, len(submission_ids)) as p:
+        return rejudge_submissions(queryset, rejudge_user=user, progress=p)
+
+
+def rescored_points(points, partial, precision, full_only=GreaterThanOrEqual):
+    # SQL version of the scoring in Submission.update_contest and the bridge: points scaled by the fraction of
+    # test case points, and nothing at all for partially solved non-partial problems.
+    scaled = Round(F('case_points') / F('case_total') * Value(float(points)), precision)
+    if not partial:
+        scaled = Case(When(full_only(scaled, Value(float(points))), then=scaled), default=Value(0.0))
+    return Case(When(case_total__gt=0, then=scaled), default=Value(0.0))
+
+
+def rescore_submissions(queryset, progress=None):
+    """Rescores the submissions with one UPDATE per problem and contest problem, then recomputes each affected
+    participation and profile once."""
+    if progress is not None:
+        progress.stage = _('Modifying submissions')
+    rescored = 0
+    for problem in Problem.objects.filter(id__in=queryset.values('problem_id')).only('id', 'points', 'partial'):
+        rescored += queryset.filter(problem_id=problem.id).update(
+            points=rescored_points(problem.points, problem.partial, 1),
+        )
+
+    for contest_problem in ContestProblem.objects.filter(submission__submission__in=queryset).distinct() \
+            .only('id', 'points', 'partial'):
+        contest_problem.submissions.filter(submission__in=queryset).update(points=Subquery(
+            Submission.objects.filter(id=OuterRef('submission_id'))
+                      .annotate(contest_points=rescored_points(contest_problem.points, contest_problem.partial, 3,
+                                                               full_only=Exact))
+                      .values('contest_points')[:1],
+        ))
+
+    participations = ContestParticipation.objects.filter(submission__submission__in=queryset).distinct() \
+                                                 .select_related('contest')
+    profiles = Profile.objects.filter(id__in=queryset.values('user_id'))
+    if progress is not None:
+        progress.stage = _('Recalculating contest results')
+        progress.total = participations.count()
+        progress.done = 0
+    for participation in participations.iterator():
+        participation.recompute_results()
+        if progress is not None:
+            progress.did(1)
+
+    if progress is not None:
+        progress.stage = _('Recalculating user points')
+        progress.total = profiles.count()
+        progress.done = 0
+    for profile in profiles.iterator():
+        profile._updating_stats_only = True
+        profile.calculate_points()
+        invalidate_user_id_sets([profile.id])
+        if progress is not None:
+            progress.did(1)
     return rescored
+
+
+@shared_task(bind=True)
+def rescore_problem(self, problem_id):
+    with Progress(self, 0) as p:
+        return rescore_submissions(Submission.objects.filter(problem_id=problem_id), progress=p)
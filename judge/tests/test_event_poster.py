@@ -0,0 +1,108 @@
+import json
+import threading
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+
+from judge.event_poster_queue import EventQueue
+
+try:
+    from websocket import WebSocketException
+
+    from judge.event_poster_ws import EventPoster
+except ImportError:
+    EventPoster = None
+
+
+class RecordingPoster:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def post_many(self, events):
+        self.release.wait()
+        self.batches.append(events)
+        return list(range(1, len(events) + 1))
+
+
+class EventQueueTestCase(SimpleTestCase):
+    def setUp(self):
+        self.poster = RecordingPoster()
+        self.queue = EventQueue(lambda: self.poster, batch_size=10)
+        # Never leave the flushing thread blocked once a test is over.
+        self.addCleanup(self.poster.release.set)
+
+    def test_wait(self):
+        self.assertEqual(self.queue.post('channel', {'type': 'done'}, wait=True), 1)
+        self.assertEqual(self.poster.batches, [[('channel', {'type': 'done'})]])
+
+    def test_coalesce(self):
+        self.poster.release.clear()
+        self.queue.post('first', {'type': 'grading-begin'})
+        self.queue.post('sub_1', {'type': 'test-case', 'case': 1})
+        self.queue.post('sub_1', {'type': 'test-case', 'case': 2})
+        self.queue.post('sub_1', {'type': 'grading-end'})
+        self.poster.release.set()
+
+        self.assertTrue(self.queue.flush(5))
+        events = [event for batch in self.poster.batches for event in batch]
+        self.assertEqual(events, [
+            ('first', {'type': 'grading-begin'}),
+            ('sub_1', {'type': 'test-case', 'case': 2}),
+            ('sub_1', {'type': 'grading-end'}),
+        ])
+        self.assertEqual(self.queue.stats()['depth'], 0)
+
+    def test_flush(self):
+        self.assertTrue(self.queue.flush(0))
+
+        self.poster.release.clear()
+        self.queue.post('channel', {'type': 'done'})
+        self.assertFalse(self.queue.flush(0.1))
+        self.poster.release.set()
+        self.assertTrue(self.queue.flush(5))
+        self.assertEqual(len(self.poster.batches), 1)
+
+    def test_without_threads(self):
+        # Threads started by the application never run under uWSGI without enable-threads.
+        queue = EventQueue(lambda: self.poster, start_timeout=0.1)
+        with mock.patch('judge.event_poster_queue.threading.Thread.start'):
+            self.assertEqual(queue.post('channel', {'type': 'done'}), 0)
+        self.assertEqual(self.poster.batches, [[('channel', {'type': 'done'})]])
+        self.assertTrue(queue.flush(0))
+
+
+class FakeConnection:
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.acks = 0
+        self.fail_after = fail_after
+
+    def send(self, data):
+        self.sent.append(json.loads(data)['channel'])
+
+    def recv(self):
+        if self.acks == self.fail_after:
+            raise WebSocketException('connection lost')
+        self.acks += 1
+        return json.dumps({'status': 'success', 'id': self.acks})
+
+
+@skipIf(EventPoster is None, 'websocket-client is not installed')
+class WebSocketEventPosterTestCase(SimpleTestCase):
+    def test_resend_unacknowledged(self):
+        connections = [FakeConnection(fail_after=2), FakeConnection()]
+        poster = EventPoster.__new__(EventPoster)
+
+        def connect():
+            poster._conn = connections.pop(0)
+
+        with mock.patch.object(EventPoster, '_connect', side_effect=connect):
+            first, second = connections
+            connect()
+            ids = poster.post_many([('a', {}), ('b', {}), ('c', {}), ('d', {})])
+
+        self.assertEqual(ids, [1, 2, 1, 2])
+        self.assertEqual(first.sent, ['a', 'b', 'c', 'd'])
+        self.assertEqual(second.sent, ['c', 'd'])
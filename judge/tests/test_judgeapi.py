@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from reversion.models import Version
+
+from judge.bridge.django_handler import DjangoHandler
+from judge.judgeapi import _rejudge_chunk
+from judge.models import Language, Submission, SubmissionSource
+from judge.models.tests.util import CommonDataMixin, create_problem
+from judge.tasks import rejudge_submission_ids
+
+
+class RejudgeTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        problem = create_problem(code='rejudged')
+        self.submissions = []
+        for status in ('D', 'D', 'D', 'G'):
+            submission = Submission.objects.create(user=self.users['normal'].profile, problem=problem,
+                                                   language=Language.get_python3(), result='AC', status=status)
+            SubmissionSource.objects.create(submission=submission, source='print(1)')
+            self.submissions.append(submission)
+        self.ids = [submission.id for submission in self.submissions]
+
+    def statuses(self):
+        return [status for _, status in Submission.objects.filter(id__in=self.ids).order_by('id')
+                                                  .values_list('id', 'status')]
+
+    def received(self, *indices):
+        return {'name': 'submission-batch-received', 'submission-ids': [self.ids[i] for i in indices]}
+
+    def test_rejudge_chunk(self):
+        with mock.patch('judge.judgeapi.judge_request', return_value=self.received(0, 1, 2)) as judge_request:
+            self.assertEqual(_rejudge_chunk(self.ids, None), 3)
+        # Submissions being graded are not sent.
+        sent = [submission['submission-id'] for submission in judge_request.call_args[0][0]['submissions']]
+        self.assertEqual(sent, self.ids[:3])
+        self.assertEqual(self.statuses(), ['QU', 'QU', 'QU', 'G'])
+        self.assertEqual(Version.objects.filter(object_id__in=map(str, self.ids[:3])).count(), 3)
+
+    def test_not_received(self):
+        with mock.patch('judge.judgeapi.judge_request', return_value=self.received(1)):
+            self.assertEqual(_rejudge_chunk(self.ids, None), 1)
+        self.assertEqual(self.statuses(), ['IE', 'QU', 'IE', 'G'])
+
+    def test_request_failed(self):
+        def judge_request(packet):
+            # A judge picked up the first submission before the reply was lost.
+            Submission.objects.filter(id=self.ids[0]).update(status='P')
+            raise OSError('connection reset')
+
+        with mock.patch('judge.judgeapi.judge_request', side_effect=judge_request):
+            self.assertEqual(_rejudge_chunk(self.ids, None), 0)
+        self.assertEqual(self.statuses(), ['P', 'IE', 'IE', 'G'])
+
+    def test_interrupted(self):
+        with mock.patch('judge.judgeapi.judge_request', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                _rejudge_chunk(self.ids, None)
+
+    def test_rejudge_submission_ids(self):
+        def judge_request(packet):
+            return {'name': 'submission-batch-received',
+                    'submission-ids': [submission['submission-id'] for submission in packet['submissions']]}
+
+        with mock.patch('judge.judgeapi.REJUDGE_CHUNK_SIZE', 2), \
+                mock.patch('judge.judgeapi.judge_request', side_effect=judge_request) as request, \
+                mock.patch.object(rejudge_submission_ids, 'update_state'):
+            result = rejudge_submission_ids.apply(args=(self.ids,), kwargs={'user_id': self.users['superuser'].id})
+        self.assertEqual(result.get(), 3)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.statuses(), ['QU', 'QU', 'QU', 'G'])
+
+
+class DjangoHandlerBatchTestCase(SimpleTestCase):
+    def test_on_submission_batch(self):
+        def judge(id, *args):
+            if id == 2:
+                raise ValueError('unknown problem')
+
+        handler = DjangoHandler.__new__(DjangoHandler)
+        handler.judges = mock.Mock()
+        handler.judges.check_priority.side_effect = lambda priority: priority < 10
+        handler.judges.judge.side_effect = judge
+
+        submissions = [{'submission-id': id, 'problem-id': 'problem', 'language': 'PY3', 'source': '',
+                        'judge-id': None, 'priority': priority} for id, priority in ((1, 3), (2, 3), (3, 10), (4, 3))]
+        self.assertEqual(handler.on_submission_batch({'name': 'submission-batch-request', 'submissions': submissions}),
+                         {'name': 'submission-batch-received', 'submission-ids': [1, 4]})
+        self.assertEqual([call[0][0] for call in handler.judges.judge.call_args_list], [1, 2, 4])
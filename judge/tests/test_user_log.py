@@ -0,0 +1,59 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from judge.models import Profile
+from judge.models.tests.util import CommonDataMixin
+from judge.user_log import AccessLogBuffer
+
+
+@mock.patch.object(AccessLogBuffer, '_start')
+class AccessLogBufferTestCase(CommonDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buffer = AccessLogBuffer(interval=10, granularity=60)
+        self.profile = self.users['normal'].profile
+
+    def access(self):
+        return Profile.objects.filter(id=self.profile.id).values_list('last_access', 'ip').get()
+
+    def test_record(self, _start):
+        with self.assertNumQueries(0):
+            self.buffer.record(self.profile.id, '10.0.0.1')
+            self.buffer.record(self.profile.id, None)
+        self.assertEqual(list(self.buffer.pending), [self.profile.id])
+        # A later access without an address keeps the last known one.
+        self.assertEqual(self.buffer.pending[self.profile.id][1], '10.0.0.1')
+
+    def test_flush(self, _start):
+        self.buffer.record(self.profile.id, '10.0.0.1')
+        superuser = self.users['superuser'].profile
+        self.buffer.record(superuser.id, None)
+        pending = dict(self.buffer.pending)
+        self.buffer.flush()
+
+        self.assertEqual(self.buffer.pending, {})
+        self.assertEqual(self.access(), (pending[self.profile.id][0], '10.0.0.1'))
+        self.assertEqual(Profile.objects.get(id=superuser.id).last_access, pending[superuser.id][0])
+        self.assertEqual(cache.get('user_access:%d' % self.profile.id), pending[self.profile.id])
+
+    def test_granularity(self, _start):
+        self.buffer.record(self.profile.id, '10.0.0.1')
+        self.buffer.flush()
+
+        # Within the granularity, only a different address is recorded again.
+        self.buffer.record(self.profile.id, '10.0.0.1')
+        self.buffer.record(self.profile.id, None)
+        self.assertEqual(self.buffer.pending, {})
+        self.buffer.record(self.profile.id, '10.0.0.2')
+        self.assertEqual(list(self.buffer.pending), [self.profile.id])
+
+    def test_overdue(self, _start):
+        # Without a running flush thread, a request flushes once the buffer is overdue.
+        self.buffer.record(self.profile.id, '10.0.0.1')
+        self.buffer.last_flush = time.monotonic() - 30
+        self.buffer.record(self.users['superuser'].profile.id, None)
+        self.assertEqual(self.access()[1], '10.0.0.1')
+        self.assertEqual(list(self.buffer.pending), [self.users['superuser'].profile.id])
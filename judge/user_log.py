@@ -1,7 +1,97 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django import db
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.timezone import now
 
 from judge.models import Profile
 
+logger = logging.getLogger('judge.user_log')
+
+
+class AccessLogBuffer:
+    """Collects profile accesses in process and writes them with one bulk UPDATE per flush interval.
+
+    Flushing is done by a background thread. Servers that do not run threads started by the application, such as
+    uWSGI without enable-threads, are detected by the thread falling behind, and requests then flush instead.
+    """
+
+    def __init__(self, interval, granularity):
+        self.interval = interval
+        self.granularity = granularity
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pid = None
+        self.last_flush = time.monotonic()
+
+    def _start(self):
+        # Runs under the lock. A forked worker inherits neither the thread nor any meaningful pending state.
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        threading.Thread(target=self._run, name='user-access-flush', daemon=True).start()
+
+    def record(self, profile_id, ip):
+        current = now()
+        with self.lock:
+            self._start()
+            overdue = self.pending and time.monotonic() - self.last_flush > 2 * self.interval
+        if overdue:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush user access log')
+
+        with self.lock:
+            if profile_id in self.pending:
+                old_ip = self.pending[profile_id][1]
+                self.pending[profile_id] = (current, ip or old_ip)
+                return
+
+        last = cache.get('user_access:%d' % profile_id)
+        if last is not None and (current - last[0]).total_seconds() < self.granularity and (not ip or ip == last[1]):
+            return
+
+        with self.lock:
+            self.pending[profile_id] = (current, ip)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+
+        with_ip, without_ip = [], []
+        for profile_id, (last_access, ip) in pending.items():
+            (with_ip if ip else without_ip).append(Profile(id=profile_id, last_access=last_access, ip=ip))
+
+        Profile.objects.bulk_update(with_ip, ['last_access', 'ip'], batch_size=500)
+        Profile.objects.bulk_update(without_ip, ['last_access'], batch_size=500)
+        cache.set_many({'user_access:%d' % profile_id: value for profile_id, value in pending.items()},
+                       self.granularity)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush user access log')
+            finally:
+                db.connection.close()
+
+
+access_log = AccessLogBuffer(settings.DMOJ_USER_ACCESS_FLUSH_INTERVAL, settings.DMOJ_USER_ACCESS_GRANULARITY)
+atexit.register(access_log.flush)
+
 
 class LogUserAccessMiddleware(object):
     def __init__(self, get_response=None):
@@ -12,10 +102,16 @@ class LogUserAccessMiddleware(object):
 
         if (hasattr(request, 'user') and request.user.is_authenticated and
                 not getattr(request, 'no_profile_update', False)):
-            updates = {'last_access': now()}
             # Decided on using REMOTE_ADDR as nginx will translate it to the external IP that hits it.
-            if request.META.get('REMOTE_ADDR'):
-                updates['ip'] = request.META.get('REMOTE_ADDR')
-            Profile.objects.filter(user_id=request.user.pk).update(**updates)
+            ip = request.META.get('REMOTE_ADDR')
+            if access_log.interval:
+                # The profile was already loaded by DMOJLoginMiddleware.
+                profile = getattr(request, 'profile', None) or request.user.profile
+                access_log.record(profile.id, ip)
+            else:
+                updates = {'last_access': now()}
+                if ip:
+                    updates['ip'] = ip
+                Profile.objects.filter(user_id=request.user.pk).update(**updates)
 
         return response
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import cache
+
+__all__ = ['contest_lookup', 'language_lookup', 'problem_lookup', 'profile_lookup', 'shared_lookups']
+
+LOOKUP_TIMEOUT = 3600
+
+_shared = threading.local()
+
+
+@contextmanager
+def shared_lookups():
+    """Within this block, lookups on this thread return the object found by the first lookup of the same key.
+
+    For work that consists of several views over the same objects, like a batch of API calls.
+    """
+    outer = getattr(_shared, 'objects', None)
+    if outer is None:
+        _shared.objects = {}
+    try:
+        yield
+    finally:
+        if outer is None:
+            del _shared.objects
+
+
+class CachedLookup(object):
+    """Fetches objects by a unique key such as a contest key or username, through the cache.
+
+    The cache maps the key to the object's id, and the id to the object, so that saving or deleting an object only
+    has to invalidate its id: a stale key then resolves to an object whose key no longer matches, and falls back to
+    the database. Objects are invalidated through signals, see judge.signals.
+
+    Fetched objects are snapshots and must not be saved back: code that modifies an object should fetch it itself.
+    """
+
+    def __init__(self, model, field, select_related=(), defer=()):
+        self.model_name = model
+        self.field = field
+        self.select_related = select_related
+        self.defer = defer
+        self.prefix = 'lookup:%s' % model.lower()
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_name)
+
+    def get_value(self, obj):
+        for attr in self.field.split('__'):
+            obj = getattr(obj, attr)
+        return obj
+
+    def get(self, value):
+        """Returns the object with the given key, or raises the model's DoesNotExist."""
+        shared = getattr(_shared, 'objects', None)
+        if shared is None:
+            return self._get(value)
+        if (self.prefix, value) not in shared:
+            shared[self.prefix, value] = self._get(value)
+        return shared[self.prefix, value]
+
+    def _get(self, value):
+        # Keys come from requests, so they are hashed to be safe as cache keys.
+        key_key = '%s:%s:%s' % (self.prefix, self.field, hashlib.sha1(str(value).encode('utf-8')).hexdigest())
+        id = cache.get(key_key)
+        if id is not None:
+            obj = cache.get('%s:%d' % (self.prefix, id))
+            # Compared case insensitively, as MySQL's collation matches keys.
+            if obj is not None and str(self.get_value(obj)).casefold() == str(value).casefold():
+                return obj
+
+        obj = (self.model.objects.select_related(*self.select_related).defer(*self.defer)
+               .get(**{self.field: value}))
+        cache.set_many({key_key: obj.id, '%s:%d' % (self.prefix, obj.id): obj}, LOOKUP_TIMEOUT)
+        return obj
+
+    def invalidate(self, ids):
+        cache.delete_many(['%s:%d' % (self.prefix, id) for id in ids])
+
+
+contest_lookup = CachedLookup('judge.Contest', 'key', defer=('description',))
+language_lookup = CachedLookup('judge.Language', 'key')
+problem_lookup = CachedLookup('judge.Problem', 'code', select_related=('group',), defer=('description',))
+profile_lookup = CachedLookup('judge.Profile', 'user__username', select_related=('user',), defer=('about',))
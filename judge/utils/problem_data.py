@@ -1,9 +1,12 @@
+import hashlib
 import json
 import os
 import re
+from zipfile import ZipFile
 
 import yaml
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.files.storage import FileSystemStorage
 from django.urls import reverse
@@ -39,6 +42,35 @@ class ProblemDataStorage(FileSystemStorage):
         return os.rename(self.path(old), self.path(new))
 
 
+ZIP_INFO_TIMEOUT = 86400
+
+
+def read_zip_info(zipfile):
+    return [(info.filename, info.file_size, info.CRC) for info in zipfile.infolist()]
+
+
+def _zip_info_key(path):
+    # Keyed by modification time and size, so replacing the archive never serves a stale listing.
+    stat = os.stat(path)
+    key = '%s:%d:%d' % (path, stat.st_mtime_ns, stat.st_size)
+    return 'problem_data_zip:%s' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_zip_info(path):
+    """Returns (name, size, CRC) for every member of the zip at `path`, without reparsing an unchanged archive."""
+    key = _zip_info_key(path)
+    info = cache.get(key)
+    if info is None:
+        with ZipFile(path) as zipfile:
+            info = read_zip_info(zipfile)
+        cache.set(key, info, ZIP_INFO_TIMEOUT)
+    return info
+
+
+def cache_zip_info(path, info):
+    cache.set(_zip_info_key(path), info, ZIP_INFO_TIMEOUT)
+
+
 class ProblemDataError(Exception):
     def __init__(self, message):
         super(ProblemDataError, self).__init__(message)
@@ -46,18 +78,23 @@ class ProblemDataError(Exception):
 
 
 class ProblemDataCompiler(object):
+    # Test case fields that make_init may normalize, e.g. clearing the files of batch start and end cases.
+    normalized_fields = ('is_pretest', 'input_file', 'output_file', 'generator_args', 'checker', 'checker_args')
+
     def __init__(self, problem, data, cases, files):
         self.problem = problem
         self.data = data
         self.cases = cases
-        self.files = files
+        self.files = set(files)
 
         self.generator = data.generator
+        self.normalized_cases = []
 
     def make_init(self):
         cases = []
         batch = None
         batch_count = 0
+        self.normalized_cases = []
 
         def end_batch():
             if not batch['batched']:
@@ -73,6 +110,7 @@ class ProblemDataCompiler(object):
             return case.checker
 
         for i, case in enumerate(self.cases, 1):
+            original = [getattr(case, field) for field in self.normalized_fields]
             if case.type == 'C':
                 data = {}
                 if batch:
@@ -107,7 +145,6 @@ class ProblemDataCompiler(object):
                     data['checker'] = make_checker(case)
                 else:
                     case.checker_args = ''
-                case.save(update_fields=('checker_args', 'is_pretest'))
                 (batch['batched'] if batch else cases).append(data)
             elif case.type == 'S':
                 batch_count += 1
@@ -148,7 +185,6 @@ class ProblemDataCompiler(object):
                     case.checker_args = ''
                 case.input_file = ''
                 case.output_file = ''
-                case.save(update_fields=('checker_args', 'input_file', 'output_file'))
             elif case.type == 'E':
                 if not batch:
                     raise ProblemDataError(_('Attempt to end batch outside of one in case #%d.') % i)
@@ -158,9 +194,10 @@ class ProblemDataCompiler(object):
                 case.generator_args = ''
                 case.checker = ''
                 case.checker_args = ''
-                case.save()
                 end_batch()
                 batch = None
+            if [getattr(case, field) for field in self.normalized_fields] != original:
+                self.normalized_cases.append(case)
         if batch:
             end_batch()
 
@@ -213,7 +250,7 @@ class ProblemDataCompiler(object):
         return init
 
     def compile(self):
-        from judge.models import problem_data_storage
+        from judge.models import ProblemTestCase, problem_data_storage
 
         yml_file = '%s/init.yml' % self.problem.code
         try:
@@ -225,6 +262,8 @@ class ProblemDataCompiler(object):
             self.data.save()
             problem_data_storage.delete(yml_file)
         else:
+            if self.normalized_cases:
+                ProblemTestCase.objects.bulk_update(self.normalized_cases, self.normalized_fields)
             self.data.feedback = ''
             self.data.save()
             if init:
@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from lupa import LuaRuntime
+
+__all__ = ['ScriptProblemLabeler']
+
+LABEL_CACHE_TIMEOUT = 86400
+LABEL_SCRIPT_POOL_SIZE = 32
+
+
+def _deny_all(obj, attr_name, is_setting):
+    raise AttributeError()
+
+
+class LabelScriptPool(object):
+    """Keeps the label functions of recently used scripts, each evaluated in its own sandboxed runtime.
+
+    Lua runtimes aren't thread safe, so calls into them are serialized. Runtimes are never shared between scripts,
+    so a script that sets globals can't affect the labels of another.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.RLock()
+        self._functions = OrderedDict()
+
+    def _get(self, script):
+        if script in self._functions:
+            self._functions.move_to_end(script)
+            return self._functions[script]
+
+        lua = LuaRuntime(attribute_filter=_deny_all, register_eval=False, register_builtins=False)
+        function = lua.eval(script)
+        self._functions[script] = function
+        while len(self._functions) > self.size:
+            self._functions.popitem(last=False)
+        return function
+
+    def call(self, script, indices):
+        with self._lock:
+            function = self._get(script)
+            return [function(index) for index in indices]
+
+
+label_script_pool = LabelScriptPool(LABEL_SCRIPT_POOL_SIZE)
+
+
+class ScriptProblemLabeler(object):
+    """Callable returning the label of the problem at an index, as computed by a contest's label script.
+
+    Labels depend only on the script and the index, so they are computed once and cached as a list under the
+    script's hash, growing when a contest with more problems asks for them.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.key = 'problem_labels:%s' % hashlib.sha1(script.encode('utf-8')).hexdigest()
+        self.labels = None
+
+    def __call__(self, index):
+        if self.labels is None:
+            self.labels = cache.get(self.key) or []
+        if index >= len(self.labels):
+            self.labels = self.labels + label_script_pool.call(self.script, range(len(self.labels), index + 1))
+            # Anything else is rejected when the contest is validated, and may not be picklable.
+            if all(isinstance(label, str) for label in self.labels):
+                cache.set(self.key, self.labels, LABEL_CACHE_TIMEOUT)
+        return self.labels[index]
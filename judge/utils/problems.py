@@ -2,14 +2,17 @@ from collections import defaultdict
 from math import e
 
 from django.core.cache import cache
-from django.db.models import Case, Count, ExpressionWrapper, F, When
+from django.db.models import Case, Count, ExpressionWrapper, F, Sum, When
 from django.db.models.fields import FloatField
 from django.utils import timezone
 from django.utils.translation import gettext_noop
 
-from judge.models import Problem, Submission
+from judge.caching import CONTEST_ATTEMPTED_IDS_KEY, CONTEST_COMPLETE_IDS_KEY, USER_ATTEMPTED_IDS_KEY, \
+    USER_COMPLETE_IDS_KEY, get_id_set
+from judge.models import Problem, Submission, SubmissionResultCount, UserSubmissionResultCount
 
-__all__ = ['contest_completed_ids', 'get_result_data', 'user_completed_ids', 'user_editable_ids', 'user_tester_ids']
+__all__ = ['contest_completed_ids', 'get_counted_result_data', 'get_result_data', 'user_completed_ids',
+           'user_editable_ids', 'user_tester_ids']
 
 
 def user_tester_ids(profile):
@@ -21,41 +24,33 @@ def user_editable_ids(profile):
 
 
 def contest_completed_ids(participation):
-    key = 'contest_complete:%d' % participation.id
-    result = cache.get(key)
-    if result is None:
-        result = set(participation.submissions.filter(submission__result='AC', points__gte=F('problem__points'))
-                     .values_list('problem__problem_id', flat=True).distinct())
-        cache.set(key, result, 86400)
-    return result
+    return get_id_set(
+        CONTEST_COMPLETE_IDS_KEY % participation.id,
+        lambda: participation.submissions.filter(submission__result='AC', points__gte=F('problem__points'))
+                             .values_list('problem__problem_id', flat=True).distinct(),
+    )
 
 
 def user_completed_ids(profile):
-    key = 'user_complete:%d' % profile.id
-    result = cache.get(key)
-    if result is None:
-        result = set(Submission.objects.filter(user=profile, result='AC', case_points__gte=F('case_total'))
-                     .values_list('problem_id', flat=True).distinct())
-        cache.set(key, result, 86400)
-    return result
+    return get_id_set(
+        USER_COMPLETE_IDS_KEY % profile.id,
+        lambda: Submission.objects.filter(user=profile, result='AC', case_points__gte=F('case_total'))
+                                  .values_list('problem_id', flat=True).distinct(),
+    )
 
 
 def contest_attempted_ids(participation):
-    key = 'contest_attempted:%s' % participation.id
-    result = cache.get(key)
-    if result is None:
-        result = set(participation.submissions.values_list('problem__problem_id', flat=True).distinct())
-        cache.set(key, result, 86400)
-    return result
+    return get_id_set(
+        CONTEST_ATTEMPTED_IDS_KEY % participation.id,
+        lambda: participation.submissions.values_list('problem__problem_id', flat=True).distinct(),
+    )
 
 
 def user_attempted_ids(profile):
-    key = 'user_attempted:%s' % profile.id
-    result = cache.get(key)
-    if result is None:
-        result = set(profile.submission_set.values_list('problem_id', flat=True).distinct())
-        cache.set(key, result, 86400)
-    return result
+    return get_id_set(
+        USER_ATTEMPTED_IDS_KEY % profile.id,
+        lambda: profile.submission_set.values_list('problem_id', flat=True).distinct(),
+    )
 
 
 def _get_result_data(results):
@@ -85,6 +80,26 @@ def get_result_data(*args, **kwargs):
     return _get_result_data(defaultdict(int, raw))
 
 
+def get_counted_result_data(problem_id=None, user_id=None, languages=None, statuses=None):
+    # Reads the maintained result counters instead of grouping judge_submission.
+    # Counters are keyed by (problem, language) and by user, so a user cannot be combined with the others.
+    if user_id is not None:
+        if problem_id is not None or languages:
+            raise ValueError('User result counters cannot be filtered by problem or language')
+        counts = UserSubmissionResultCount.objects.filter(user_id=user_id)
+    else:
+        counts = SubmissionResultCount.objects.all()
+        if problem_id is not None:
+            counts = counts.filter(problem_id=problem_id)
+        if languages:
+            counts = counts.filter(language__key__in=languages)
+    if statuses:
+        counts = counts.filter(result__in=statuses)
+    # Ungraded submissions are counted under '', and left out like Count('result') leaves out NULLs.
+    raw = counts.exclude(result='').values('result').annotate(total=Sum('count')).values_list('result', 'total')
+    return _get_result_data(defaultdict(int, raw))
+
+
 def hot_problems(duration, limit):
     cache_key = 'hot_problems:%d:%d' % (duration.total_seconds(), limit)
     qs = cache.get(cache_key)
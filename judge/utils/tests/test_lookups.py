@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from judge.admin.contest import ContestAdmin
+from judge.admin.problem import ProblemAdmin
+from judge.models import Contest, Problem, Profile
+from judge.models.tests.util import CommonDataMixin, create_contest, create_problem
+from judge.utils.lookups import contest_lookup, problem_lookup, profile_lookup
+
+
+class CachedLookupTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='lookup', is_visible=True)
+        self.problem = create_problem(code='lookup', is_public=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached(self):
+        self.assertEqual(contest_lookup.get('lookup'), self.contest)
+        with self.assertNumQueries(0):
+            self.assertEqual(contest_lookup.get('lookup').name, self.contest.name)
+
+    def test_missing(self):
+        with self.assertRaises(Contest.DoesNotExist):
+            contest_lookup.get('missing')
+
+    def test_invalidated_on_save(self):
+        contest_lookup.get('lookup')
+        self.contest.name = 'renamed'
+        self.contest.save()
+        self.assertEqual(contest_lookup.get('lookup').name, 'renamed')
+
+    def test_changed_key(self):
+        contest_lookup.get('lookup')
+        self.contest.key = 'lookupmoved'
+        self.contest.save()
+        with self.assertRaises(Contest.DoesNotExist):
+            contest_lookup.get('lookup')
+        self.assertEqual(contest_lookup.get('lookupmoved'), self.contest)
+
+    def test_profile(self):
+        profile_lookup.get('normal')
+        with self.assertNumQueries(0):
+            self.assertEqual(profile_lookup.get('normal').user.username, 'normal')
+        profile = Profile.objects.get(user__username='normal')
+        profile.display_rank = 'admin'
+        profile.save()
+        self.assertEqual(profile_lookup.get('normal').display_rank, 'admin')
+
+    def test_admin_visibility_actions(self):
+        contest_lookup.get('lookup')
+        problem_lookup.get('lookup')
+        request = RequestFactory().post('/')
+        request.user = self.users['superuser']
+        with mock.patch.object(ContestAdmin, 'message_user'), mock.patch.object(ProblemAdmin, 'message_user'):
+            ContestAdmin(Contest, AdminSite()).make_hidden(request, Contest.objects.filter(id=self.contest.id))
+            ProblemAdmin(Problem, AdminSite()).make_private(request, Problem.objects.filter(id=self.problem.id))
+        self.assertFalse(contest_lookup.get('lookup').is_visible)
+        self.assertFalse(problem_lookup.get('lookup').is_public)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import zipfile
+import zlib
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from judge.models import ProblemData, ProblemTestCase
+from judge.models.tests.util import create_problem
+from judge.utils.problem_data import ProblemDataCompiler, get_zip_info
+
+
+class ProblemDataCompilerTestCase(TestCase):
+    BATCHES = 100
+    BATCH_SIZE = 8
+
+    @classmethod
+    def setUpTestData(self):
+        self.problem = create_problem(code='many_cases')
+        self.data = ProblemData.objects.create(problem=self.problem)
+        self.files = []
+
+        cases = []
+        for batch in range(self.BATCHES):
+            cases.append(ProblemTestCase(type='S', points=1, is_pretest=False, input_file='stale.in'))
+            for case in range(self.BATCH_SIZE):
+                input_file, output_file = '%d.%d.in' % (batch, case), '%d.%d.out' % (batch, case)
+                self.files += [input_file, output_file]
+                cases.append(ProblemTestCase(type='C', input_file=input_file, output_file=output_file,
+                                             is_pretest=batch == 0, checker_args='{}'))
+            cases.append(ProblemTestCase(type='E', is_pretest=False, checker='floats'))
+        for order, case in enumerate(cases):
+            case.dataset = self.problem
+            case.order = order
+        ProblemTestCase.objects.bulk_create(cases)
+
+    def make_compiler(self):
+        return ProblemDataCompiler(self.problem, self.data, list(self.problem.cases.order_by('order')), self.files)
+
+    def test_make_init(self):
+        compiler = self.make_compiler()
+        with self.assertNumQueries(0):
+            init = compiler.make_init()
+
+        self.assertEqual(len(init['test_cases']), self.BATCHES)
+        self.assertNotIn('pretest_test_cases', init)
+        self.assertEqual(len(init['test_cases'][0]['batched']), self.BATCH_SIZE)
+        # Every case has either stale files, a stale checker or a mismatched pretest flag to normalize.
+        self.assertEqual(len(compiler.normalized_cases), self.BATCHES * (self.BATCH_SIZE + 2))
+
+    def test_normalization_is_persisted_in_bulk(self):
+        compiler = self.make_compiler()
+        compiler.make_init()
+        with CaptureQueriesContext(connection) as queries:
+            ProblemTestCase.objects.bulk_update(compiler.normalized_cases, compiler.normalized_fields)
+        # A handful of batched UPDATEs at most, rather than one per case.
+        self.assertLess(len(queries), 10)
+
+        self.assertFalse(self.problem.cases.exclude(type='C').exclude(input_file='').exists())
+        self.assertFalse(self.problem.cases.filter(type='E').exclude(checker='').exists())
+        self.assertFalse(self.problem.cases.filter(is_pretest=True).exists())
+
+        compiler = self.make_compiler()
+        compiler.make_init()
+        self.assertEqual(compiler.normalized_cases, [])
+
+
+class ZipInfoTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        fd, self.path = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def write_zip(self, files):
+        with zipfile.ZipFile(self.path, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+
+    def test_listing(self):
+        self.write_zip({'1.in': b'1 2', '1.out': b'3'})
+        self.assertEqual(get_zip_info(self.path), [('1.in', 3, zlib.crc32(b'1 2')), ('1.out', 1, zlib.crc32(b'3'))])
+
+    def test_replaced_archive(self):
+        self.write_zip({'1.in': b'1 2'})
+        self.assertEqual([name for name, size, crc in get_zip_info(self.path)], ['1.in'])
+        self.write_zip({'1.in': b'1 2', '2.in': b'3 4'})
+        self.assertEqual([name for name, size, crc in get_zip_info(self.path)], ['1.in', '2.in'])
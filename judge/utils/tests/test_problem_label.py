@@ -0,0 +1,35 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from judge.utils.problem_label import ScriptProblemLabeler, label_script_pool
+
+SCRIPT = """
+    function(n)
+        return string.char(65 + n)
+    end
+"""
+
+
+class ScriptProblemLabelerTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_labels(self):
+        labeler = ScriptProblemLabeler(SCRIPT)
+        self.assertEqual([labeler(i) for i in range(5)], ['A', 'B', 'C', 'D', 'E'])
+        self.assertEqual(labeler(1), 'B')
+
+    def test_cached(self):
+        ScriptProblemLabeler(SCRIPT)(3)
+        label_script_pool._functions.clear()
+
+        labeler = ScriptProblemLabeler(SCRIPT)
+        self.assertEqual(labeler(2), 'C')
+        self.assertNotIn(SCRIPT, label_script_pool._functions)
+        self.assertEqual(labeler(4), 'E')
+        self.assertEqual(cache.get(labeler.key), ['A', 'B', 'C', 'D', 'E'])
+
+    def test_invalid_labels_not_cached(self):
+        labeler = ScriptProblemLabeler('function(n) return n end')
+        self.assertEqual(labeler(1), 1)
+        self.assertIsNone(cache.get(labeler.key))
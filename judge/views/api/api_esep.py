@@ -1,5 +1,6 @@
 # flake8: noqa
 
+import copy
 import json
 from datetime import timedelta, datetime
 from functools import partial
@@ -9,13 +10,13 @@ from django.http import StreamingHttpResponse
 import zipfile
 import io
 from django.contrib.auth.models import AnonymousUser, User
-from django.db.models.functions import TruncDate
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.shortcuts import get_object_or_404
 from django.utils.formats import date_format
 from django.utils.safestring import mark_safe
 from django.views import View
-from django.http import JsonResponse
+from django.http import JsonResponse, QueryDict
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -32,10 +33,15 @@ from judge.models import (
 )
 from esep.models import ContestAnnouncement
 from django.db import transaction
-from django.db.models import F, Min, Max, Count, Prefetch, Q, Value, IntegerField
+from django.db.models import F, Count, Prefetch, Q, Value, IntegerField
 from django.contrib.contenttypes.models import ContentType
 
+from judge import event_poster as event
+from judge.caching import CONTEST_PROBLEM_STATUS_TIMEOUT, contest_problem_status_key, get_ac_heatmap, \
+    get_contest_staff_ids, get_rating_rank
+from judge.event_stream import EventStreamError, EventSubscriber, format_event
 from judge.ratings import rating_class, rating_progress
+from judge.utils.lookups import contest_lookup, language_lookup, problem_lookup, profile_lookup, shared_lookups
 from judge.views.api.api_v2 import APIListView, APIDetailView
 from judge.views.contests import base_contest_ranking_list, get_contest_ranking_list
 from judge.views.submission import group_test_cases
@@ -67,17 +73,17 @@ class APIProblemSubmit(View):
             return JsonResponse({'error': 'Missing required fields'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
         try:
-            problem = Problem.objects.get(code=problem_code)
+            problem = problem_lookup.get(problem_code)
         except Problem.DoesNotExist:
             return JsonResponse({'error': f'No such problem {problem_code}'}, status=404)
 
         try:
-            language = Language.objects.get(key=language_key)
+            language = language_lookup.get(language_key)
         except Language.DoesNotExist:
             return JsonResponse({'error': f'No such language {language_key}'}, status=404)
 
@@ -123,7 +129,7 @@ class APIProblemSubmit(View):
         participation = None
         if contest_key:
             try:
-                contest = Contest.objects.get(key=contest_key)
+                contest = contest_lookup.get(contest_key)
             except Contest.DoesNotExist:
                 return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -209,8 +215,6 @@ class APIProblemSubmit(View):
                 )
 
         try:
-            from judge import event_poster as event
-
             # Атомарно, как в DMOJ: иначе упавший SubmissionSource оставит в таблице
             # результатов вечную попытку на 0 баллов без исходника.
             with transaction.atomic():
@@ -440,20 +444,16 @@ class APIUserDetailEsep(APIDetailView):
 
     def get_object_data(self, profile):
         rating_value = profile.rating
-        rating_rank = None
-
-        if rating_value:
-            rating_rank = Profile.objects.filter(
-                is_unlisted=False, rating__gt=rating_value,
-            ).count() + 1
+        rating_rank = get_rating_rank(rating_value) if rating_value else None
 
-        aggregation_data = profile.ratings.aggregate(min_rating=Min('rating'), max_rating=Max('rating'), contests=Count('contest'))
-        min_rating = aggregation_data.get('min_rating')
-        max_rating = aggregation_data.get('max_rating')
-        contests = aggregation_data.get('contests')
-
-        ratings = profile.ratings.order_by('-contest__end_time').select_related('contest') \
+        # Очки участия берём тем же запросом: рейтинг ссылается на своё (не виртуальное) участие.
+        ratings = list(
+            profile.ratings.order_by('-contest__end_time').select_related('contest', 'participation')
             .defer('contest__description')
+        )
+        min_rating = min((rating.rating for rating in ratings), default=None)
+        max_rating = max((rating.rating for rating in ratings), default=None)
+        contests = len(ratings)
 
         rating_data = [{
             'label': rating.contest.name,
@@ -464,23 +464,14 @@ class APIUserDetailEsep(APIDetailView):
             'date': date_format(timezone.localtime(rating.contest.end_time), _('M j, Y, G:i')),
             'class': rating_class(rating.rating),
             'height': '%.3fem' % rating_progress(rating.rating),
-            'score': ContestParticipation.objects.get(contest=rating.contest, user=profile, virtual=0).score
+            'score': rating.participation.score,
         } for rating in ratings]
 
         # Только зачтённые решения: график активности подписан «решено», а считались
         # все посылки подряд — WA, TLE, CE и повторы одной задачи. Порог цветов на фронте
         # (1-3 / 4-6 / 7-8 / 9+) тоже рассчитан на решения, а не на попытки.
-        # distinct по задаче: пять посылок одной задачи в день — это одна решённая задача.
-        submissions = (
-            profile.submission_set
-            .filter(result='AC')
-            .annotate(date_only=TruncDate('date'))
-            .values('date_only').annotate(cnt=Count('problem_id', distinct=True))
-        )
-
-        submission_data = {
-            date_counts['date_only'].isoformat(): date_counts['cnt'] for date_counts in submissions
-        }
+        # Одна задача в день считается один раз, сколько бы посылок по ней ни было.
+        submission_data = get_ac_heatmap(profile)
 
         return {
             'id': profile.id,
@@ -528,9 +519,20 @@ class APIProblemListEsep(APIListView):
                 queryset = queryset.search(query)
         return queryset
 
-    def get_object_data(self, problem):
+    def get_api_data(self, context):
+        # Статус пользователя считаем сразу для всей страницы, а не запросами на каждую задачу.
         username = self.kwargs.get('username')
+        profile = Profile.objects.filter(user__username=username).first() if username else None
+        if profile is not None:
+            problems = context['object_list']
+            statuses = _user_problem_statuses(
+                Submission.objects.filter(user=profile, problem_id__in=[problem.id for problem in problems]),
+            )
+            for problem in problems:
+                problem.user_status = statuses.get(problem.id, ('N', None))[0]
+        return super().get_api_data(context)
 
+    def get_object_data(self, problem):
         data = {
             'code': problem.code,
             'name': problem.name,
@@ -540,27 +542,8 @@ class APIProblemListEsep(APIListView):
             'is_organization_private': problem.is_organization_private,
             'is_public': problem.is_public,
         }
-        if username:
-            try:
-                profile = Profile.objects.get(user__username=username)
-                is_solved = Submission.objects.filter(user=profile, problem=problem, result='AC', case_points__gte=F('case_total')).exists()
-                if is_solved:
-                    data.update({
-                        'user_status': 'AC'
-                    })
-                else:
-                    submissions = Submission.objects.filter(user=profile, problem=problem).order_by('-judged_date')
-                    if submissions.exists():
-                        last_submission = submissions.first()
-                        data.update({
-                            'user_status': last_submission.result
-                        })
-                    else:
-                        data.update({
-                            'user_status': 'N'
-                        })
-            except Exception as e:
-                pass
+        if hasattr(problem, 'user_status'):
+            data['user_status'] = problem.user_status
 
         return data
 
@@ -586,7 +569,7 @@ class APIProblemTypeProgress(APIListView):
             return JsonResponse({'error': 'Missing username'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
@@ -605,7 +588,7 @@ class APIProblemTypeProgressList(APIListView):
 
         if username:
             try:
-                profile = Profile.objects.get(user__username=username)
+                profile = profile_lookup.get(username)
             except Profile.DoesNotExist:
                 return ProblemType.objects.none()
         else:
@@ -756,7 +739,7 @@ class APISyncUsersWithEsep(View):
                 except User.DoesNotExist:
                     user = User.objects.create(username=username, email=user_email)
                 profile, _ = Profile.objects.get_or_create(user=user, defaults={
-                    'language': Language.objects.get(key=settings.DEFAULT_USER_LANGUAGE),
+                    'language': language_lookup.get(settings.DEFAULT_USER_LANGUAGE),
                     'is_banned_from_problem_voting': True
                 })
                 profile.organizations.add(org)
@@ -789,7 +772,7 @@ class APIRegisterUserFromCpfed(View):
             if not created:
                 raise Exception("User already exists")
             profile = Profile.objects.get_or_create(user=user, defaults={
-                'language': Language.objects.get(key=settings.DEFAULT_USER_LANGUAGE),
+                'language': language_lookup.get(settings.DEFAULT_USER_LANGUAGE),
                 'is_banned_from_problem_voting': True,
                 'username_display_override': full_name,
             })[0]
@@ -873,11 +856,11 @@ def _serialize_standings_row(rank, ranking_profile, contest_problems, viewer_use
 
 
 def compute_standings(contest_key, username=None):
-    contest = Contest.objects.get(key=contest_key)
+    contest = contest_lookup.get(contest_key)
 
     profile = None
     if username:
-        profile = Profile.objects.select_related('user').get(user__username=username)
+        profile = profile_lookup.get(username)
 
     viewer = profile.user if profile else AnonymousUser()
     can_see_full = contest.can_see_full_scoreboard(viewer)
@@ -965,17 +948,17 @@ class APIContestUserProblemSubmissions(View):
             )
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest with {contest_key}'}, status=404)
 
         try:
-            profile = Profile.objects.select_related('user').get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
         try:
-            problem = Problem.objects.get(code=problem_code)
+            problem = problem_lookup.get(problem_code)
         except Problem.DoesNotExist:
             return JsonResponse({'error': f'No such problem {problem_code}'}, status=404)
 
@@ -1061,11 +1044,8 @@ class APIContestUserProblemSubmissions(View):
 def _is_contest_admin(contest, profile):
     if profile is None:
         return False
-    return (
-        contest.authors.filter(id=profile.id).exists()
-        or contest.curators.filter(id=profile.id).exists()
-        or contest.testers.filter(id=profile.id).exists()
-    )
+    # Авторы, кураторы и тестеры контеста: проверяется почти каждым вызовом, поэтому по кешу.
+    return profile.id in get_contest_staff_ids(contest.id)
 
 
 def _contest_problems_denial(contest, profile):
@@ -1159,6 +1139,7 @@ class APIUserDisplayNames(View):
 
         if to_save:
             Profile.objects.bulk_update(to_save, ['username_display_override'])
+            profile_lookup.invalidate([profile.id for profile in to_save])
 
         return JsonResponse({
             'updated': updated,
@@ -1180,7 +1161,7 @@ class APIContestRosterCheck(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -1246,7 +1227,7 @@ class APIContestProblemDetail(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -1254,7 +1235,7 @@ class APIContestProblemDetail(View):
         profile = None
         if username:
             try:
-                profile = Profile.objects.get(user__username=username)
+                profile = profile_lookup.get(username)
             except Profile.DoesNotExist:
                 pass
 
@@ -1324,6 +1305,54 @@ def _translated_problem_name(problem, language):
     return problem.name
 
 
+def _user_problem_statuses(submissions):
+    """Статус пользователя по задачам его посылок: {problem_id: (user_status, user_score_ratio)}.
+
+    Одним запросом: решённая задача — 'AC', иначе результат последней проверенной посылки.
+    Задач без посылок в ответе нет, для них статус 'N'.
+    """
+    submissions = (
+        submissions.order_by('problem_id', F('judged_date').desc(nulls_last=True))
+        .values_list('problem_id', 'result', 'case_points', 'case_total')
+    )
+
+    last_result = {}
+    solved = set()
+    best_ratio = {}
+    for problem_id, result, case_points, case_total in submissions:
+        # Посылки задачи идут от последней проверенной.
+        last_result.setdefault(problem_id, result)
+        if result == 'AC' and case_points >= case_total:
+            solved.add(problem_id)
+        # Лучший результат в долях от максимума — по нему фронт отличает частичное
+        # решение от нулевого: одного user_status для этого не хватает.
+        if case_total:
+            best_ratio[problem_id] = max(best_ratio.get(problem_id, 0), case_points / case_total)
+
+    return {
+        problem_id: ('AC' if problem_id in solved else result, best_ratio.get(problem_id))
+        for problem_id, result in last_result.items()
+    }
+
+
+def _contest_problem_statuses(contest, profile):
+    """Статус пользователя по всем задачам контеста: {problem_id: (user_status, user_score_ratio)}.
+
+    Считается одним запросом по посылкам пользователя и кешируется до следующего изменения результата
+    любой из них (см. invalidate_contest_problem_status): панель задач опрашивают все участники.
+    """
+    key = contest_problem_status_key(contest.id, profile.id)
+    statuses = cache.get(key)
+    if statuses is not None:
+        return statuses
+
+    # Статус считаем ПО ЭТОМУ КОНТЕСТУ: задача, сданная в архиве или на другом соревновании,
+    # не должна светиться решённой прямо посреди текущего.
+    statuses = _user_problem_statuses(Submission.objects.filter(user=profile, contest_object=contest))
+    cache.set(key, statuses, CONTEST_PROBLEM_STATUS_TIMEOUT)
+    return statuses
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class APIContestProblems(View):
     def get(self, request, contest_key, *args, **kwargs):
@@ -1332,7 +1361,7 @@ class APIContestProblems(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key = contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -1340,7 +1369,7 @@ class APIContestProblems(View):
         profile = None
         if username:
             try:
-                profile = Profile.objects.get(user__username = username)
+                profile = profile_lookup.get(username)
             except Profile.DoesNotExist:
                 pass
 
@@ -1371,6 +1400,8 @@ class APIContestProblems(View):
             .order_by('order')
         )
 
+        statuses = _contest_problem_statuses(contest, profile) if profile else {}
+
         problems = []
         for index, cp in enumerate(contest_problems):
             p = cp.problem
@@ -1392,26 +1423,7 @@ class APIContestProblems(View):
             }
 
             if profile:
-                # Статус считаем ПО ЭТОМУ КОНТЕСТУ. Раньше фильтра по контесту не было,
-                # и задача, сданная в архиве или на другом соревновании, светилась
-                # решённой прямо посреди текущего.
-                mine = Submission.objects.filter(
-                    user=profile, problem=p, contest_object=contest,
-                )
-
-                solved = mine.filter(result='AC', case_points__gte=F('case_total')).exists()
-                if solved:
-                    data['user_status'] = 'AC'
-                else:
-                    last = mine.order_by('-judged_date').first()
-                    data['user_status'] = last.result if last else 'N'
-
-                # Лучший результат в долях от максимума — по нему фронт отличает частичное
-                # решение от нулевого: одного user_status для этого не хватает.
-                best = mine.exclude(case_total=0).exclude(case_points__isnull=True).aggregate(
-                    ratio=Max(F('case_points') / F('case_total')),
-                )['ratio']
-                data['user_score_ratio'] = float(best) if best is not None else None
+                data['user_status'], data['user_score_ratio'] = statuses.get(p.id, ('N', None))
 
             problems.append(data)
 
@@ -1442,7 +1454,7 @@ class APIContestGrantAccess(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -1462,20 +1474,32 @@ class APIContestGrantAccess(View):
                 status=400,
             )
 
+        # Одним запросом на всех пользователей и одной вставкой на все пары (пользователь, организация):
+        # списки бывают на тысячи студентов, а add() по одному — это SELECT и INSERT на каждую пару.
+        profile_ids = dict(
+            Profile.objects.filter(user__username__in=usernames).values_list('user__username', 'id'),
+        )
+        # Сравнение имён в MySQL регистронезависимое, как и в прежнем Profile.objects.get.
+        folded_ids = {name.casefold(): id for name, id in profile_ids.items()}
+
         added = []
         not_found = []
-
+        granted = set()
         for username in usernames:
-            try:
-                profile = Profile.objects.get(user__username=username)
-            except Profile.DoesNotExist:
+            profile_id = profile_ids.get(username) or folded_ids.get(username.casefold())
+            if profile_id is None:
                 not_found.append(username)
-                continue
-
-            for org in organizations:
-                profile.organizations.add(org)
+            else:
+                granted.add(profile_id)
+                added.append(username)
 
-            added.append(username)
+        Membership = Profile.organizations.through
+        Membership.objects.bulk_create([
+            Membership(profile_id=profile_id, organization_id=org.id)
+            for profile_id in granted for org in organizations
+        ], ignore_conflicts=True)
+        if granted:
+            cache.delete_many([make_template_fragment_key('org_member_count', (org.id,)) for org in organizations])
 
         return JsonResponse({
             'contest': contest.key,
@@ -1495,7 +1519,7 @@ class APIProblemTickets(View):
             return JsonResponse({'error': 'Unauthorized access'}, status = 401)
 
         try:
-            problem = Problem.objects.get(code = problem_code)
+            problem = problem_lookup.get(problem_code)
         except Problem.DoesNotExist:
             return JsonResponse({'error': f'No such problem {problem_code}'}, status=404)
 
@@ -1504,7 +1528,7 @@ class APIProblemTickets(View):
             return JsonResponse({'error': 'Username required'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username = username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status = 404)
 
@@ -1512,12 +1536,8 @@ class APIProblemTickets(View):
         contest_key = request.GET.get('contest')
         if contest_key:
             try:
-                contest = Contest.objects.get(key = contest_key)
-                is_curator = (
-                    contest.authors.filter(id=profile.id).exists()
-                    or contest.curators.filter(id=profile.id).exists()
-                    or contest.testers.filter(id=profile.id).exists()
-                )
+                contest = contest_lookup.get(contest_key)
+                is_curator = _is_contest_admin(contest, profile)
             except Contest.DoesNotExist:
                 pass
 
@@ -1581,7 +1601,7 @@ class APIProblemTickets(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            problem = Problem.objects.get(code = problem_code)
+            problem = problem_lookup.get(problem_code)
         except Problem.DoesNotExist:
             return JsonResponse({'error': f'No such problem {problem_code}'}, status=404)
 
@@ -1600,7 +1620,7 @@ class APIProblemTickets(View):
             return JsonResponse({'error': 'Body is required'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username = username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
@@ -1652,7 +1672,7 @@ class APITicketDetail(View):
             return JsonResponse({'error': 'Username required'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username = username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
@@ -1662,12 +1682,8 @@ class APITicketDetail(View):
         contest_key = request.GET.get('contest')
         if contest_key:
             try:
-                contest = Contest.objects.get(key = contest_key)
-                is_curator = (
-                    contest.authors.filter(id=profile.id).exists()
-                    or contest.curators.filter(id=profile.id).exists()
-                    or contest.testers.filter(id=profile.id).exists()
-                )
+                contest = contest_lookup.get(contest_key)
+                is_curator = _is_contest_admin(contest, profile)
             except Contest.DoesNotExist:
                 pass
 
@@ -1737,7 +1753,7 @@ class APITicketMessages(View):
             return JsonResponse({'error': 'username and body required'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
@@ -1745,12 +1761,8 @@ class APITicketMessages(View):
         is_curator = False
         if contest_key:
             try:
-                contest = Contest.objects.get(key=contest_key)
-                is_curator = (
-                    contest.authors.filter(id=profile.id).exists()
-                    or contest.curators.filter(id=profile.id).exists()
-                    or contest.testers.filter(id=profile.id).exists()
-                )
+                contest = contest_lookup.get(contest_key)
+                is_curator = _is_contest_admin(contest, profile)
             except Contest.DoesNotExist:
                 pass
 
@@ -1788,7 +1800,7 @@ class APIProblemBroadcast(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            problem = Problem.objects.get(code=problem_code)
+            problem = problem_lookup.get(problem_code)
         except Problem.DoesNotExist:
             return JsonResponse({'error': f'No such problem {problem_code}'}, status=404)
 
@@ -1805,37 +1817,42 @@ class APIProblemBroadcast(View):
             return JsonResponse({'error': 'username, body, contest_key required'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
-        is_curator = (
-            contest.authors.filter(id=profile.id).exists()
-            or contest.curators.filter(id=profile.id).exists()
-            or contest.testers.filter(id=profile.id).exists()
-        )
+        is_curator = _is_contest_admin(contest, profile)
 
         if not is_curator:
             return JsonResponse({'error': 'Permission denied'}, status=403)
 
         problem_ct = ContentType.objects.get_for_model(Problem)
-        open_tickets = Ticket.objects.filter(
-            content_type=problem_ct,
-            object_id=problem.id,
-            is_open=True,
-        )
+        with transaction.atomic():
+            ticket_ids = list(
+                Ticket.objects.select_for_update()
+                .filter(content_type=problem_ct, object_id=problem.id, is_open=True)
+                .order_by('id').values_list('id', flat=True),
+            )
+            messages = TicketMessage.objects.bulk_create([
+                TicketMessage(ticket_id=ticket_id, user=profile, body=body) for ticket_id in ticket_ids
+            ])
+            if any(message.pk is None for message in messages):
+                # MySQL не возвращает id вставленных bulk_create строк. Тикеты заблокированы до конца
+                # транзакции, так что последнее сообщение автора в каждом из них — только что созданное.
+                message_ids = dict(
+                    TicketMessage.objects.filter(ticket_id__in=ticket_ids, user=profile, body=body)
+                    .order_by('id').values_list('ticket_id', 'id'),
+                )
+            else:
+                message_ids = {message.ticket_id: message.pk for message in messages}
+            Ticket.objects.filter(id__in=ticket_ids).update(is_open=False)
 
-        created = []
-        for t in open_tickets:
-            msg = TicketMessage.objects.create(ticket=t, user=profile, body=body)
-            t.is_open = False
-            t.save(update_fields=['is_open'])
-            created.append({'ticket_id': t.id, 'message_id': msg.id})
+        created = [{'ticket_id': ticket_id, 'message_id': message_ids[ticket_id]} for ticket_id in ticket_ids]
 
         return JsonResponse({
             'broadcasted_to': len(created),
@@ -1856,20 +1873,16 @@ class APIContestTickets(View):
             return JsonResponse({'error': 'Username required'}, status=400)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
-        is_curator = (
-            contest.authors.filter(id=profile.id).exists()
-            or contest.curators.filter(id=profile.id).exists()
-            or contest.testers.filter(id=profile.id).exists()
-        )
+        is_curator = _is_contest_admin(contest, profile)
 
         problem_ids = list(contest.problems.values_list('id', flat=True))
         problem_ct = ContentType.objects.get_for_model(Problem)
@@ -1957,7 +1970,7 @@ class APICuratedContests(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
@@ -2006,12 +2019,12 @@ class APIContestParticipation(View):
             return JsonResponse({'error': 'Username required'}, status=400)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
@@ -2065,7 +2078,7 @@ class APIContestSubmissions(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -2074,7 +2087,7 @@ class APIContestSubmissions(View):
         user = AnonymousUser()
         if username:
             try:
-                profile = Profile.objects.get(user__username=username)
+                profile = profile_lookup.get(username)
                 user = profile.user
             except Profile.DoesNotExist:
                 return JsonResponse({'error': f'No such user {username}'}, status=404)
@@ -2182,13 +2195,13 @@ class APIContestCurators(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
-        usernames = set()
-        for rel in (contest.authors, contest.curators, contest.testers):
-            usernames.update(rel.select_related('user').values_list('user__username', flat=True))
+        usernames = set(
+            Profile.objects.filter(id__in=get_contest_staff_ids(contest.id)).values_list('user__username', flat=True),
+        )
 
         return JsonResponse({
             'contest': {'key': contest.key, 'name': contest.name},
@@ -2276,7 +2289,7 @@ class APIContestAnnouncement(View):
             return JsonResponse({'error': 'Unauthorized access'}, status=401)
 
         try:
-            contest = Contest.objects.get(key=contest_key)
+            contest = contest_lookup.get(contest_key)
         except Contest.DoesNotExist:
             return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
 
@@ -2291,15 +2304,11 @@ class APIContestAnnouncement(View):
             return JsonResponse({'error': 'username and body required'}, status=400)
 
         try:
-            profile = Profile.objects.get(user__username=username)
+            profile = profile_lookup.get(username)
         except Profile.DoesNotExist:
             return JsonResponse({'error': f'No such user {username}'}, status=404)
 
-        is_curator = (
-            contest.authors.filter(id=profile.id).exists()
-            or contest.curators.filter(id=profile.id).exists()
-            or contest.testers.filter(id=profile.id).exists()
-        )
+        is_curator = _is_contest_admin(contest, profile)
         if not is_curator:
             return JsonResponse({'error': 'Permission denied'}, status=403)
 
@@ -2308,6 +2317,7 @@ class APIContestAnnouncement(View):
             author=profile,
             body=body,
         )
+        event.post('contest_%d' % contest.id, {'type': 'announcement', 'id': announcement.id})
 
         return JsonResponse({
             'id': announcement.id,
@@ -2338,6 +2348,180 @@ class APIStandings(View):
         return JsonResponse(payload, status=200)
 
 
+
+@method_decorator(csrf_exempt, name='dispatch')
+class APIContestBatch(View):
+    """Несколько запросов страницы контеста одним HTTP-вызовом.
+
+    Страница контеста в cpfed опрашивает таблицу, участие, задачи, посылки и тикеты. Здесь они
+    выполняются теми же вьюхами в одном процессе: токен проверяется один раз, а контест и пользователь
+    ищутся один раз на весь пакет.
+
+    Тело: {"username": ..., "requests": [{"name": "tickets", "since": ...}, ...]}.
+    Ответ: {"responses": [{"name": ..., "status": ..., "data": ...}, ...]} в том же порядке.
+    """
+    MAX_REQUESTS = 10
+
+    def get_views(self):
+        return {
+            'standings': APIStandings.as_view(),
+            'participation': APIContestParticipation.as_view(),
+            'problems': APIContestProblems.as_view(),
+            'submissions': APIContestSubmissions.as_view(),
+            'tickets': APIContestTickets.as_view(),
+        }
+
+    def post(self, request, contest_key, *args, **kwargs):
+        token = get_cpfed_token(request)
+        if not token or token != settings.CPFED_TOKEN:
+            return JsonResponse({'error': 'Unauthorized access'}, status=401)
+
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+        sub_requests = data.get('requests')
+        if not isinstance(sub_requests, list) or not sub_requests or len(sub_requests) > self.MAX_REQUESTS:
+            return JsonResponse(
+                {'error': f'requests must be a non-empty list of at most {self.MAX_REQUESTS} requests'},
+                status=400,
+            )
+
+        views = self.get_views()
+        for sub_request in sub_requests:
+            if not isinstance(sub_request, dict) or not isinstance(sub_request.get('name'), str) \
+                    or sub_request['name'] not in views:
+                return JsonResponse({'error': f'Unknown request {sub_request!r}', 'names': sorted(views)},
+                                    status=400)
+
+        username = data.get('username')
+        responses = []
+        with shared_lookups():
+            for sub_request in sub_requests:
+                params = QueryDict(mutable=True)
+                params.update({
+                    key: str(value) for key, value in sub_request.items() if key != 'name' and value is not None
+                })
+                params['contest_key'] = contest_key
+                if username:
+                    params['username'] = username
+
+                # Вьюхи читают только GET и заголовки, так что хватает копии запроса с другими параметрами.
+                get_request = copy.copy(request)
+                get_request.method = 'GET'
+                get_request.GET = params
+                response = views[sub_request['name']](get_request, contest_key=contest_key)
+                responses.append({
+                    'name': sub_request['name'],
+                    'status': response.status_code,
+                    'data': json.loads(response.content),
+                })
+
+        return JsonResponse({'responses': responses}, status=200)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class APIContestEvents(View):
+    """Поток событий контеста (text/event-stream) вместо опроса таблицы и посылок.
+
+    События приходят из event-демона, канал contest_<id>:
+      standings    — таблица изменилась, её стоит перезапросить;
+      submission   — посылка проверена: {id, user, problem, status};
+      announcement — новое объявление: {id}.
+    Фильтр тот же, что в APIContestSubmissions: без полного доступа к таблице (или при заморозке) зритель
+    получает только свои посылки, а во время заморозки — ещё и без результата чужих и без обновлений таблицы.
+
+    Поток закрывается через EVENT_STREAM_DURATION секунд; клиент переподключается с Last-Event-ID
+    и получает пропущенные события.
+
+    Каждый открытый поток держит синхронный воркер на всё это время, поэтому этот путь нужно отдавать
+    отдельным пулом асинхронных воркеров (например, uwsgi с gevent), а не общим пулом сайта.
+    """
+    subscriber_class = EventSubscriber
+
+    def get(self, request, contest_key, *args, **kwargs):
+        token = get_cpfed_token(request)
+        if not token or token != settings.CPFED_TOKEN:
+            return JsonResponse({'error': 'Unauthorized access'}, status=401)
+
+        # Подписка есть только у websocket-демона.
+        if not event.real or hasattr(settings, 'EVENT_DAEMON_AMQP'):
+            return JsonResponse({'error': 'Event stream is not available'}, status=503)
+
+        try:
+            contest = contest_lookup.get(contest_key)
+        except Contest.DoesNotExist:
+            return JsonResponse({'error': f'No such contest {contest_key}'}, status=404)
+
+        username = request.GET.get('username')
+        profile = None
+        user = AnonymousUser()
+        if username:
+            try:
+                profile = profile_lookup.get(username)
+                user = profile.user
+            except Profile.DoesNotExist:
+                return JsonResponse({'error': f'No such user {username}'}, status=404)
+
+        try:
+            last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid last event id'}, status=400)
+
+        restricted = not contest.ended and (
+            not contest.can_see_full_scoreboard(user) or contest.freeze_time is not None
+        )
+        freeze_at = None
+        if contest.freeze_time is not None and contest.start_time:
+            freeze_at = contest.start_time + contest.freeze_time
+        sees_through_freeze = _is_contest_admin(contest, profile) or (
+            user.is_authenticated and contest.is_editable_by(user)
+        )
+
+        try:
+            subscriber = self.subscriber_class(['contest_%d' % contest.id], last_id)
+        except EventStreamError:
+            return JsonResponse({'error': 'Event stream is not available'}, status=503)
+
+        def filter_message(message):
+            frozen = freeze_at is not None and not sees_through_freeze and timezone.now() >= freeze_at
+            if message.get('type') == 'update':
+                return None if frozen else ('standings', {})
+            if message.get('type') == 'submission':
+                own = profile is not None and message.get('user') == profile.id
+                if own:
+                    return 'submission', message
+                if restricted:
+                    return None
+                return 'submission', dict(message, status=None) if frozen else message
+            if message.get('type') == 'announcement':
+                return 'announcement', {'id': message.get('id')}
+            return None
+
+        def stream():
+            deadline = timezone.now() + timedelta(seconds=settings.EVENT_STREAM_DURATION)
+            try:
+                yield 'retry: %d\n\n' % (settings.EVENT_STREAM_KEEPALIVE * 1000)
+                while timezone.now() < deadline:
+                    data = subscriber.recv()
+                    if data is None:
+                        yield ': keepalive\n\n'
+                        continue
+                    filtered = filter_message(data['message'])
+                    if filtered is not None:
+                        yield format_event(data['id'], *filtered)
+            except EventStreamError:
+                pass
+            finally:
+                subscriber.close()
+
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Иначе nginx копит ответ в буфере и события приходят пачками.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 def attach_proctoring_token(user, contest):
     response = requests.post(
         'https://api.trustexam.ai/api/external-session/assignment.json',
@@ -14,6 +14,7 @@ from django.views.generic import DetailView, UpdateView
 from reversion import revisions
 from reversion.models import Version
 
+from judge.caching import invalidate_comment_trees, invalidate_recent_comments
 from judge.dblock import LockModel
 from judge.models import Comment, CommentVote
 from judge.utils.views import TitleMixin
@@ -76,6 +77,7 @@ def vote_comment(request, delta):
         else:
             Comment.objects.filter(id=comment_id).update(score=F('score') + delta)
         break
+    invalidate_comment_trees([comment.page])
     return HttpResponse('success', content_type='text/plain')
 
 
@@ -193,4 +195,6 @@ def comment_hide(request):
 
     comment = get_object_or_404(Comment, id=comment_id)
     comment.get_descendants(include_self=True).update(hidden=True)
+    invalidate_comment_trees([comment.page])
+    invalidate_recent_comments()
     return HttpResponse('ok')
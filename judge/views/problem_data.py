@@ -9,6 +9,7 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.forms import BaseModelFormSet, HiddenInput, ModelForm, NumberInput, Select, formset_factory
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
@@ -20,7 +21,7 @@ from django.views.generic import DetailView
 
 from judge.highlight_code import highlight_code
 from judge.models import Problem, ProblemData, ProblemTestCase, Submission, problem_data_storage
-from judge.utils.problem_data import ProblemDataCompiler
+from judge.utils.problem_data import ProblemDataCompiler, cache_zip_info, get_zip_info, read_zip_info
 from judge.utils.unicode import utf8text
 from judge.utils.views import TitleMixin, add_file_response
 from judge.views.problem import ProblemMixin
@@ -101,6 +102,16 @@ class ProblemCaseFormSet(formset_factory(ProblemCaseForm, formset=BaseModelFormS
         form.valid_files = self.valid_files
         return form
 
+    def save_in_bulk(self, problem):
+        # Problems can have hundreds of cases, so avoid a query per case.
+        cases = self.save(commit=False)
+        for case in cases:
+            case.dataset_id = problem.id
+        ProblemTestCase.objects.bulk_create([case for case in cases if case.pk is None])
+        ProblemTestCase.objects.bulk_update([case for case in cases if case.pk is not None],
+                                            ProblemCaseForm._meta.fields)
+        ProblemTestCase.objects.filter(id__in=[case.id for case in self.deleted_objects]).delete()
+
 
 class ProblemManagerMixin(LoginRequiredMixin, ProblemMixin, DetailView):
     def get_object(self, queryset=None):
@@ -172,15 +183,17 @@ class ProblemDataView(TitleMixin, ProblemManagerMixin):
                                   queryset=ProblemTestCase.objects.filter(dataset_id=self.object.pk).order_by('order'))
 
     def get_valid_files(self, data, post=False) -> List[str]:
-        try:
-            if post and 'problem-data-zipfile-clear' in self.request.POST:
-                return []
-            elif post and 'problem-data-zipfile' in self.request.FILES:
-                return ZipFile(self.request.FILES['problem-data-zipfile']).namelist()
-            elif data.zipfile:
-                return ZipFile(data.zipfile.path).namelist()
-        except BadZipfile:
-            raise
+        self.uploaded_zip_info = None
+        if post and 'problem-data-zipfile-clear' in self.request.POST:
+            return []
+        elif post and 'problem-data-zipfile' in self.request.FILES:
+            # Only the central directory of the upload is read, and the listing is kept so that the stored copy
+            # never has to be parsed again.
+            with ZipFile(self.request.FILES['problem-data-zipfile']) as zipfile:
+                self.uploaded_zip_info = read_zip_info(zipfile)
+            return [name for name, size, crc in self.uploaded_zip_info]
+        elif data.zipfile:
+            return [name for name, size, crc in get_zip_info(data.zipfile.path)]
         return []
 
     def get_context_data(self, **kwargs):
@@ -211,12 +224,11 @@ class ProblemDataView(TitleMixin, ProblemManagerMixin):
 
         cases_formset = self.get_case_formset(valid_files, post=True)
         if data_form.is_valid() and cases_formset.is_valid():
-            data = data_form.save()
-            for case in cases_formset.save(commit=False):
-                case.dataset_id = problem.id
-                case.save()
-            for case in cases_formset.deleted_objects:
-                case.delete()
+            with transaction.atomic():
+                data = data_form.save()
+                cases_formset.save_in_bulk(problem)
+            if self.uploaded_zip_info is not None and data.zipfile:
+                cache_zip_info(data.zipfile.path, self.uploaded_zip_info)
             ProblemDataCompiler.generate(problem, data, problem.cases.order_by('order'), valid_files)
             return HttpResponseRedirect(request.get_full_path())
         return self.render_to_response(self.get_context_data(data_form=data_form, cases_formset=cases_formset,
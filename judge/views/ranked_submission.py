@@ -4,7 +4,6 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
 
 from judge.models import Language, Submission
-from judge.utils.problems import get_result_data
 from judge.utils.raw_sql import join_sql_subquery
 from judge.views.submission import ForceContestMixin, ProblemSubmissions
 
@@ -73,9 +72,9 @@ class RankedSubmissions(ProblemSubmissions):
         ))
 
     def _get_result_data(self, queryset=None):
-        if queryset is None:
+        if queryset is None and self.get_result_counts_filter() is None:
             queryset = super(RankedSubmissions, self).get_queryset()
-        return get_result_data(queryset.order_by())
+        return super(RankedSubmissions, self)._get_result_data(queryset)
 
 
 class ContestRankedSubmission(ForceContestMixin, RankedSubmissions):
@@ -1,13 +1,13 @@
 from operator import itemgetter
 
 from django.conf import settings
-from django.db.models import Count, FloatField, Q, Value
+from django.db.models import Count, FloatField, Q, Sum, Value
 from django.db.models.expressions import CombinedExpression
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils.translation import gettext as _
 
-from judge.models import Language, Submission
+from judge.models import Language, Submission, SubmissionResultCount
 from judge.utils.stats import chart_colors, get_bar_chart, get_pie_chart, highlight_colors
 
 
@@ -37,7 +37,7 @@ def ac_language_data(request):
 
 def status_data(request, statuses=None):
     if not statuses:
-        statuses = (Submission.objects.values('result').annotate(count=Count('result'))
+        statuses = (SubmissionResultCount.objects.values('result').annotate(count=Sum('count'))
                     .values('result', 'count').order_by('-count'))
     data = []
     for status in statuses:
@@ -25,7 +25,8 @@ from judge.models import Contest, Language, Problem, ProblemTranslation, Profile
 from judge.models.problem import SubmissionSourceAccess
 from judge.utils.infinite_paginator import InfinitePaginationMixin
 from judge.utils.lazy import memo_lazy
-from judge.utils.problems import get_result_data, user_completed_ids, user_editable_ids, user_tester_ids
+from judge.utils.problems import get_counted_result_data, get_result_data, user_completed_ids, user_editable_ids, \
+    user_tester_ids
 from judge.utils.raw_sql import join_sql_subquery, use_straight_join
 from judge.utils.views import DiggPaginatorMixin, TitleMixin, generic_message
 
@@ -243,8 +244,27 @@ class SubmissionsListBase(DiggPaginatorMixin, TitleMixin, ListView):
             category['name'] = _(category['name'])
         return result
 
+    def get_result_counts_filter(self):
+        # Return the filters for get_counted_result_data when the maintained counters can serve this chart,
+        # or None to aggregate over the queryset instead.
+        return None
+
+    @cached_property
+    def can_see_all_submissions(self):
+        # The counters include submissions on private problems and in hidden contests,
+        # so they only describe a filtered list for those who can see all of them.
+        user = self.request.user
+        return user.has_perm('judge.see_private_contest') and (
+            user.has_perm('judge.see_private_problem') or
+            (user.has_perm('judge.edit_own_problem') and user.has_perm('judge.edit_all_problem'))
+        )
+
     def _get_result_data(self, queryset=None):
         if queryset is None:
+            counts_filter = self.get_result_counts_filter()
+            if counts_filter is not None:
+                return get_counted_result_data(languages=self.selected_languages, statuses=self.selected_statuses,
+                                               **counts_filter)
             queryset = self.get_queryset()
         return get_result_data(queryset.order_by())
 
@@ -395,6 +415,11 @@ class AllUserSubmissions(ConditionalUserTabMixin, UserMixin, SubmissionsListBase
     def get_queryset(self):
         return super(AllUserSubmissions, self).get_queryset().filter(user_id=self.profile.id)
 
+    def get_result_counts_filter(self):
+        if self.in_contest or self.selected_languages or not self.can_see_all_submissions:
+            return None
+        return {'user_id': self.profile.id}
+
     def get_title(self):
         if self.is_own:
             return _('All my submissions')
@@ -461,6 +486,12 @@ class ProblemSubmissionsBase(SubmissionsListBase):
         self.problem_name = self.problem.translated_name(self.request.LANGUAGE_CODE)
         return super(ProblemSubmissionsBase, self).get(request, *args, **kwargs)
 
+    def get_result_counts_filter(self):
+        # The chart of a public problem counts all of its submissions, like the global chart.
+        if self.in_contest or not (self.problem.is_public or self.can_see_all_submissions):
+            return None
+        return {'problem_id': self.problem.id}
+
     def get_all_submissions_page(self):
         return reverse('chronological_submissions', kwargs={'problem': self.problem.code})
 
@@ -493,6 +524,9 @@ class UserProblemSubmissions(ConditionalUserTabMixin, UserMixin, ProblemSubmissi
     def get_queryset(self):
         return super(UserProblemSubmissions, self).get_queryset().filter(user_id=self.profile.id)
 
+    def get_result_counts_filter(self):
+        return None
+
     def get_title(self):
         if self.is_own:
             return _('My submissions for %(problem)s') % {'problem': self.problem_name}
@@ -562,6 +596,13 @@ class AllSubmissions(InfinitePaginationMixin, SubmissionsListBase):
         context['stats_update_interval'] = self.stats_update_interval
         return context
 
+    def get_result_counts_filter(self):
+        # The unfiltered chart counts all submissions for everyone.
+        if self.in_contest or ((self.selected_languages or self.selected_statuses) and
+                               not self.can_see_all_submissions):
+            return None
+        return {}
+
     def _get_result_data(self, queryset=None):
         if queryset is not None or self.in_contest or self.selected_languages or self.selected_statuses:
             return super(AllSubmissions, self)._get_result_data(queryset)
@@ -570,7 +611,7 @@ class AllSubmissions(InfinitePaginationMixin, SubmissionsListBase):
         result = cache.get(key)
         if result:
             return result
-        result = super(AllSubmissions, self)._get_result_data(Submission.objects.all())
+        result = super(AllSubmissions, self)._get_result_data()
         cache.set(key, result, self.stats_update_interval)
         return result
 
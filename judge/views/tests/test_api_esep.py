@@ -0,0 +1,338 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from judge import event_poster
+from judge.caching import finished_submission, get_contest_staff_ids
+from judge.event_stream import EventStreamError
+from judge.models import Language, Problem, Profile, Submission, Ticket
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_organization, create_problem, create_user
+from judge.views.api.api_esep import APIContestBatch, APIContestEvents, APIContestGrantAccess, \
+    APIContestParticipation, APIContestTickets, APIProblemBroadcast, APIProblemListEsep, _contest_problem_statuses
+
+
+class APIProblemListEsepTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.profile = self.users['normal'].profile
+        self.create_problems(0, 5)
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def create_problems(self, start, end):
+        for i in range(start, end):
+            problem = create_problem(code='esep_list_%d' % i, is_public=True)
+            # Solved, then a later wrong answer; a wrong answer only; and untouched problems.
+            for result, case_points in (('AC', 10), ('WA', 0))[i % 3:]:
+                Submission.objects.create(user=self.profile, problem=problem, language=Language.get_python3(),
+                                          result=result, case_points=case_points, case_total=10)
+
+    def get_statuses(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with CaptureQueriesContext(connection) as queries:
+            response = APIProblemListEsep.as_view()(request, username='normal')
+        self.assertEqual(response.status_code, 200)
+        objects = json.loads(response.content)['data']['objects']
+        return {problem['code']: problem['user_status'] for problem in objects}, len(queries)
+
+    def test_user_status(self):
+        statuses, _ = self.get_statuses()
+        self.assertEqual(statuses, {
+            'esep_list_0': 'AC', 'esep_list_1': 'WA', 'esep_list_2': 'N', 'esep_list_3': 'AC', 'esep_list_4': 'WA',
+        })
+
+    def test_constant_queries(self):
+        # The first call also fills the cached lookups.
+        self.get_statuses()
+        _, query_count = self.get_statuses()
+        self.create_problems(5, 50)
+        more_statuses, more_query_count = self.get_statuses()
+        self.assertEqual(len(more_statuses), 50)
+        self.assertEqual(query_count, more_query_count)
+
+
+@override_settings(CPFED_TOKEN='cpfed')
+class APIContestGrantAccessTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.organization = create_organization(name='grant_access')
+        self.contest = create_contest(key='grant_access', organizations=('grant_access', 'open'))
+        self.students = ['grant_access_%d' % i for i in range(30)]
+        for username in self.students:
+            create_user(username=username)
+        self.users['normal'].profile.organizations.add(self.organization)
+
+    def setUp(self):
+        cache.clear()
+
+    def grant(self, usernames):
+        request = RequestFactory().post('/', json.dumps({'usernames': usernames}), content_type='application/json',
+                                        HTTP_AUTHORIZATION='Bearer cpfed')
+        with CaptureQueriesContext(connection) as queries:
+            response = APIContestGrantAccess.as_view()(request, contest_key=self.contest.key)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+
+    def test_grant(self):
+        data, _ = self.grant(['normal', 'missing'] + self.students)
+        self.assertEqual(data['added'], ['normal'] + self.students)
+        self.assertEqual(data['not_found'], ['missing'])
+        for username in ['normal'] + self.students:
+            self.assertEqual(
+                set(Profile.objects.get(user__username=username).organizations.values_list('name', flat=True)),
+                {'grant_access', 'open'},
+            )
+
+    def test_constant_queries(self):
+        # The first call also fills the cached lookups.
+        self.grant(self.students[:1])
+        _, query_count = self.grant(self.students[1:3])
+        _, more_query_count = self.grant(self.students[3:])
+        self.assertEqual(query_count, more_query_count)
+
+
+class ContestProblemStatusesTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.profile = self.users['normal'].profile
+        self.contest = create_contest(key='statuses')
+        self.problems = [create_problem(code='statuses_%d' % i) for i in range(4)]
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, problem, result, case_points=0, case_total=10, minutes=0, contest=True):
+        judged_date = timezone.now() + timedelta(minutes=minutes) if result else None
+        return Submission.objects.create(user=self.profile, problem=problem, language=Language.get_python3(),
+                                         result=result, case_points=case_points, case_total=case_total,
+                                         judged_date=judged_date, contest_object=self.contest if contest else None)
+
+    def statuses(self):
+        return _contest_problem_statuses(self.contest, self.profile)
+
+    def test_statuses(self):
+        # Solved, then a later wrong answer.
+        self.submit(self.problems[0], 'AC', 10, minutes=0)
+        self.submit(self.problems[0], 'WA', 2, minutes=1)
+        # Still queued, which does not replace the last judged result.
+        self.submit(self.problems[1], 'TLE', 5, minutes=0)
+        self.submit(self.problems[1], None, minutes=1)
+        # Partially solved, with a better earlier attempt; and no tests at all.
+        self.submit(self.problems[2], 'WA', 6, minutes=0)
+        self.submit(self.problems[2], 'WA', 3, minutes=1)
+        self.submit(self.problems[3], 'CE', 0, 0)
+        # Outside the contest.
+        self.submit(self.problems[3], 'AC', 10, contest=False)
+
+        self.assertEqual(self.statuses(), {
+            self.problems[0].id: ('AC', 1),
+            self.problems[1].id: ('TLE', 0.5),
+            self.problems[2].id: ('WA', 0.6),
+            self.problems[3].id: ('CE', None),
+        })
+
+    def test_cached(self):
+        self.submit(self.problems[0], 'WA', 2)
+        self.statuses()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.statuses(), {self.problems[0].id: ('WA', 0.2)})
+
+    def test_regraded(self):
+        submission = self.submit(self.problems[0], 'AC', 10)
+        self.assertEqual(self.statuses(), {self.problems[0].id: ('AC', 1)})
+        with self.captureOnCommitCallbacks(execute=True):
+            Submission.objects.filter(id=submission.id).update_result(result='WA', case_points=4)
+        self.assertEqual(self.statuses(), {self.problems[0].id: ('WA', 0.4)})
+
+    def test_finished(self):
+        self.submit(self.problems[0], 'WA', 2)
+        self.statuses()
+        finished_submission(self.submit(self.problems[0], 'AC', 10, minutes=1))
+        self.assertEqual(self.statuses(), {self.problems[0].id: ('AC', 1)})
+
+    def test_deleted(self):
+        submission = self.submit(self.problems[0], 'AC', 10)
+        self.statuses()
+        submission.delete()
+        self.assertEqual(self.statuses(), {})
+
+
+@override_settings(CPFED_TOKEN='cpfed')
+class APIProblemBroadcastTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='broadcast')
+        self.contest = create_contest(key='broadcast', curators=('staff_problem_edit_own',))
+        problem_ct = ContentType.objects.get_for_model(Problem)
+        self.tickets = [
+            Ticket.objects.create(title='ticket %d' % i, user=self.users['normal'].profile, content_type=problem_ct,
+                                  object_id=self.problem.id, is_open=i != 0)
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def broadcast(self, username):
+        request = RequestFactory().post('/', json.dumps({
+            'username': username, 'body': 'clarification', 'contest_key': self.contest.key,
+        }), content_type='application/json', HTTP_AUTHORIZATION='Bearer cpfed')
+        return APIProblemBroadcast.as_view()(request, problem_code=self.problem.code)
+
+    def test_broadcast(self):
+        response = self.broadcast('staff_problem_edit_own')
+        self.assertEqual(response.status_code, 201)
+        created = json.loads(response.content)['created']
+        self.assertEqual([message['ticket_id'] for message in created], [ticket.id for ticket in self.tickets[1:]])
+        for message in created:
+            ticket = Ticket.objects.get(id=message['ticket_id'])
+            self.assertFalse(ticket.is_open)
+            self.assertEqual(ticket.messages.get().id, message['message_id'])
+        self.assertFalse(self.tickets[0].messages.exists())
+
+    def test_not_staff(self):
+        self.assertEqual(self.broadcast('normal').status_code, 403)
+
+    def test_staff_ids_invalidated(self):
+        staff = self.users['staff_problem_edit_own'].profile
+        self.assertEqual(get_contest_staff_ids(self.contest.id), {staff.id})
+        self.contest.testers.add(self.users['normal'].profile)
+        self.assertEqual(get_contest_staff_ids(self.contest.id), {staff.id, self.users['normal'].profile.id})
+        staff.curated_contests.clear()
+        self.assertEqual(get_contest_staff_ids(self.contest.id), {self.users['normal'].profile.id})
+
+
+@override_settings(CPFED_TOKEN='cpfed')
+class APIContestBatchTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='batch', curators=('staff_problem_edit_own',))
+        create_contest_participation(contest=self.contest, user='normal')
+
+    def setUp(self):
+        cache.clear()
+
+    def batch(self, requests, username='normal'):
+        request = RequestFactory().post('/', json.dumps({'username': username, 'requests': requests}),
+                                        content_type='application/json', HTTP_AUTHORIZATION='Bearer cpfed')
+        return APIContestBatch.as_view()(request, contest_key=self.contest.key)
+
+    def call(self, view, **params):
+        request = RequestFactory().get('/', params, HTTP_AUTHORIZATION='Bearer cpfed')
+        response = view.as_view()(request, contest_key=self.contest.key)
+        return {'status': response.status_code, 'data': json.loads(response.content)}
+
+    def test_same_as_separate_calls(self):
+        response = self.batch([{'name': 'participation'}, {'name': 'tickets', 'since': '2000-01-01T00:00:00Z'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['responses'], [
+            dict(name='participation', **self.call(APIContestParticipation, username='normal')),
+            dict(name='tickets', **self.call(APIContestTickets, username='normal', since='2000-01-01T00:00:00Z')),
+        ])
+
+    def test_sub_request_errors(self):
+        responses = json.loads(self.batch([{'name': 'participation'}], username='missing').content)['responses']
+        self.assertEqual(responses[0]['status'], 404)
+
+    def test_unknown_request(self):
+        self.assertEqual(self.batch([{'name': 'unknown'}]).status_code, 400)
+        self.assertEqual(self.batch([{'name': ['participation']}]).status_code, 400)
+        self.assertEqual(self.batch([]).status_code, 400)
+
+
+class StandInSubscriber:
+    """Replays the messages of the channels it subscribed to, then goes away like a restarted daemon."""
+    messages = []
+
+    def __init__(self, channels, last_id=0):
+        self.pending = [data for data in self.messages if data['channel'] in channels and data['id'] > last_id]
+
+    def recv(self):
+        if not self.pending:
+            raise EventStreamError('gone')
+        return self.pending.pop(0)
+
+    def close(self):
+        pass
+
+
+@override_settings(CPFED_TOKEN='cpfed')
+class APIContestEventsTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='events', curators=('staff_problem_edit_own',))
+        self.frozen = create_contest(key='events_frozen', freeze_time=timedelta(days=50))
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(event_poster, 'real', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def publish(self, contest):
+        normal, other = self.users['normal'].profile.id, self.users['staff_problem_edit_own'].profile.id
+        channel = 'contest_%d' % contest.id
+        StandInSubscriber.messages = [
+            {'id': 1, 'channel': channel, 'message': {'type': 'update'}},
+            {'id': 2, 'channel': channel, 'message': {'type': 'submission', 'id': 10, 'user': normal,
+                                                      'problem': 1, 'status': 'D'}},
+            {'id': 3, 'channel': channel, 'message': {'type': 'submission', 'id': 11, 'user': other,
+                                                      'problem': 1, 'status': 'D'}},
+            {'id': 4, 'channel': 'contest_0', 'message': {'type': 'update'}},
+            {'id': 5, 'channel': channel, 'message': {'type': 'announcement', 'id': 3}},
+        ]
+
+    def events(self, contest, username=None, **headers):
+        params = {'username': username} if username else {}
+        request = RequestFactory().get('/', params, HTTP_AUTHORIZATION='Bearer cpfed', **headers)
+        response = APIContestEvents.as_view(subscriber_class=StandInSubscriber)(request, contest_key=contest.key)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = []
+        for chunk in b''.join(response.streaming_content).decode('utf-8').split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in chunk.split('\n') if line and not line.startswith(':'))
+            if 'event' in fields:
+                events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+        return events
+
+    def test_open_contest(self):
+        self.publish(self.contest)
+        events = self.events(self.contest, username='normal')
+        self.assertEqual([(id, type) for id, type, data in events],
+                         [(1, 'standings'), (2, 'submission'), (3, 'submission'), (5, 'announcement')])
+        self.assertEqual(events[2][2]['status'], 'D')
+
+    def test_resume(self):
+        self.publish(self.contest)
+        self.assertEqual([id for id, type, data in self.events(self.contest, HTTP_LAST_EVENT_ID='3')], [5])
+
+    def test_frozen_contest(self):
+        self.publish(self.frozen)
+        events = self.events(self.frozen, username='normal')
+        # Only the viewer's own submission, and no standings changes while the scoreboard is frozen.
+        self.assertEqual([(id, type) for id, type, data in events], [(2, 'submission'), (5, 'announcement')])
+        self.assertEqual(events[0][2]['status'], 'D')
+
+    def test_unavailable(self):
+        with mock.patch.object(event_poster, 'real', False):
+            request = RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer cpfed')
+            response = APIContestEvents.as_view(subscriber_class=StandInSubscriber)(
+                request, contest_key=self.contest.key)
+        self.assertEqual(response.status_code, 503)
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from judge.comments import get_comment_tree
+from judge.models import Comment
+from judge.models.tests.util import CommonDataMixin
+
+
+class CommentTreeTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.author = self.users['normal'].profile
+        self.root = Comment.objects.create(author=self.author, page='p:tree', body='root')
+        self.reply = Comment.objects.create(author=self.author, page='p:tree', body='*reply*', parent=self.root)
+        Comment.objects.create(author=self.author, page='p:other', body='other')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tree(self):
+        tree, bodies = get_comment_tree('p:tree', 'svg')
+        self.assertEqual([node.id for node in tree], [self.root.id])
+        with self.assertNumQueries(0):
+            self.assertEqual([node.id for node in tree[0].get_children()], [self.reply.id])
+        self.assertEqual(set(bodies), {self.root.id, self.reply.id})
+        self.assertIn('<em>reply</em>', bodies[self.reply.id])
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            tree, bodies = get_comment_tree('p:tree', 'svg')
+            self.assertEqual([node.id for node in tree[0].get_children()], [self.reply.id])
+
+    def test_cached(self):
+        get_comment_tree('p:tree', 'svg')
+        with self.assertNumQueries(0):
+            tree, bodies = get_comment_tree('p:tree', 'svg')
+            self.assertEqual([node.id for node in tree[0].get_children()], [self.reply.id])
+
+    def test_invalidated(self):
+        get_comment_tree('p:tree', 'svg')
+        comment = Comment.objects.create(author=self.author, page='p:tree', body='new')
+        tree, bodies = get_comment_tree('p:tree', 'svg')
+        self.assertIn(comment.id, bodies)
+
+        comment.body = 'edited'
+        comment.save()
+        tree, bodies = get_comment_tree('p:tree', 'svg')
+        self.assertIn('edited', bodies[comment.id])
+
+    def test_reply_to_hidden_comment(self):
+        Comment.objects.filter(id=self.root.id).update(hidden=True)
+        tree, bodies = get_comment_tree('p:tree', 'svg')
+        self.assertEqual([node.id for node in tree], [self.reply.id])
@@ -0,0 +1,40 @@
+import json
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from judge.models import Language, Submission, SubmissionResultCount
+from judge.models.tests.util import CommonDataMixin, create_problem
+from judge.views.submission import AllSubmissions, ProblemSubmissions
+
+
+class SubmissionChartTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.public = create_problem(code='chart_public', is_public=True)
+        self.private = create_problem(code='chart_private', is_public=False)
+        for problem in (self.public, self.private):
+            Submission.objects.create(user=self.users['normal'].profile, problem=problem,
+                                      language=Language.get_python3(), result='AC')
+        # Leave the counters out of step with judge_submission, to tell which one the chart was read from.
+        SubmissionResultCount.objects.filter(problem=self.public).update(count=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_total(self, view, params=None, **kwargs):
+        request = RequestFactory().get('/', {'results': '', **(params or {})})
+        request.user = self.users['normal']
+        request.profile = self.users['normal'].profile
+        request.LANGUAGE_CODE = 'en'
+        return json.loads(view.as_view()(request, **kwargs).content)['total']
+
+    def test_global_chart(self):
+        self.assertEqual(self.get_total(AllSubmissions), 6)
+
+    def test_filtered_global_chart(self):
+        self.assertEqual(self.get_total(AllSubmissions, {'status': 'AC'}), 1)
+
+    def test_public_problem_chart(self):
+        self.assertEqual(self.get_total(ProblemSubmissions, problem=self.public.code), 5)
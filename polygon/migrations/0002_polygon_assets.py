@@ -0,0 +1,31 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolygonAsset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                (
+                    'kind',
+                    models.CharField(choices=[('I', 'Statement image'), ('D', 'Problem data file')], max_length=1),
+                ),
+                ('sha1', models.CharField(max_length=40)),
+                ('size', models.BigIntegerField()),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='problemsource',
+            name='assets',
+            field=models.ManyToManyField(blank=True, related_name='sources', to='polygon.polygonasset'),
+        ),
+    ]
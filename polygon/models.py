@@ -1,8 +1,111 @@
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.validators import RegexValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from judge.models import Problem, Profile, Submission
+from judge.models import Problem, ProblemTranslation, Profile, Solution, Submission
+from judge.utils.iterator import chunk
+
+
+def asset_data_root() -> Path:
+    # Kept inside the problem data root so that assets can be hard linked into problem directories.
+    return Path(settings.DMOJ_PROBLEM_DATA_ROOT) / '.polygon'
+
+
+class PolygonAsset(models.Model):
+    """A file imported from Polygon, stored once under its SHA-1 however many imports contain it.
+
+    Images are stored in the default storage so they can be served; data files (test archives, checkers and
+    interactors) are stored under asset_data_root() and hard linked into the problem data directories.
+    An asset is referenced by the problem sources whose latest import used it.
+    """
+
+    KIND = (
+        ('I', _('Statement image')),
+        ('D', _('Problem data file')),
+    )
+
+    # Unreferenced files are kept for a while after they were last stored or reused, since an import in progress may
+    # be about to reference them. The age is taken from the file itself, which every import touches as it uses it.
+    GRACE_PERIOD = timedelta(days=1)
+
+    name = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=1, choices=KIND)
+    sha1 = models.CharField(max_length=40)
+    size = models.BigIntegerField()
+    last_used = models.DateTimeField(default=timezone.now)
+
+    @property
+    def path(self) -> str:
+        if self.kind == 'I':
+            return default_storage.path(self.name)
+        return str(asset_data_root() / self.name)
+
+    def delete_blob(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def stored_files(cls) -> Iterator[Tuple[str, str, Path]]:
+        """Yields the kind, name and path of every file in the asset store, whether or not it has a row."""
+        for kind, root, prefix in (('I', Path(default_storage.path('polygon')), 'polygon/'),
+                                   ('D', asset_data_root(), '')):
+            if not root.is_dir():
+                continue
+            for path in root.glob('*/*'):
+                # Files being written are hidden behind temporary names until they are complete.
+                if path.is_file() and not path.name.startswith('tmp'):
+                    yield kind, prefix + path.relative_to(root).as_posix(), path
+
+    @staticmethod
+    def is_image_linked(name: str) -> bool:
+        # Statements stay in the problem after its source is gone, and may have been copied elsewhere.
+        return (
+            Problem.objects.filter(description__contains=name).exists() or
+            ProblemTranslation.objects.filter(description__contains=name).exists() or
+            Solution.objects.filter(content__contains=name).exists()
+        )
+
+    @classmethod
+    def collect_garbage(cls) -> int:
+        """Deletes the stored files that no problem source uses and no statement links.
+
+        The files on disk are walked rather than the rows, so files stored by imports that failed before registering
+        them are collected as well.
+        """
+        cutoff = (timezone.now() - cls.GRACE_PERIOD).timestamp()
+        referenced = set(cls.objects.exclude(sources=None).values_list('name', flat=True))
+        stored = set()
+        removed = []
+        for kind, name, path in cls.stored_files():
+            stored.add(name)
+            if name in referenced:
+                continue
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if kind == 'I' and cls.is_image_linked(name):
+                continue
+            path.unlink(missing_ok=True)
+            removed.append(name)
+
+        # Rows of files that are gone are dropped too; an import that stores the file again recreates its row.
+        kept = stored.difference(removed)
+        stale = [id for id, name in cls.objects.filter(sources=None).values_list('id', 'name') if name not in kept]
+        for ids in chunk(stale, 1000):
+            cls.objects.filter(id__in=ids, sources=None).delete()
+        return len(removed)
 
 
 class ProblemSource(models.Model):
@@ -30,6 +133,8 @@ class ProblemSource(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True, null=False)
 
+    assets = models.ManyToManyField(PolygonAsset, blank=True, related_name='sources')
+
     class Meta:
         permissions = (('import_problems', _('Import problems from Polygon')),)
 
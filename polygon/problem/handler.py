@@ -1,10 +1,10 @@
 import json
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List
 
 from django.conf import settings
-from django.core.files import File
 from django.core.files.storage import default_storage
 from django.db import transaction
 from django.utils import timezone
@@ -15,9 +15,11 @@ from .assets import parse_assets
 from .constants import POLYGON_COMPILERS
 from .exceptions import ProblemImportError
 from .statement import parse_statements
+from .store import discard_new_assets, register_assets, store_data_file
 from .tests import parse_tests
 from .types import ImportContext, MainSolution, ProblemConfig, ProblemProperties, Statement
 from .utils import asdict_notnull
+from ..models import PolygonAsset
 
 
 @transaction.atomic
@@ -64,20 +66,17 @@ def save_problem(
 
     problem_path = Path(settings.DMOJ_PROBLEM_DATA_ROOT) / problem.code
 
-    with (context.temp_dir / config.archive).open('rb') as f:
-        ProblemData.objects.update_or_create(
-            problem=problem,
-            defaults={
-                'problem': problem,
-                'zipfile': File(f, name=config.archive),
-                'unicode': 'unicode' in (config.hints or []),
-            },
-        )
+    # Data files are linked from the asset store, so files that did not change since the last import are left
+    # untouched rather than rewritten.
+    if store_data_file(context, context.temp_dir / config.archive, problem_path / config.archive):
+        context.logger.info('Test data changed, storing %s', config.archive)
+    data, _ = ProblemData.objects.get_or_create(problem=problem)
+    data.zipfile.name = f'{problem.code}/{config.archive}'
+    data.unicode = 'unicode' in (config.hints or [])
+    data.save()
 
     # Should we import TestCases so they will be editable in site?
 
-    problem_path = Path(settings.DMOJ_PROBLEM_DATA_ROOT) / problem.code
-
     # Save supplementary files
     files = []
     if config.checker:
@@ -85,9 +84,14 @@ def save_problem(
     if config.interactive:
         files += config.interactive.files
     for file in files:
-        shutil.move(context.temp_dir / file, problem_path / file)
+        store_data_file(context, context.temp_dir / file, problem_path / file)
+
+    init = json.dumps(asdict_notnull(config))
+    init_path = problem_path / 'init.yml'
+    if not init_path.exists() or init_path.read_text() != init:
+        init_path.write_text(init)
 
-    (problem_path / 'init.yml').write_text(json.dumps(asdict_notnull(config)))
+    register_assets(context)
 
     return problem
 
@@ -223,33 +227,38 @@ def judge_main_submission(context: ImportContext, problem: Problem) -> None:
         context.source.main_submission.judge(force_judge=True, rejudge=True, rejudge_user=context.author.user)
 
 
+def prepare_config(context: ImportContext) -> ProblemConfig:
+    with context.task.stage('Processing testsets'):
+        config = parse_tests(context)
+    with context.task.stage('Processing assets'):
+        parse_assets(context, config)
+    return config
+
+
 def handle_import(context: ImportContext):
     revision = context.descriptor.get('revision')
     context.logger.info('Importing problem revision %s', revision)
 
-    context.task.report('Processing testsets')
-    config = parse_tests(context)
-    context.task.report('Processing assets')
-    parse_assets(context, config)
-
     try:
-        context.task.report('Processing statements')
-        statements = parse_statements(context)
+        # Copying the tests is I/O bound while converting statements waits on pandoc, so both run at once.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            config_future = executor.submit(prepare_config, context)
+            with context.task.stage('Processing statements'):
+                statements = parse_statements(context)
+            config = config_future.result()
 
-        context.task.report('Saving problem')
-        properties = prepare_properties(context, config, statements)
+        with context.task.stage('Saving problem'):
+            properties = prepare_properties(context, config, statements)
 
-        problem = save_problem(context, properties, config)
+            problem = save_problem(context, properties, config)
 
-        context.source.problem = problem
-        context.source.save()
+            context.source.problem = problem
+            context.source.save()
     except:  # noqa: E722, we need cleanup for every failure including KeyboardInterrupt
-        try:
-            shutil.rmtree(default_storage.path(f'problems/{context.source.problem_code}/{context.upload_id}'))
-        except FileNotFoundError:
-            pass
+        discard_new_assets(context)
         raise
 
     cleanup(context, config)
+    PolygonAsset.collect_garbage()
 
     judge_main_submission(context, problem)
@@ -1,16 +1,18 @@
+import functools
 import hashlib
 import json
 import os
 import re
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List
 
 from django.conf import settings
-from django.core.files.storage import default_storage
 from django.utils.translation import gettext as _, override
 
 from .exceptions import ProblemImportError
+from .store import store_image
 from .types import ImportContext, Statement
 
 POLYGON_TO_DMOJ_LANG = {
@@ -202,25 +204,48 @@ TEX_MACROS = r"""
 """
 
 
-def pandoc_tex_to_markdown(tex: str) -> str:
-    tex = TEX_MACROS + tex
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        with open(os.path.join(tmp_dir, 'temp.tex'), 'w', encoding='utf-8') as f:
-            f.write(tex)
+# Marks the boundaries between sections converted in a single pandoc run. Pandoc passes it through as a
+# paragraph of its own, which is then used to split the output back up.
+SECTION_BREAK = 'DMOJPANDOCSECTIONBREAK'
+SECTION_BREAK_RE = re.compile(r'^%s$' % SECTION_BREAK, re.MULTILINE)
+
 
-        with open(os.path.join(tmp_dir, 'filter.lua'), 'w', encoding='utf-8') as f:
+@functools.lru_cache(maxsize=None)
+def pandoc_filter_path() -> str:
+    # Written once per process instead of once per conversion, under a name tied to its content.
+    path = os.path.join(
+        tempfile.gettempdir(),
+        'dmoj-polygon-%s.lua' % hashlib.sha1(PANDOC_FILTER.encode('utf-8')).hexdigest()[:16],
+    )
+    if not os.path.exists(path):
+        fd, temp_path = tempfile.mkstemp(suffix='.lua')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             f.write(PANDOC_FILTER)
+        os.replace(temp_path, path)
+    return path
 
-        subprocess.run(
-            ['pandoc', '--lua-filter=filter.lua', '-t', 'gfm', '-o', 'temp.md', 'temp.tex'],
-            cwd=tmp_dir,
-            check=True,
-        )
 
-        with open(os.path.join(tmp_dir, 'temp.md'), 'r', encoding='utf-8') as f:
-            md = f.read()
+def pandoc_tex_to_markdown(tex: str) -> str:
+    return subprocess.run(
+        ['pandoc', '-f', 'latex', f'--lua-filter={pandoc_filter_path()}', '-t', 'gfm'],
+        input=TEX_MACROS + tex,
+        stdout=subprocess.PIPE,
+        check=True,
+        encoding='utf-8',
+    ).stdout
+
 
-    return md
+def pandoc_tex_to_markdown_many(sections: List[str]) -> List[str]:
+    """Converts several independent sections with one pandoc run, falling back to one run per section if the
+    output can't be split back up."""
+    if len(sections) <= 1:
+        return [pandoc_tex_to_markdown(tex) for tex in sections]
+
+    md = pandoc_tex_to_markdown(f'\n\n{SECTION_BREAK}\n\n'.join(sections))
+    parts = SECTION_BREAK_RE.split(md)
+    if len(parts) != len(sections):
+        return [pandoc_tex_to_markdown(tex) for tex in sections]
+    return [part.strip('\n') + '\n' if part.strip('\n') else '' for part in parts]
 
 
 def pandoc_get_version() -> tuple[int, int, int]:
@@ -230,27 +255,10 @@ def pandoc_get_version() -> tuple[int, int, int]:
 
 def process_images(context: ImportContext, statement_folder: str, text: str) -> str:
     def save_image(image_path: str) -> str:
-        if len(context.image_cache) == 0:
-            os.makedirs(
-                default_storage.path(f'problems/{context.source.problem_code}/{context.upload_id}'),
-                exist_ok=True,
-            )
-
         norm_path = os.path.normpath(os.path.join(statement_folder, image_path))
-        sha1 = hashlib.sha1(context.package.read(norm_path)).hexdigest()
-
-        if sha1 not in context.image_cache:
-            path = f'problems/{context.source.problem_code}/{context.upload_id}/{sha1}_{os.path.basename(image_path)}'
-            with context.package.open(norm_path, 'r') as image_source:
-                default_storage.save(path, image_source)
-
-            url = settings.MEDIA_URL
-            if not url.endswith('/'):
-                url = url + '/'
-            url += path
-            context.image_cache[sha1] = url
-
-        return context.image_cache[sha1]
+        if norm_path not in context.image_cache:
+            context.image_cache[norm_path] = store_image(context, norm_path)
+        return context.image_cache[norm_path]
 
     for image_path in set(re.findall(r'!\[image\]\((.+?)\)', text)):
         text = text.replace(
@@ -268,28 +276,38 @@ def process_images(context: ImportContext, statement_folder: str, text: str) ->
     return text
 
 
-def parse_problem_properties(language: str, problem_properties: dict[str, Any]) -> str:
+SECTIONS = ('input', 'output', 'interaction', 'scoring')
+
+
+def parse_problem_properties(language: str, problem_properties: dict[str, Any]) -> tuple[str, str | None]:
+    """Returns the description and tutorial of a statement, converting all of its sections in one pandoc run."""
     def header(text: str, level: int = 2) -> str:
         return f'\n{"#" * level} {text}\n\n'
 
-    with override(language):
-        description = pandoc_tex_to_markdown(problem_properties['legend'])
+    tutorial = problem_properties.get('tutorial')
+    if not isinstance(tutorial, str) or tutorial == '':
+        tutorial = None
 
-        if problem_properties['input']:
-            description += header(_('Input'))
-            description += pandoc_tex_to_markdown(problem_properties['input'])
+    names = ['legend'] + [name for name in SECTIONS + ('notes',) if problem_properties[name]]
+    sources = [problem_properties[name] for name in names]
+    if tutorial is not None:
+        sources.append(tutorial)
+    converted = pandoc_tex_to_markdown_many(sources)
+    sections = dict(zip(names, converted))
 
-        if problem_properties['output']:
-            description += header(_('Output'))
-            description += pandoc_tex_to_markdown(problem_properties['output'])
-
-        if problem_properties['interaction']:
-            description += header(_('Interaction'))
-            description += pandoc_tex_to_markdown(problem_properties['interaction'])
+    with override(language):
+        description = sections['legend']
 
-        if problem_properties['scoring']:
-            description += header(_('Scoring'))
-            description += pandoc_tex_to_markdown(problem_properties['scoring'])
+        titles = {
+            'input': _('Input'),
+            'output': _('Output'),
+            'interaction': _('Interaction'),
+            'scoring': _('Scoring'),
+        }
+        for name in SECTIONS:
+            if name in sections:
+                description += header(titles[name])
+                description += sections[name]
 
         if problem_properties['sampleTests']:
             description += header(_('Samples'))
@@ -299,11 +317,11 @@ def parse_problem_properties(language: str, problem_properties: dict[str, Any])
                 description += header(_('Output {}').format(i), level=3)
                 description += '```\n' + sample['output'].strip() + '\n```\n'
 
-        if problem_properties['notes']:
+        if 'notes' in sections:
             description += header(_('Notes'))
-            description += pandoc_tex_to_markdown(problem_properties['notes'])
+            description += sections['notes']
 
-        return description
+    return description, converted[-1] if tutorial is not None else None
 
 
 def parse_statements(context: ImportContext) -> List[Statement]:
@@ -320,6 +338,7 @@ def parse_statements(context: ImportContext) -> List[Statement]:
         return Statement(name=name or 'Unnamed')
 
     existing_languages = set()
+    pending = []
 
     for statement_block in statement_blocks:
         origin_language = statement_block.get('language', 'unknown')
@@ -344,19 +363,25 @@ def parse_statements(context: ImportContext) -> List[Statement]:
             raise ProblemImportError(f'problem-properties.json not found at path {problem_properties_path}')
 
         problem_properties = json.loads(context.package.read(problem_properties_path).decode('utf-8'))
-
-        description = parse_problem_properties(language, problem_properties)
+        pending.append((origin_language, language, statement_folder, problem_properties))
+
+    # Each statement is converted by its own pandoc process, so statements in different languages are converted
+    # concurrently. Threads are enough since the actual work happens in the subprocesses.
+    with ThreadPoolExecutor(max_workers=settings.POLYGON_IMPORT_WORKERS) as executor:
+        converted = list(executor.map(
+            lambda item: parse_problem_properties(item[1], item[3]),
+            pending,
+        ))
+
+    for (origin_language, language, statement_folder, problem_properties), (description, tutorial) in \
+            zip(pending, converted):
         description = process_images(context, statement_folder, description)
 
         name_element = context.descriptor.find(f'.//name[@language="{origin_language}"]')
         name = name_element.get('value') if name_element is not None else ''
 
-        tutorial = problem_properties.get('tutorial')
-        if isinstance(tutorial, str) and tutorial != '':
-            tutorial = pandoc_tex_to_markdown(tutorial)
+        if tutorial is not None:
             tutorial = process_images(context, statement_folder, tutorial)
-        else:
-            tutorial = None
 
         statements.append(
             Statement(
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .types import ImportContext, StoredAsset
+from ..models import PolygonAsset, asset_data_root
+
+
+def hash_file(path: Path) -> str:
+    sha1 = hashlib.sha1()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def store_image(context: ImportContext, member: str) -> str:
+    """Stores an image from the package under its hash and returns its URL. Nothing is written if the same image
+    was already imported, by this problem or any other."""
+    content = context.package.read(member)
+    sha1 = hashlib.sha1(content).hexdigest()
+    name = f'polygon/{sha1[:2]}/{sha1}{os.path.splitext(member)[1].lower()}'
+    try:
+        # The age of a stored file is what protects it from collection, so reusing it refreshes it.
+        os.utime(default_storage.path(name))
+        created = False
+    except FileNotFoundError:
+        default_storage.save(name, ContentFile(content))
+        created = True
+    context.assets.append(StoredAsset(name=name, kind='I', sha1=sha1, size=len(content), created=created))
+
+    url = settings.MEDIA_URL
+    if not url.endswith('/'):
+        url = url + '/'
+    return url + name
+
+
+def store_data_file(context: ImportContext, source: Path, destination: Path) -> bool:
+    """Moves `source` into the asset store and hard links it to `destination`.
+
+    Returns False if `destination` already was the stored file, i.e. nothing had to be written.
+    """
+    sha1 = hash_file(source)
+    name = f'{sha1[:2]}/{sha1}'
+    blob = asset_data_root() / name
+    size = source.stat().st_size
+
+    try:
+        # The age of a stored file is what protects it from collection, so reusing it refreshes it.
+        os.utime(blob)
+        created = False
+    except FileNotFoundError:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        # Copied next to the blob first so that the blob appears atomically.
+        fd, temp_path = tempfile.mkstemp(dir=blob.parent)
+        os.close(fd)
+        shutil.move(source, temp_path)
+        os.replace(temp_path, blob)
+        # Moving may have kept the modification time of the source.
+        os.utime(blob)
+        created = True
+    context.assets.append(StoredAsset(name=name, kind='D', sha1=sha1, size=size, created=created))
+
+    try:
+        if destination.exists() and os.path.samefile(blob, destination):
+            return False
+    except OSError:
+        pass
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp_link = destination.with_name(f'.{destination.name}.{context.upload_id}')
+    try:
+        os.link(blob, temp_link)
+    except OSError:
+        # Filesystems without hard links get a copy instead.
+        shutil.copyfile(blob, temp_link)
+    os.replace(temp_link, destination)
+    return True
+
+
+def register_assets(context: ImportContext) -> None:
+    """Records the assets used by this import as referenced by its problem source."""
+    assets = {asset.name: asset for asset in context.assets}
+    existing = set(PolygonAsset.objects.filter(name__in=assets.keys()).values_list('name', flat=True))
+    PolygonAsset.objects.bulk_create([
+        PolygonAsset(name=asset.name, kind=asset.kind, sha1=asset.sha1, size=asset.size)
+        for name, asset in assets.items() if name not in existing
+    ], ignore_conflicts=True)
+
+    used = PolygonAsset.objects.filter(name__in=assets.keys())
+    used.update(last_used=timezone.now())
+    context.source.assets.set(used)
+
+
+def discard_new_assets(context: ImportContext) -> None:
+    """Deletes the files that a failed import stored, unless another import has registered them since."""
+    new = {asset.name: asset for asset in context.assets if asset.created}
+    registered = set(PolygonAsset.objects.filter(name__in=new.keys()).values_list('name', flat=True))
+    for name, asset in new.items():
+        if name not in registered:
+            PolygonAsset(name=name, kind=asset.kind).delete_blob()
@@ -1,3 +1,6 @@
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from logging import Logger
 from pathlib import Path
@@ -14,9 +17,33 @@ from ..models import ProblemSource
 class TaskReporter:
     def __init__(self, task: Task):
         self.task = task
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
 
     def report(self, stage: str):
-        self.task.update_state(state='WORKING', meta={'stage': stage})
+        with self._lock:
+            self.task.update_state(state='WORKING', meta={'stage': stage, 'timings': dict(self.timings)})
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Reports the stage and records how long it took, in seconds. Stages may run concurrently."""
+        self.report(stage)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.timings[stage] = self.timings.get(stage, 0) + time.monotonic() - start
+
+
+@dataclass
+class StoredAsset:
+    name: str
+    kind: str
+    sha1: str
+    size: int
+    # Whether this import wrote the file, rather than finding it already stored.
+    created: bool = False
 
 
 @dataclass
@@ -30,6 +57,7 @@ class ImportContext:
     temp_dir: Path
     upload_id: str
     image_cache: dict[str, str] = field(default_factory=dict)
+    assets: List[StoredAsset] = field(default_factory=list)
 
 
 @dataclass
@@ -64,8 +64,8 @@ def import_problem(self: Task, problem_source_id: int, profile_id: int):
             temp_dir = Path(temp_dir)
             archive_path = temp_dir / 'archive.zip'
 
-            task.report('Downloading problem archive')
-            prepare_archive(logger, problem_source.polygon_id, archive_path)
+            with task.stage('Downloading problem archive'):
+                prepare_archive(logger, problem_source.polygon_id, archive_path)
 
             with zipfile.ZipFile(archive_path) as package:
                 if 'problem.xml' not in package.namelist():
@@ -91,5 +91,7 @@ def import_problem(self: Task, problem_source_id: int, profile_id: int):
     else:
         problem_import.status = 'C'
     finally:
+        for stage, elapsed in task.timings.items():
+            logger.info('%s took %.2fs', stage, elapsed)
         problem_import.log = log_stream.getvalue()
         problem_import.save()
@@ -0,0 +1,127 @@
+import io
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from judge.models.tests.util import CommonDataMixin, create_problem
+from polygon.models import PolygonAsset, ProblemSource, asset_data_root
+from polygon.problem.store import discard_new_assets, register_assets, store_data_file, store_image
+from polygon.problem.types import ImportContext
+
+
+class PolygonAssetStoreTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.source = ProblemSource.objects.create(
+            polygon_id=1, author=self.users['superuser'].profile, problem_code='polygonstore',
+        )
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings = override_settings(
+            DMOJ_PROBLEM_DATA_ROOT=os.path.join(self.root.name, 'problems'),
+            MEDIA_ROOT=os.path.join(self.root.name, 'media'),
+            MEDIA_URL='/media/',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, 'w') as zf:
+            zf.writestr('statements/image.png', b'image')
+        self.package = zipfile.ZipFile(package)
+        self.addCleanup(self.package.close)
+
+    def context(self):
+        temp_dir = Path(self.root.name) / 'temp'
+        temp_dir.mkdir(exist_ok=True)
+        return ImportContext(
+            source=self.source, task=None, author=self.source.author, package=self.package, descriptor=None,
+            logger=logging.getLogger(__name__), temp_dir=temp_dir, upload_id='upload',
+        )
+
+    def store_data(self, context, content, name='checker.cpp'):
+        source = context.temp_dir / name
+        source.write_bytes(content)
+        return store_data_file(context, source, Path(self.root.name) / 'problems' / 'polygonstore' / name)
+
+    def age(self, path):
+        old = time.time() - PolygonAsset.GRACE_PERIOD.total_seconds() - 60
+        os.utime(path, (old, old))
+
+    def test_store_image(self):
+        context = self.context()
+        url = store_image(context, 'statements/image.png')
+        name = context.assets[0].name
+        self.assertEqual(url, '/media/' + name)
+        self.assertTrue(context.assets[0].created)
+
+        self.age(default_storage.path(name))
+        other = self.context()
+        self.assertEqual(store_image(other, 'statements/image.png'), url)
+        self.assertFalse(other.assets[0].created)
+        # Reuse counts as a fresh use for collection.
+        self.assertGreater(os.path.getmtime(default_storage.path(name)), time.time() - 60)
+
+    def test_store_data_file(self):
+        context = self.context()
+        self.assertTrue(self.store_data(context, b'int main() {}'))
+        blob = asset_data_root() / context.assets[0].name
+        destination = Path(self.root.name) / 'problems' / 'polygonstore' / 'checker.cpp'
+        self.assertTrue(os.path.samefile(blob, destination))
+
+        # Unchanged content is neither stored nor linked again.
+        self.assertFalse(self.store_data(self.context(), b'int main() {}'))
+        self.assertTrue(self.store_data(self.context(), b'int main() { return 0; }'))
+
+    def test_discard_new_assets(self):
+        registered = self.context()
+        self.store_data(registered, b'registered', 'registered.cpp')
+        register_assets(registered)
+
+        failed = self.context()
+        self.store_data(failed, b'registered', 'registered.cpp')
+        self.store_data(failed, b'new', 'new.cpp')
+        store_image(failed, 'statements/image.png')
+        discard_new_assets(failed)
+
+        self.assertTrue((asset_data_root() / registered.assets[0].name).exists())
+        self.assertFalse((asset_data_root() / failed.assets[1].name).exists())
+        self.assertFalse(default_storage.exists(failed.assets[2].name))
+
+    def test_collect_garbage(self):
+        used = self.context()
+        self.store_data(used, b'used', 'used.cpp')
+        register_assets(used)
+        unused = self.context()
+        self.store_data(unused, b'unused', 'unused.cpp')
+        register_assets(unused)
+        self.source.assets.set(PolygonAsset.objects.filter(name=used.assets[0].name))
+
+        # Stored by an import that failed without cleaning up, so it has no row.
+        orphan = self.context()
+        self.store_data(orphan, b'orphan', 'orphan.cpp')
+        recent = self.context()
+        self.store_data(recent, b'recent', 'recent.cpp')
+        linked = self.context()
+        url = store_image(linked, 'statements/image.png')
+        create_problem(code='polygonlinked', description='![image](%s)' % url)
+
+        for context in (used, unused, orphan, linked):
+            self.age(PolygonAsset(name=context.assets[0].name, kind=context.assets[0].kind).path)
+
+        self.assertEqual(PolygonAsset.collect_garbage(), 2)
+        self.assertTrue((asset_data_root() / used.assets[0].name).exists())
+        self.assertFalse((asset_data_root() / unused.assets[0].name).exists())
+        self.assertFalse((asset_data_root() / orphan.assets[0].name).exists())
+        self.assertTrue((asset_data_root() / recent.assets[0].name).exists())
+        self.assertTrue(default_storage.exists(linked.assets[0].name))
+        self.assertEqual(list(PolygonAsset.objects.values_list('name', flat=True)), [used.assets[0].name])